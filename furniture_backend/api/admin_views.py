@@ -1,26 +1,44 @@
-from rest_framework import viewsets, status
+from rest_framework import mixins, serializers, viewsets, status
 from rest_framework.response import Response
 from rest_framework.decorators import action
 from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
+from rest_framework.reverse import reverse
 from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
-from django.db import models
+from django.db import models, transaction
+from django.http import UnreadablePostError
 from django.db.models import Count
 from django.utils import timezone
+import logging
+from collections import Counter
 from datetime import timedelta
+from io import BytesIO
 
 from furniture.models import (
     GalleryCategory, GalleryProject, GalleryImage,
     CustomRequest, ContactMessage,
-    Service, Material, Testimonial, FAQ
+    Service, Material, Testimonial, FAQ, UploadSession, rows_changed, table_counts
+)
+from furniture.ordering import ORDER_GAP, move_next_to, set_positions, spaced_position
+from furniture.similarity import (
+    NEAR_DUPLICATE_DISTANCE, duplicate_groups, parse_distance, similar_images
+)
+from furniture.uploads import (
+    InvalidImage, OffsetMismatch, UploadIncomplete, UploadTooLarge,
+    append_chunk, finalize_upload, purge_expired
 )
 from .serializers import (
     AdminGalleryCategorySerializer, AdminGalleryProjectSerializer,
     AdminGalleryImageSerializer, AdminCustomRequestSerializer,
     ContactMessageDetailSerializer, ServiceSerializer,
-    MaterialSerializer, TestimonialSerializer, FAQSerializer
+    MaterialSerializer, TestimonialSerializer, FAQSerializer,
+    UploadSessionSerializer
 )
 from .authentication import CsrfExemptSessionAuthentication
+from .pagination import CachedCountPagination
+
+
+logger = logging.getLogger(__name__)
 
 
 class AdminAuthenticationMixin:
@@ -29,10 +47,165 @@ class AdminAuthenticationMixin:
     permission_classes = [IsAuthenticated, IsAdminUser]
 
 
+class ManualOrderingMixin:
+    """
+    Manual ordering of a list (see furniture/ordering.py):
+
+    ``POST <id>/move/`` with ``{"before": id}`` or ``{"after": id}`` moves
+    one row, usually writing only that row.
+
+    ``POST bulk_update_order/`` with ``{"orders": [{"id": 3, "order": 0}, ...]}``,
+    or ``{"ids": [3, 1, 2]}`` to number rows in that order, ORDER_GAP apart.
+    Every id is checked in one query, then all positions are written at once.
+    """
+    reorder_keys = ('orders',)
+
+    @action(detail=True, methods=['post'])
+    def move(self, request, pk=None):
+        """Move this row right before or after another row of its list"""
+        model = self.get_queryset().model
+        instance = model._default_manager.filter(pk=pk).first()
+        if instance is None:
+            return Response({'error': 'Not found'}, status=status.HTTP_404_NOT_FOUND)
+
+        after = 'after' in request.data
+        target_id = request.data.get('after' if after else 'before')
+        if target_id is None:
+            return Response({
+                'error': 'before or after is required'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            target = model._default_manager.get(pk=target_id)
+        except (model.DoesNotExist, ValueError, TypeError):
+            return Response({
+                'error': 'Target not found'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            position, rebalanced = move_next_to(instance, target, after=after)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'id': instance.pk, 'position': position, 'rebalanced': rebalanced})
+
+    @action(detail=False, methods=['post'])
+    def bulk_update_order(self, request):
+        """Set the manual order of many rows in one request"""
+        model = self.get_queryset().model
+        try:
+            positions = self.parse_positions(request.data)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        found = set(model._default_manager.filter(pk__in=positions).values_list('pk', flat=True))
+        missing = [pk for pk in positions if pk not in found]
+        if missing:
+            return Response({
+                'error': 'Unknown ids', 'ids': missing
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        updated = set_positions(model, positions)
+        return Response({'message': 'Order updated successfully', 'updated': updated})
+
+    def parse_positions(self, data):
+        """{pk: position} from the request, or ValueError"""
+        if 'ids' in data:
+            ids = data['ids']
+            if not isinstance(ids, list):
+                raise ValueError('ids must be a list')
+            # Spaced like a rebalanced list, so later moves still write one row
+            items = [{'id': pk, 'order': spaced_position(index)} for index, pk in enumerate(ids)]
+        else:
+            items = next((data[key] for key in self.reorder_keys if key in data), None)
+        if not isinstance(items, list) or not items:
+            raise ValueError(f'{self.reorder_keys[0]} or ids is required')
+
+        positions = {}
+        for item in items:
+            try:
+                pk, position = int(item['id']), int(item['order'])
+            except (KeyError, TypeError, ValueError):
+                raise ValueError('Each item needs an integer id and order')
+            if position < 0:
+                raise ValueError('order must not be negative')
+            if pk in positions:
+                raise ValueError(f'Duplicate id {pk}')
+            positions[pk] = position
+        return positions
+
+
+# Ids one batch action may name; keeps its IN (...) within database limits
+MAX_BATCH_SIZE = 5000
+
+
+class BatchActionMixin:
+    """
+    ``POST batch/`` with ``{"ids": [...], "operation": ..., "value": ...}``
+    applies one operation to up to MAX_BATCH_SIZE rows as a single UPDATE
+    (or DELETE) in a transaction and reports how many rows it changed.
+
+    ``batch_fields`` maps each update operation to the model field it sets
+    and a serializer field validating ``value``; ``delete`` needs no value.
+    """
+    batch_fields = {}
+
+    @action(detail=False, methods=['post'])
+    def batch(self, request):
+        """Apply one operation to many rows at once"""
+        model = self.get_queryset().model
+        operation = request.data.get('operation')
+        ids = request.data.get('ids')
+        if not isinstance(ids, list) or not ids:
+            return Response({'error': 'ids must be a non-empty list'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(ids) > MAX_BATCH_SIZE:
+            return Response({
+                'error': f'At most {MAX_BATCH_SIZE} ids per batch'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            ids = {int(pk) for pk in ids}
+        except (TypeError, ValueError):
+            return Response({'error': 'ids must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+        queryset = model._default_manager.filter(pk__in=ids)
+
+        if operation == 'delete':
+            # Row receivers (blob references, ...) still run; counters and
+            # caches are refreshed once for the whole delete.
+            with transaction.atomic():
+                _, deleted = queryset.delete()
+            changed = deleted.get(model._meta.label, 0)
+        elif operation in self.batch_fields:
+            field_name, field = self.batch_fields[operation]
+            try:
+                value = field.run_validation(request.data.get('value'))
+            except serializers.ValidationError as e:
+                return Response({'error': 'Invalid value', 'value': e.detail}, status=status.HTTP_400_BAD_REQUEST)
+            try:
+                with transaction.atomic():
+                    changed = self.batch_update(queryset, field_name, value)
+            except ValueError as e:
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            rows_changed.send(sender=model)
+        else:
+            operations = sorted([*self.batch_fields, 'delete'])
+            return Response({
+                'error': f"operation must be one of: {', '.join(operations)}"
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({'operation': operation, 'requested': len(ids), 'changed': changed})
+
+    def batch_update(self, queryset, field_name, value):
+        """Set ``field_name`` to ``value`` on ``queryset``; returns the rows changed"""
+        return queryset.exclude(**{field_name: value}).update(**{field_name: value})
+
+
 # Gallery Admin Views
-class AdminGalleryCategoryViewSet(AdminAuthenticationMixin, viewsets.ModelViewSet):
+class AdminGalleryCategoryViewSet(AdminAuthenticationMixin, ManualOrderingMixin, viewsets.ModelViewSet):
     """Admin-only gallery category management"""
-    queryset = GalleryCategory.objects.all().order_by('sort_order', 'name')
+    queryset = GalleryCategory.objects.prefetch_related(
+        models.Prefetch(
+            'gallery_projects',
+            queryset=GalleryProject.objects.select_related('gallery_category').prefetch_related('images')
+        )
+    ).order_by('sort_order', 'name')
     serializer_class = AdminGalleryCategorySerializer
     parser_classes = [MultiPartParser, FormParser, JSONParser]
 
@@ -54,26 +227,50 @@ class AdminGalleryCategoryViewSet(AdminAuthenticationMixin, viewsets.ModelViewSe
     @action(detail=False, methods=['get'])
     def stats(self, request):
         """Get gallery category statistics"""
-        total_categories = GalleryCategory.objects.count()
-        active_categories = GalleryCategory.objects.filter(is_active=True).count()
-        total_projects = GalleryProject.objects.count()
-        active_projects = GalleryProject.objects.filter(is_active=True).count()
-        total_images = GalleryImage.objects.count()
+        counts = table_counts([GalleryCategory, GalleryProject, GalleryImage])
 
         return Response({
-            'total_categories': total_categories,
-            'active_categories': active_categories,
-            'total_projects': total_projects,
-            'active_projects': active_projects,
-            'total_images': total_images,
+            'total_categories': counts['category_count'],
+            'active_categories': counts['active_category_count'],
+            'total_projects': counts['project_count'],
+            'active_projects': counts['active_project_count'],
+            'total_images': counts['image_count'],
         })
 
 
-class AdminGalleryProjectViewSet(AdminAuthenticationMixin, viewsets.ModelViewSet):
+class AdminGalleryProjectViewSet(AdminAuthenticationMixin, ManualOrderingMixin, BatchActionMixin,
+                                 viewsets.ModelViewSet):
     """Admin-only gallery project management"""
     queryset = GalleryProject.objects.all().select_related('gallery_category').prefetch_related('images').order_by('-created_at')
     serializer_class = AdminGalleryProjectSerializer
     parser_classes = [MultiPartParser, FormParser, JSONParser]
+    batch_fields = {
+        'set_active': ('is_active', serializers.BooleanField()),
+        'set_featured': ('featured', serializers.BooleanField()),
+        'set_category': (
+            'gallery_category',
+            serializers.PrimaryKeyRelatedField(queryset=GalleryCategory.objects.all())
+        ),
+    }
+
+    def batch_update(self, queryset, field_name, value):
+        changed = queryset.exclude(**{field_name: value})
+        # Categories to recount: those the projects were in, and their new one
+        category_ids = set(changed.order_by().values_list('gallery_category_id', flat=True).distinct())
+        if field_name == 'gallery_category':
+            category_ids.add(value.pk)
+            slugs = list(changed.values_list('slug', flat=True))
+            taken = set(
+                GalleryProject.objects.filter(gallery_category=value, slug__in=slugs).values_list('slug', flat=True)
+            )
+            taken.update(slug for slug, count in Counter(slugs).items() if count > 1)
+            if taken:
+                raise ValueError(f"Slugs already used in {value.name}: {', '.join(sorted(taken))}")
+
+        updated = changed.update(**{field_name: value, 'updated_at': timezone.now()})
+        if field_name != 'featured':
+            GalleryCategory.objects.filter(pk__in=category_ids).refresh_counts()
+        return updated
 
     def create(self, request, *args, **kwargs):
         try:
@@ -110,18 +307,27 @@ class AdminGalleryProjectViewSet(AdminAuthenticationMixin, viewsets.ModelViewSet
             # Create project
             serializer = self.get_serializer(data=data)
             if serializer.is_valid():
-                project = serializer.save()
-
-                # Handle image uploads
-                for i, image in enumerate(images):
-                    GalleryImage.objects.create(
-                        gallery_project=project,
-                        image=image,
-                        title=f"{project.title} - Image {i+1}",
-                        alt_text=f"{project.title} - Image {i+1}",
-                        is_primary=(i == 0),
-                        order=i
-                    )
+                # The project and its images are created together or not at
+                # all; files written before a failure are left to media_gc
+                with transaction.atomic():
+                    project = serializer.save()
+
+                    # Handle image uploads: files first, then one INSERT for all rows
+                    if images:
+                        GalleryImage.objects.bulk_ingest([
+                            GalleryImage(
+                                gallery_project=project,
+                                image=image,
+                                title=f"{project.title} - Image {i+1}",
+                                alt_text=f"{project.title} - Image {i+1}",
+                                is_primary=(i == 0),
+                                order=spaced_position(i)
+                            )
+                            for i, image in enumerate(images)
+                        ])
+
+                # Pick up the image counters refreshed by bulk_ingest
+                project.refresh_from_db()
 
                 # Return the created project
                 response_serializer = AdminGalleryProjectSerializer(project, context={'request': request})
@@ -130,8 +336,7 @@ class AdminGalleryProjectViewSet(AdminAuthenticationMixin, viewsets.ModelViewSet
                 return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
         except Exception as e:
-            import traceback
-            traceback.print_exc()
+            logger.exception('Could not create gallery project')
             return Response(
                 {'error': f'Server error: {str(e)}'},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
@@ -150,24 +355,28 @@ class AdminGalleryProjectViewSet(AdminAuthenticationMixin, viewsets.ModelViewSet
 
         serializer = self.get_serializer(instance, data=data, partial=partial)
         if serializer.is_valid():
-            project = serializer.save()
+            # The changes and the new images are saved together or not at
+            # all; files written before a failure are left to media_gc
+            with transaction.atomic():
+                project = serializer.save()
+
+                # Handle new image uploads, appended after the existing ones
+                if images:
+                    start = GalleryImage.objects.filter(gallery_project=project).next_order()
+                    GalleryImage.objects.bulk_ingest([
+                        GalleryImage(
+                            gallery_project=project,
+                            image=image,
+                            title=f"{project.title} - Image {project.image_count + i + 1}",
+                            alt_text=f"{project.title} - Image {project.image_count + i + 1}",
+                            is_primary=False,
+                            order=start + i * ORDER_GAP
+                        )
+                        for i, image in enumerate(images)
+                    ])
 
-            # Handle new image uploads
             if images:
-                for i, image in enumerate(images):
-                    # Get the highest order number for existing images
-                    max_order = GalleryImage.objects.filter(gallery_project=project).aggregate(
-                        max_order=models.Max('order')
-                    )['max_order'] or -1
-
-                    GalleryImage.objects.create(
-                        gallery_project=project,
-                        image=image,
-                        title=f"{project.title} - Image {max_order + i + 2}",
-                        alt_text=f"{project.title} - Image {max_order + i + 2}",
-                        is_primary=False,
-                        order=max_order + i + 1
-                    )
+                project.refresh_from_db()
 
             response_serializer = AdminGalleryProjectSerializer(project, context={'request': request})
             return Response(response_serializer.data)
@@ -185,22 +394,19 @@ class AdminGalleryProjectViewSet(AdminAuthenticationMixin, viewsets.ModelViewSet
                 'error': 'No images provided'
             }, status=status.HTTP_400_BAD_REQUEST)
 
-        created_images = []
-        max_order = GalleryImage.objects.filter(gallery_project=project).aggregate(
-            max_order=models.Max('order')
-        )['max_order'] or -1
-
-        for i, image in enumerate(images):
-            gallery_image = GalleryImage.objects.create(
+        start = GalleryImage.objects.filter(gallery_project=project).next_order()
+        created_images = GalleryImage.objects.bulk_ingest([
+            GalleryImage(
                 gallery_project=project,
                 image=image,
-                title=request.data.get(f'title_{i}', f"{project.title} - Image {max_order + i + 2}"),
-                alt_text=request.data.get(f'alt_text_{i}', f"{project.title} - Image {max_order + i + 2}"),
+                title=request.data.get(f'title_{i}', f"{project.title} - Image {project.image_count + i + 1}"),
+                alt_text=request.data.get(f'alt_text_{i}', f"{project.title} - Image {project.image_count + i + 1}"),
                 description=request.data.get(f'description_{i}', ''),
                 is_primary=False,
-                order=max_order + i + 1
+                order=start + i * ORDER_GAP
             )
-            created_images.append(gallery_image)
+            for i, image in enumerate(images)
+        ])
 
         serializer = AdminGalleryImageSerializer(created_images, many=True)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
@@ -213,7 +419,8 @@ class AdminGalleryProjectViewSet(AdminAuthenticationMixin, viewsets.ModelViewSet
 
         try:
             image = GalleryImage.objects.get(id=image_id, gallery_project=project)
-            image.delete()
+            with transaction.atomic():
+                image.delete()
             return Response({'message': 'Image deleted successfully'})
         except GalleryImage.DoesNotExist:
             return Response({
@@ -227,13 +434,14 @@ class AdminGalleryProjectViewSet(AdminAuthenticationMixin, viewsets.ModelViewSet
         image_id = request.data.get('image_id')
 
         try:
-            # Remove primary status from all images
-            GalleryImage.objects.filter(gallery_project=project).update(is_primary=False)
+            with transaction.atomic():
+                # Remove primary status from all images
+                GalleryImage.objects.filter(gallery_project=project).update(is_primary=False)
 
-            # Set new primary image
-            image = GalleryImage.objects.get(id=image_id, gallery_project=project)
-            image.is_primary = True
-            image.save()
+                # Set new primary image; save() also moves project.primary_image
+                image = GalleryImage.objects.get(id=image_id, gallery_project=project)
+                image.is_primary = True
+                image.save()
 
             return Response({'message': 'Primary image updated successfully'})
         except GalleryImage.DoesNotExist:
@@ -244,64 +452,178 @@ class AdminGalleryProjectViewSet(AdminAuthenticationMixin, viewsets.ModelViewSet
     @action(detail=False, methods=['get'])
     def stats(self, request):
         """Get gallery project statistics"""
-        total_projects = GalleryProject.objects.count()
-        active_projects = GalleryProject.objects.filter(is_active=True).count()
-        featured_projects = GalleryProject.objects.filter(featured=True).count()
-        projects_with_images = GalleryProject.objects.filter(images__isnull=False).distinct().count()
+        counts = table_counts([GalleryProject])
 
         return Response({
-            'total_projects': total_projects,
-            'active_projects': active_projects,
-            'featured_projects': featured_projects,
-            'projects_with_images': projects_with_images,
+            'total_projects': counts['project_count'],
+            'active_projects': counts['active_project_count'],
+            'featured_projects': counts['featured_project_count'],
+            'projects_with_images': counts['projects_with_images'],
         })
 
 
-class AdminGalleryImageViewSet(AdminAuthenticationMixin, viewsets.ModelViewSet):
+class AdminGalleryImageViewSet(AdminAuthenticationMixin, ManualOrderingMixin, BatchActionMixin,
+                               viewsets.ModelViewSet):
     """Admin-only gallery image management"""
     queryset = GalleryImage.objects.all().select_related('gallery_project').order_by('-created_at')
     serializer_class = AdminGalleryImageSerializer
+    pagination_class = CachedCountPagination
     parser_classes = [MultiPartParser, FormParser, JSONParser]
+    # image_orders: the key this endpoint took before it was generic
+    reorder_keys = ('orders', 'image_orders')
+    batch_fields = {
+        'set_alt_text': ('alt_text', serializers.CharField(max_length=200, allow_blank=True)),
+        'set_tags': ('tags', serializers.CharField(max_length=300, allow_blank=True)),
+    }
+
+    @action(detail=True, methods=['get'], url_path='near-duplicates')
+    def near_duplicates(self, request, pk=None):
+        """Images that look like this one, closest first"""
+        image = self.get_object()
+        try:
+            distance = parse_distance(request.query_params.get('distance'), NEAR_DUPLICATE_DISTANCE)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        matches = similar_images(image, distance)
+        images = GalleryImage.objects.select_related('gallery_project').in_bulk(
+            [image_id for _, image_id in matches]
+        )
+        context = self.get_serializer_context()
+        return Response([
+            {**AdminGalleryImageSerializer(images[image_id], context=context).data, 'distance': match_distance}
+            for match_distance, image_id in matches
+            if image_id in images
+        ])
 
-    @action(detail=False, methods=['post'])
-    def bulk_update_order(self, request):
-        """Bulk update image order"""
-        image_orders = request.data.get('image_orders', [])
-
-        if not image_orders:
-            return Response({
-                'error': 'image_orders is required'
-            }, status=status.HTTP_400_BAD_REQUEST)
-
-        for item in image_orders:
-            try:
-                image = GalleryImage.objects.get(id=item['id'])
-                image.order = item['order']
-                image.save()
-            except (GalleryImage.DoesNotExist, KeyError):
-                continue
-
-        return Response({'message': 'Image order updated successfully'})
+    @action(detail=False, methods=['get'])
+    def duplicates(self, request):
+        """Groups of near-identical images across the whole gallery"""
+        try:
+            distance = parse_distance(request.query_params.get('distance'), NEAR_DUPLICATE_DISTANCE)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        groups = duplicate_groups(distance)
+        images = GalleryImage.objects.select_related('gallery_project').in_bulk(
+            [image_id for group in groups for image_id in group]
+        )
+        context = self.get_serializer_context()
+        return Response({
+            'count': len(groups),
+            'groups': [
+                AdminGalleryImageSerializer(
+                    [images[image_id] for image_id in group if image_id in images], many=True, context=context
+                ).data
+                for group in groups
+            ]
+        })
 
     @action(detail=False, methods=['get'])
     def stats(self, request):
         """Get gallery image statistics"""
-        total_images = GalleryImage.objects.count()
-        primary_images = GalleryImage.objects.filter(is_primary=True).count()
-        before_images = GalleryImage.objects.filter(is_before_image=True).count()
+        counts = table_counts([GalleryImage])
 
         return Response({
-            'total_images': total_images,
-            'primary_images': primary_images,
-            'before_images': before_images,
+            'total_images': counts['image_count'],
+            'primary_images': counts['primary_image_count'],
+            'before_images': counts['before_image_count'],
         })
 
 
+def upload_headers(session):
+    return {
+        'Upload-Offset': str(session.offset),
+        'Upload-Length': str(session.length),
+        'Cache-Control': 'no-store',
+    }
+
+
+class AdminUploadSessionViewSet(AdminAuthenticationMixin, mixins.CreateModelMixin, mixins.RetrieveModelMixin,
+                                mixins.DestroyModelMixin, viewsets.GenericViewSet):
+    """
+    Resumable gallery image uploads (see furniture/uploads.py):
+
+        POST   uploads/                 start: gallery_project, filename, length
+        PATCH  uploads/<id>/            bytes starting at the Upload-Offset header
+        HEAD   uploads/<id>/            Upload-Offset: bytes received so far
+        POST   uploads/<id>/finalize/   create the gallery image
+        DELETE uploads/<id>/            abandon the upload
+    """
+    serializer_class = UploadSessionSerializer
+    parser_classes = [JSONParser, FormParser, MultiPartParser]
+
+    def get_queryset(self):
+        return UploadSession.objects.active().select_related('gallery_project')
+
+    def create(self, request, *args, **kwargs):
+        purge_expired()
+        serializer = self.get_serializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        session = serializer.save()
+        headers = upload_headers(session)
+        headers['Location'] = reverse('admin-upload-detail', args=[session.pk], request=request)
+        return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
+
+    def retrieve(self, request, *args, **kwargs):
+        session = self.get_object()
+        return Response(self.get_serializer(session).data, headers=upload_headers(session))
+
+    def partial_update(self, request, *args, **kwargs):
+        """Write the raw request body at Upload-Offset, streaming it to disk"""
+        session = self.get_object()
+        if request.content_type != 'application/offset+octet-stream':
+            return Response({
+                'error': 'Content-Type must be application/offset+octet-stream'
+            }, status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+        try:
+            offset = int(request.headers['Upload-Offset'])
+        except (KeyError, ValueError):
+            return Response({
+                'error': 'Upload-Offset header is required'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            # request.data is never touched: the body is read in chunks, not parsed
+            append_chunk(session, offset, request.stream or BytesIO())
+        except OffsetMismatch as e:
+            session.offset = e.offset
+            return Response({'error': str(e), 'offset': e.offset},
+                            status=status.HTTP_409_CONFLICT, headers=upload_headers(session))
+        except UploadTooLarge as e:
+            return Response({'error': str(e)}, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        except UnreadablePostError:
+            session.refresh_from_db()
+            return Response({'error': 'Upload interrupted', 'offset': session.offset},
+                            status=status.HTTP_400_BAD_REQUEST, headers=upload_headers(session))
+
+        return Response(self.get_serializer(session).data, headers=upload_headers(session))
+
+    @action(detail=True, methods=['post'])
+    def finalize(self, request, pk=None):
+        """Turn a complete upload into a gallery image"""
+        session = self.get_object()
+        try:
+            image = finalize_upload(session)
+        except UploadIncomplete as e:
+            return Response({'error': str(e), 'offset': session.offset},
+                            status=status.HTTP_409_CONFLICT, headers=upload_headers(session))
+        except InvalidImage as e:
+            session.delete()
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        serializer = AdminGalleryImageSerializer(image, context=self.get_serializer_context())
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+
 # Custom Request Admin Views
 class AdminCustomRequestViewSet(AdminAuthenticationMixin, viewsets.ModelViewSet):
     """Admin-only custom request management"""
     queryset = CustomRequest.objects.all().order_by('-created_at')
     serializer_class = AdminCustomRequestSerializer
+    pagination_class = CachedCountPagination
     parser_classes = [JSONParser]
 
     @action(detail=True, methods=['post'])
@@ -352,16 +674,13 @@ class AdminCustomRequestViewSet(AdminAuthenticationMixin, viewsets.ModelViewSet)
     @action(detail=False, methods=['get'])
     def stats(self, request):
         """Get custom request statistics"""
-        total_requests = CustomRequest.objects.count()
-        new_requests = CustomRequest.objects.filter(status='new').count()
-        in_progress_requests = CustomRequest.objects.filter(status='in_progress').count()
-        done_requests = CustomRequest.objects.filter(status='done').count()
+        counts = table_counts([CustomRequest])
 
         return Response({
-            'total_requests': total_requests,
-            'new_requests': new_requests,
-            'in_progress_requests': in_progress_requests,
-            'done_requests': done_requests,
+            'total_requests': counts['custom_request_count'],
+            'new_requests': counts['new_custom_request_count'],
+            'in_progress_requests': counts['in_progress_custom_request_count'],
+            'done_requests': counts['done_custom_request_count'],
         })
 
 
@@ -370,6 +689,7 @@ class AdminContactMessageViewSet(AdminAuthenticationMixin, viewsets.ReadOnlyMode
     """Admin-only contact message management"""
     queryset = ContactMessage.objects.all().order_by('-created_at')
     serializer_class = ContactMessageDetailSerializer
+    pagination_class = CachedCountPagination
 
     @action(detail=True, methods=['post'])
     def mark_read(self, request, pk=None):
@@ -402,16 +722,16 @@ class AdminContactMessageViewSet(AdminAuthenticationMixin, viewsets.ReadOnlyMode
 
 
 # Service, Material, Testimonial, FAQ Admin Views
-class AdminServiceViewSet(AdminAuthenticationMixin, viewsets.ModelViewSet):
+class AdminServiceViewSet(AdminAuthenticationMixin, ManualOrderingMixin, viewsets.ModelViewSet):
     """Admin-only Service management"""
-    queryset = Service.objects.all().order_by('sort_order', 'title')
+    queryset = Service.objects.prefetch_related('derivatives').order_by('sort_order', 'title')
     serializer_class = ServiceSerializer
     parser_classes = [MultiPartParser, FormParser, JSONParser]
 
 
-class AdminMaterialViewSet(AdminAuthenticationMixin, viewsets.ModelViewSet):
+class AdminMaterialViewSet(AdminAuthenticationMixin, ManualOrderingMixin, viewsets.ModelViewSet):
     """Admin-only Material management"""
-    queryset = Material.objects.all().order_by('type', 'sort_order', 'name')
+    queryset = Material.objects.prefetch_related('derivatives').order_by('type', 'sort_order', 'name')
     serializer_class = MaterialSerializer
     parser_classes = [MultiPartParser, FormParser, JSONParser]
 
@@ -422,7 +742,7 @@ class AdminTestimonialViewSet(AdminAuthenticationMixin, viewsets.ModelViewSet):
     serializer_class = TestimonialSerializer
 
 
-class AdminFAQViewSet(AdminAuthenticationMixin, viewsets.ModelViewSet):
+class AdminFAQViewSet(AdminAuthenticationMixin, ManualOrderingMixin, viewsets.ModelViewSet):
     """Admin-only FAQ management"""
     queryset = FAQ.objects.all().order_by('category', 'sort_order', 'created_at')
     serializer_class = FAQSerializer
@@ -433,50 +753,39 @@ class AdminDashboardStatsView(AdminAuthenticationMixin, APIView):
     """Admin dashboard statistics"""
 
     def get(self, request):
-        # Gallery stats
-        total_projects = GalleryProject.objects.count()
-        active_projects = GalleryProject.objects.filter(is_active=True).count()
-        featured_projects = GalleryProject.objects.filter(featured=True).count()
-        total_categories = GalleryCategory.objects.count()
-        active_categories = GalleryCategory.objects.filter(is_active=True).count()
-
-        # Custom Request stats
-        total_custom_requests = CustomRequest.objects.count()
-        new_custom_requests = CustomRequest.objects.filter(status='new').count()
-        in_progress_requests = CustomRequest.objects.filter(status='in_progress').count()
-        completed_requests = CustomRequest.objects.filter(status='done').count()
-
-        # Contact Message stats
-        total_messages = ContactMessage.objects.count()
-        unread_messages = ContactMessage.objects.filter(is_read=False).count()
-
-        # Recent activity (last 7 days)
-        week_ago = timezone.now() - timedelta(days=7)
-        recent_projects = GalleryProject.objects.filter(created_at__gte=week_ago).count()
-        recent_messages = ContactMessage.objects.filter(created_at__gte=week_ago).count()
-        recent_custom_requests = CustomRequest.objects.filter(created_at__gte=week_ago).count()
+        # One conditional aggregate per table; with DASHBOARD_STATS_MATERIALIZED
+        # the totals come from the stats row and only the last 7 days are counted
+        this_week = models.Q(created_at__gte=timezone.now() - timedelta(days=7))
+        counts = table_counts(
+            [GalleryProject, GalleryCategory, CustomRequest, ContactMessage],
+            extra={
+                GalleryProject: {'recent_project_count': this_week},
+                CustomRequest: {'recent_custom_request_count': this_week},
+                ContactMessage: {'recent_message_count': this_week},
+            }
+        )
 
         return Response({
             'gallery_projects': {
-                'total': total_projects,
-                'active': active_projects,
-                'featured': featured_projects,
-                'recent': recent_projects
+                'total': counts['project_count'],
+                'active': counts['active_project_count'],
+                'featured': counts['featured_project_count'],
+                'recent': counts['recent_project_count']
             },
             'gallery_categories': {
-                'total': total_categories,
-                'active': active_categories
+                'total': counts['category_count'],
+                'active': counts['active_category_count']
             },
             'custom_requests': {
-                'total': total_custom_requests,
-                'new': new_custom_requests,
-                'in_progress': in_progress_requests,
-                'completed': completed_requests,
-                'recent': recent_custom_requests
+                'total': counts['custom_request_count'],
+                'new': counts['new_custom_request_count'],
+                'in_progress': counts['in_progress_custom_request_count'],
+                'completed': counts['done_custom_request_count'],
+                'recent': counts['recent_custom_request_count']
             },
             'contact_messages': {
-                'total': total_messages,
-                'unread': unread_messages,
-                'recent': recent_messages
+                'total': counts['message_count'],
+                'unread': counts['unread_message_count'],
+                'recent': counts['recent_message_count']
             }
         })
@@ -0,0 +1,278 @@
+"""
+Versioned response cache for the public read-only API.
+
+Each cached model owns a generation counter kept in the default cache.
+Response cache keys embed the generations of every model a view reads, so
+bumping a counter (done by the post_save/post_delete receivers in
+api/signals.py) orphans exactly the entries built from that model; the
+orphans simply age out through the cache timeout.
+
+The same key doubles as the ETag of the response, and the time of the last
+bump is its Last-Modified, so conditional GETs are answered with a 304
+before any query or serialization runs.
+"""
+import hashlib
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpRequest, QueryDict
+from django.utils.cache import (
+    get_conditional_response, patch_cache_control, patch_vary_headers
+)
+from django.utils.http import http_date
+
+
+GENERATION_KEY_PREFIX = 'api:generation'
+MODIFIED_KEY_PREFIX = 'api:modified'
+RESPONSE_KEY_PREFIX = 'api:response'
+WARM_KEY_PREFIX = 'api:warm'
+CACHEABLE_METHODS = ('GET', 'HEAD')
+MAX_WARM_VARIANTS = 20
+# Variants not requested for this long are no longer warmed
+WARM_VARIANT_TTL = 24 * 60 * 60
+# A variant's last-seen time is rewritten at most this often
+WARM_VARIANT_REFRESH = 60 * 60
+
+logger = logging.getLogger(__name__)
+
+
+def _generation_key(model):
+    return f'{GENERATION_KEY_PREFIX}:{model._meta.label_lower}'
+
+
+def _modified_key(model):
+    return f'{MODIFIED_KEY_PREFIX}:{model._meta.label_lower}'
+
+
+def _fresh_generation():
+    # Seeded from the clock rather than 1 so that a counter evicted from the
+    # cache can never come back at a value an older response was stored under.
+    return time.time_ns() // 1000
+
+
+def get_generations(models):
+    """Return the current generation of each model, in the given order"""
+    keys = [_generation_key(model) for model in models]
+    generations = cache.get_many(keys)
+
+    for key in keys:
+        if key not in generations:
+            cache.add(key, _fresh_generation(), None)
+            generations[key] = cache.get(key)
+
+    return [generations[key] for key in keys]
+
+
+def bump_generation(model):
+    """Invalidate every cached response that was built from ``model``"""
+    key = _generation_key(model)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, _fresh_generation(), None)
+    cache.set(_modified_key(model), int(time.time()), None)
+
+
+def get_last_modified(models):
+    """Timestamp of the most recent write to any of ``models``"""
+    keys = [_modified_key(model) for model in models]
+    timestamps = cache.get_many(keys)
+
+    for key in keys:
+        if key not in timestamps:
+            # Unknown after a cold start: assume "now" so clients revalidate.
+            cache.add(key, int(time.time()), None)
+            timestamps[key] = cache.get(key)
+
+    return max(timestamps.values())
+
+
+def get_request_language(request):
+    """
+    Language the client asked for (?lang= first, then Accept-Language), one
+    of API_LANGUAGES; anything else gets the default language.
+    """
+    language = request.GET.get('lang') or request.META.get('HTTP_ACCEPT_LANGUAGE', '')
+    language = language.split(',')[0].split(';')[0].split('-')[0].strip().lower()
+    if language in settings.API_LANGUAGES:
+        return language
+    return settings.LANGUAGE_CODE.split('-')[0]
+
+
+def response_cache_key(request, models):
+    """Cache key for a public API request: URL, query, language and generations"""
+    # ?lang= is covered by the language below
+    query = sorted(
+        (key, value)
+        for key in request.GET if key != 'lang'
+        for value in request.GET.getlist(key)
+    )
+    parts = [
+        # Scheme and host too: responses embed absolute media and page URLs
+        request.build_absolute_uri(request.path),
+        repr(query),
+        get_request_language(request),
+        repr(get_generations(models)),
+    ]
+    digest = hashlib.md5('|'.join(parts).encode('utf-8')).hexdigest()
+    return f'{RESPONSE_KEY_PREFIX}:{digest}'
+
+
+def set_validators(response, etag, last_modified):
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    # Let browsers keep the body but revalidate it on every navigation.
+    patch_cache_control(response, no_cache=True)
+    patch_vary_headers(response, ['Accept-Language'])
+
+
+class CachedResponseMixin:
+    """
+    Serve GET/HEAD responses of a public view from the versioned cache.
+
+    Views list every model their output depends on in ``cache_models``.
+    Requests carrying a matching If-None-Match/If-Modified-Since get a 304.
+    """
+    cache_models = ()
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method not in CACHEABLE_METHODS or not self.cache_models:
+            return super().dispatch(request, *args, **kwargs)
+
+        cache_key = response_cache_key(request, self.cache_models)
+        etag = '"%s"' % cache_key.rsplit(':', 1)[1]
+        last_modified = get_last_modified(self.cache_models)
+
+        not_modified = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if not_modified is not None:
+            set_validators(not_modified, etag, last_modified)
+            return not_modified
+
+        cached_response = cache.get(cache_key)
+        if cached_response is not None:
+            return cached_response
+
+        response = super().dispatch(request, *args, **kwargs)
+        if response.status_code == 200:
+            set_validators(response, etag, last_modified)
+            timeout = getattr(settings, 'API_CACHE_TIMEOUT', 60 * 60 * 24)
+            response.add_post_render_callback(
+                lambda rendered: cache.set(cache_key, rendered, timeout)
+            )
+        return response
+
+
+def remember_request(name, request):
+    """
+    Record a request variant so warm_cached_view() can replay it later.
+    Variants are only host, path and language, so arbitrary query strings
+    or headers cannot add more, and expire WARM_VARIANT_TTL after last use.
+    """
+    key = f'{WARM_KEY_PREFIX}:{name}'
+    now = time.time()
+    variants = cache.get(key) or {}
+    variant = (request.get_host(), request.is_secure(), request.path, get_request_language(request))
+    if now - variants.get(variant, 0) < WARM_VARIANT_REFRESH:
+        return
+
+    variants = {v: seen for v, seen in variants.items() if now - seen < WARM_VARIANT_TTL}
+    variants[variant] = now
+    # When full, the variants requested longest ago make room
+    recent = sorted(variants.items(), key=lambda item: item[1], reverse=True)[:MAX_WARM_VARIANTS]
+    cache.set(key, dict(recent), WARM_VARIANT_TTL)
+
+
+def build_get_request(host, secure, full_path, accept_language=''):
+    """A bare GET request for calling a view outside the request cycle"""
+    path, _, query_string = full_path.partition('?')
+    request = HttpRequest()
+    request.method = 'GET'
+    request.path = request.path_info = path
+    request.GET = QueryDict(query_string)
+    request.META = {
+        'REQUEST_METHOD': 'GET',
+        'HTTP_HOST': host,
+        'QUERY_STRING': query_string,
+        'HTTP_ACCEPT_LANGUAGE': accept_language,
+    }
+    if secure and settings.SECURE_PROXY_SSL_HEADER:
+        header, value = settings.SECURE_PROXY_SSL_HEADER
+        request.META[header] = value
+    return request
+
+
+def warm_cached_view(name, view):
+    """
+    Rebuild the cached response of every remembered variant of ``view``, so
+    the first visitor after a write is served from the cache as well.
+    """
+    now = time.time()
+    for (host, secure, path, language), seen in (cache.get(f'{WARM_KEY_PREFIX}:{name}') or {}).items():
+        if now - seen >= WARM_VARIANT_TTL:
+            continue
+        request = build_get_request(host, secure, path, language)
+        try:
+            response = view(request)
+            if hasattr(response, 'render'):
+                response.render()
+        except Exception:
+            logger.exception(f"Failed to warm cached view '{name}' for {path} ({language})")
+
+
+# Warms waiting for the end of the request being handled by this thread
+_request_warms = threading.local()
+
+
+class PendingWarm:
+    """An on_commit callback warming ``name``, recognizable among the others"""
+
+    def __init__(self, name, view):
+        self.name, self.view, self.done = name, view, False
+
+    def __call__(self):
+        self.done = True
+        warm_after_request(self.name, self.view)
+
+
+def warm_after_write(name, view):
+    """
+    warm_cached_view() once the current write is complete: once per
+    transaction when inside one, then once per request, after its response
+    has been sent (see start_request_warms()); right away otherwise.
+    """
+    connection = transaction.get_connection()
+    if not connection.in_atomic_block:
+        warm_after_request(name, view)
+        return
+    scheduled = any(
+        isinstance(entry[1], PendingWarm) and entry[1].name == name and not entry[1].done
+        for entry in connection.run_on_commit
+    )
+    if not scheduled:
+        transaction.on_commit(PendingWarm(name, view))
+
+
+def warm_after_request(name, view):
+    pending = getattr(_request_warms, 'pending', None)
+    if pending is not None:
+        pending.setdefault(name, view)
+    else:
+        warm_cached_view(name, view)
+
+
+def start_request_warms(**kwargs):
+    """request_started receiver: collect this request's warms"""
+    _request_warms.pending = {}
+
+
+def run_request_warms(**kwargs):
+    """request_finished receiver: run the warms the request asked for"""
+    pending, _request_warms.pending = getattr(_request_warms, 'pending', None), None
+    for name, view in (pending or {}).items():
+        warm_cached_view(name, view)
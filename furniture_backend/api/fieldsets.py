@@ -0,0 +1,83 @@
+"""
+Sparse fieldsets for the public API.
+
+``?fields=title,slug`` keeps only the listed fields and ``?omit=description``
+drops the listed ones. Besides trimming the serializer, the model columns no
+remaining field reads are deferred, so large text columns are never loaded.
+"""
+from django.core.exceptions import FieldDoesNotExist
+
+
+FIELDS_PARAM = 'fields'
+OMIT_PARAM = 'omit'
+
+
+def _split(value):
+    return [name.strip() for name in value.split(',') if name.strip()] if value else None
+
+
+def get_sparse_fieldset(request):
+    """Serializer kwargs for the fields/omit query params of ``request``"""
+    kwargs = {}
+    fields = _split(request.query_params.get(FIELDS_PARAM))
+    omit = _split(request.query_params.get(OMIT_PARAM))
+    if fields:
+        kwargs['fields'] = fields
+    if omit:
+        kwargs['omit'] = omit
+    return kwargs
+
+
+def _model_attribute(model, source):
+    """Model field backing a serializer source, or None if it cannot be told"""
+    name = source.split('.')[0]
+    if name.startswith('get_') and name.endswith('_display'):
+        name = name[len('get_'):-len('_display')]
+    try:
+        return model._meta.get_field(name)
+    except FieldDoesNotExist:
+        return None
+
+
+def defer_unused_fields(queryset, serializer_class, fieldset, keep=()):
+    """
+    Defer the concrete columns that the trimmed ``serializer_class`` will not
+    read. Nothing is deferred when any remaining field reads something other
+    than a model field (a method field or property may touch any column).
+    """
+    if not fieldset:
+        return queryset
+
+    model = queryset.model
+    needed = set(keep)
+    needed.update(name.lstrip('-') for name in queryset.query.order_by)
+    needed.update(name.lstrip('-') for name in model._meta.ordering)
+
+    for field in serializer_class(**fieldset).fields.values():
+        if field.source == '*':
+            return queryset
+        model_field = _model_attribute(model, field.source)
+        if model_field is None:
+            return queryset
+        needed.add(model_field.name)
+
+    deferred = [
+        field.name for field in model._meta.concrete_fields
+        if not field.primary_key and not field.is_relation and field.name not in needed
+    ]
+    return queryset.defer(*deferred) if deferred else queryset
+
+
+class SparseFieldsetMixin:
+    """Apply ?fields= / ?omit= to a public view's serializer and queryset"""
+
+    def get_serializer(self, *args, **kwargs):
+        kwargs.update(get_sparse_fieldset(self.request))
+        return super().get_serializer(*args, **kwargs)
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        keep = [getattr(self, 'lookup_field', 'pk')]
+        return defer_unused_fields(
+            queryset, self.get_serializer_class(), get_sparse_fieldset(self.request), keep
+        )
@@ -0,0 +1,100 @@
+"""
+Management command to compare the stdlib and orjson JSON renderers
+Usage: python manage.py benchmark_json [--sizes 10 100 1000] [--repeat 50]
+
+Builds a throwaway gallery project with N images for each size (inside a
+transaction that is rolled back, so nothing is left behind), serializes it
+with GalleryProjectDetailSerializer, then times rendering the same payload
+with DRF's JSONRenderer and with api.renderers.FastJSONRenderer. Both outputs
+are compared byte for byte before any timing is reported.
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from furniture.models import GalleryCategory, GalleryProject, GalleryImage
+from api.cache import build_get_request
+from api.renderers import FastJSONRenderer, orjson
+from api.serializers import GalleryProjectDetailSerializer
+
+
+class Command(BaseCommand):
+    help = 'Benchmark JSON rendering of GalleryProjectDetailSerializer payloads'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            nargs='+',
+            type=int,
+            default=[10, 100, 1000],
+            help='Number of images per project to benchmark (default: 10 100 1000)',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=50,
+            help='Renders per measurement (default: 50)',
+        )
+
+    def handle(self, *args, **options):
+        if orjson is None:
+            self.stdout.write(self.style.WARNING(
+                'orjson is not installed: FastJSONRenderer falls back to the stdlib, '
+                'so both columns measure the same code.'
+            ))
+
+        request = build_get_request('localhost:8000', False, '/api/gallery-projects/benchmark/')
+        repeat = options['repeat']
+
+        self.stdout.write(f'{"images":>8} {"bytes":>10} {"stdlib ms":>10} {"orjson ms":>10} {"speedup":>8}')
+        for size in options['sizes']:
+            data = self.build_payload(size, request)
+
+            stdlib_output = JSONRenderer().render(data)
+            fast_output = FastJSONRenderer().render(data)
+            if stdlib_output != fast_output:
+                raise CommandError(f'Renderer outputs differ for {size} images')
+
+            stdlib_ms = self.time_render(JSONRenderer(), data, repeat)
+            fast_ms = self.time_render(FastJSONRenderer(), data, repeat)
+            self.stdout.write(
+                f'{size:>8} {len(stdlib_output):>10} {stdlib_ms:>10.3f} {fast_ms:>10.3f} '
+                f'{stdlib_ms / fast_ms:>7.1f}x'
+            )
+
+        self.stdout.write(self.style.SUCCESS('Benchmark complete.'))
+
+    def build_payload(self, size, request):
+        """Serialized detail payload of a project with ``size`` images"""
+        with transaction.atomic():
+            category = GalleryCategory.objects.create(name=f'Benchmark {size}')
+            project = GalleryProject.objects.create(
+                gallery_category=category,
+                title=f'Benchmark project with {size} images',
+                description='Custom kitchen with oak fronts, quartz worktops – and “smart” storage.',
+            )
+            GalleryImage.objects.bulk_create(
+                GalleryImage(
+                    gallery_project=project,
+                    image=f'gallery/benchmark/photo-{order}.jpg',
+                    alt_text=f'Benchmark photo {order}',
+                    is_primary=(order == 0),
+                    order=order,
+                )
+                for order in range(size)
+            )
+            GalleryProject.objects.filter(pk=project.pk).refresh_image_summary()
+
+            project = GalleryProject.objects.select_related('gallery_category').get(pk=project.pk)
+            data = GalleryProjectDetailSerializer(project, context={'request': request}).data
+            transaction.set_rollback(True)
+        return data
+
+    def time_render(self, renderer, data, repeat):
+        """Average milliseconds per render"""
+        start = time.perf_counter()
+        for _ in range(repeat):
+            renderer.render(data)
+        return (time.perf_counter() - start) * 1000 / repeat
@@ -0,0 +1,176 @@
+"""
+Management command to export the public API as static JSON files
+Usage: python manage.py publish_snapshot [--base-url https://mobileriansa.com]
+
+Every public read endpoint is rendered for every language in API_LANGUAGES
+and every page, and written under SNAPSHOT_ROOT as
+
+    <lang>/api/<path>/index.json         first (or only) page
+    <lang>/api/<path>/page-<n>.json      page n of a paginated list
+
+so nginx or whitenoise can serve them directly. Only the bare ``lang`` and
+``page`` parameters are snapshotted; any other query (filters such as
+?featured=, ?category= or ?type=, ?fields=, ?page_size=) must reach Django,
+e.g. for nginx:
+
+    map $args $api_snapshot {
+        "~^lang=(?<l>[a-z]+)$"                        /$l$uri/index.json;
+        "~^lang=(?<l>[a-z]+)&page=1$"                 /$l$uri/index.json;
+        "~^lang=(?<l>[a-z]+)&page=(?<p>[0-9]+)$"      /$l$uri/page-$p.json;
+        "~^page=(?<p>[0-9]+)&lang=(?<l>[a-z]+)$"      /$l$uri/page-$p.json;
+        default                                       /no-snapshot;
+    }
+
+    location /api/ {
+        root <SNAPSHOT_ROOT>;
+        try_files $api_snapshot @django;
+    }
+
+Requests without ?lang= depend on Accept-Language and always reach Django.
+
+Runs are incremental: a manifest of content hashes is kept beside the files,
+and only files whose rendered content changed since the last run (because
+their source rows changed) are rewritten. Files for deleted rows, and for
+paths that failed to render, are removed so Django answers them instead.
+"""
+import hashlib
+import json
+import os
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.urls import resolve, reverse
+from django.utils.http import urlencode
+
+from furniture.models import GalleryCategory, GalleryProject, Service
+from api.cache import build_get_request
+
+
+MANIFEST_NAME = 'manifest.json'
+
+
+class Command(BaseCommand):
+    help = 'Render every public API endpoint to static JSON files for edge serving'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--base-url',
+            default='http://localhost:8000',
+            help='Public origin used for absolute URLs (media, next/previous links)',
+        )
+        parser.add_argument(
+            '--output',
+            default=settings.SNAPSHOT_ROOT,
+            help='Directory to write the snapshot to (default: SNAPSHOT_ROOT)',
+        )
+
+    def handle(self, *args, **options):
+        base_url = urlsplit(options['base_url'])
+        self.host = base_url.netloc
+        self.secure = base_url.scheme == 'https'
+        self.output = options['output']
+
+        manifest_path = os.path.join(self.output, MANIFEST_NAME)
+        try:
+            with open(manifest_path) as f:
+                self.previous = json.load(f)
+        except (FileNotFoundError, ValueError):
+            self.previous = {}
+
+        self.manifest = {}
+        self.stats = {'written': 0, 'unchanged': 0, 'removed': 0, 'failed': 0}
+
+        for language in settings.API_LANGUAGES:
+            self.stdout.write(f'Rendering snapshot for "{language}"...')
+            for path in self.get_paths():
+                try:
+                    self.render_pages(language, path)
+                except Exception as e:
+                    self.stats['failed'] += 1
+                    self.stderr.write(f'  ✗ {path}?lang={language} failed: {e!r}')
+
+        for relative_path in set(self.previous) - set(self.manifest):
+            try:
+                os.remove(os.path.join(self.output, relative_path))
+                self.stats['removed'] += 1
+            except FileNotFoundError:
+                pass
+
+        self.write_file(manifest_path, json.dumps(self.manifest, indent=2, sort_keys=True).encode('utf-8'))
+
+        self.stdout.write(self.style.SUCCESS(
+            'Snapshot published: {written} written, {unchanged} unchanged, '
+            '{removed} removed, {failed} failed.'.format(**self.stats)
+        ))
+
+    def get_paths(self):
+        """Every public GET endpoint, including one detail path per row"""
+        yield reverse('gallery-category-list')
+        for slug in GalleryCategory.objects.filter(is_active=True).values_list('slug', flat=True):
+            yield reverse('gallery-category-detail', kwargs={'slug': slug})
+            yield reverse('gallery-category-projects', kwargs={'slug': slug})
+
+        yield reverse('gallery-project-list')
+        # Project slugs are only unique per category, so walk the projects;
+        # a slug shared across categories renders (or fails) once
+        projects = GalleryProject.objects.filter(is_active=True).only('slug').order_by('pk')
+        yield from dict.fromkeys(
+            reverse('gallery-project-detail', kwargs={'slug': project.slug}) for project in projects
+        )
+
+        yield reverse('service-list')
+        for slug in Service.objects.filter(is_active=True).values_list('slug', flat=True):
+            yield reverse('service-detail', kwargs={'slug': slug})
+
+        yield reverse('material-list')
+        yield reverse('testimonial-list')
+        yield reverse('faq-list')
+        yield reverse('faq-categories')
+        yield reverse('featured-gallery')
+        yield reverse('home')
+
+    def render_pages(self, language, path):
+        """Render ``path`` and, for paginated lists, every following page"""
+        page = 1
+        while page:
+            query = {'lang': language}
+            if page > 1:
+                query['page'] = page
+
+            full_path = f'{path}?{urlencode(query)}'
+            request = build_get_request(self.host, self.secure, full_path, language)
+            match = resolve(path)
+            response = match.func(request, *match.args, **match.kwargs)
+            response.render()
+
+            if response.status_code != 200:
+                self.stats['failed'] += 1
+                self.stderr.write(f'  ✗ {full_path} returned {response.status_code}')
+                return
+
+            filename = 'index.json' if page == 1 else f'page-{page}.json'
+            self.save(os.path.join(language, path.strip('/'), filename), response.content)
+
+            data = json.loads(response.content)
+            page = page + 1 if isinstance(data, dict) and data.get('next') else None
+
+    def save(self, relative_path, content):
+        digest = hashlib.sha256(content).hexdigest()
+        self.manifest[relative_path] = digest
+        path = os.path.join(self.output, relative_path)
+
+        if self.previous.get(relative_path) == digest and os.path.exists(path):
+            self.stats['unchanged'] += 1
+            return
+
+        self.write_file(path, content)
+        self.stats['written'] += 1
+
+    def write_file(self, path, content):
+        """Write atomically, so the edge never serves a half-written file"""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(content)
+        os.replace(tmp_path, path)
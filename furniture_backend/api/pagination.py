@@ -0,0 +1,182 @@
+import hashlib
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from functools import partial
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Paginator as DjangoPaginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from .cache import get_generations
+
+
+class GalleryProjectPagination(PageNumberPagination):
+    """
+    Page numbers by default, keyset (cursor) pagination on request.
+
+    Passing ``?cursor=`` (empty for the first page) switches to a forward-only
+    keyset walk over (sort_order, -created_at, id), the order the gallery is
+    shown in. Each page seeks straight to its position through the composite
+    index on GalleryProject and never runs COUNT(*), so page N costs the same
+    as page 1. Follow ``next`` until it is null.
+    """
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def is_cursor_request(self, request):
+        return self.cursor_query_param in request.query_params
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_mode = self.is_cursor_request(request)
+        if not self.cursor_mode:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        page_size = self.get_page_size(request)
+        queryset = queryset.order_by('sort_order', '-created_at', 'id')
+
+        position = self.decode_cursor(request.query_params[self.cursor_query_param])
+        if position is not None:
+            sort_order, created_at, pk = position
+            queryset = queryset.filter(
+                Q(sort_order__gte=sort_order),
+                Q(sort_order__gt=sort_order)
+                | Q(created_at__lt=created_at)
+                | Q(created_at=created_at, id__gt=pk)
+            )
+
+        results = list(queryset[:page_size + 1])
+        self.has_next = len(results) > page_size
+        self.page_results = results[:page_size]
+        return self.page_results
+
+    def get_paginated_response(self, data):
+        if not self.cursor_mode:
+            return super().get_paginated_response(data)
+
+        return Response({
+            'next': self.get_next_link(),
+            'previous': None,
+            'results': data
+        })
+
+    def get_next_link(self):
+        if not self.cursor_mode:
+            return super().get_next_link()
+        if not self.has_next:
+            return None
+
+        last = self.page_results[-1]
+        url = remove_query_param(self.request.build_absolute_uri(), self.page_query_param)
+        return replace_query_param(
+            url, self.cursor_query_param,
+            self.encode_cursor(last.sort_order, last.created_at, last.pk)
+        )
+
+    def get_previous_link(self):
+        if not self.cursor_mode:
+            return super().get_previous_link()
+        return None
+
+    def encode_cursor(self, sort_order, created_at, pk):
+        payload = json.dumps([sort_order, created_at.isoformat(), pk])
+        return urlsafe_b64encode(payload.encode('ascii')).decode('ascii')
+
+    def decode_cursor(self, encoded):
+        if not encoded:
+            return None
+
+        try:
+            sort_order, created_at, pk = json.loads(urlsafe_b64decode(encoded.encode('ascii')))
+            created_at = parse_datetime(created_at)
+            if created_at is None:
+                raise ValueError
+            return int(sort_order), created_at, int(pk)
+        except (TypeError, ValueError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+
+def estimated_count(queryset):
+    """
+    Planner row estimate for an unfiltered table, or None when unavailable.
+    Only PostgreSQL keeps one (pg_class.reltuples); it is -1 before ANALYZE.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql' or queryset.query.where:
+        return None
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT reltuples::bigint FROM pg_class WHERE relname = %s',
+            [queryset.model._meta.db_table]
+        )
+        row = cursor.fetchone()
+    return row[0] if row and row[0] > 0 else None
+
+
+def count_models(queryset, models=()):
+    """
+    Every model whose writes can change the count of ``queryset``: its own,
+    those of the tables it joins (e.g. to filter on a related field) and
+    ``models``, typically the view's cache_models.
+    """
+    tables = {join.table_name for join in queryset.query.alias_map.values()}
+    joined = [model for model in apps.get_models() if model._meta.db_table in tables]
+    return list(dict.fromkeys([queryset.model, *joined, *models]))
+
+
+def cached_count(queryset, models=()):
+    """
+    COUNT(*) of ``queryset``, cached per SQL fingerprint and the generations
+    of every model it depends on (see count_models()).
+
+    Any save or delete of those models bumps a generation (api/signals.py),
+    so the cached total is exact; it is only reused between writes.
+    """
+    sql = str(queryset.query)
+    generations = get_generations(count_models(queryset, models))
+    fingerprint = hashlib.md5(sql.encode('utf-8')).hexdigest()
+    key = f'api:count:{queryset.model._meta.label_lower}:{fingerprint}:{":".join(map(str, generations))}'
+
+    count = cache.get(key)
+    if count is None:
+        threshold = getattr(settings, 'API_ESTIMATED_COUNT_THRESHOLD', 0)
+        estimate = estimated_count(queryset) if threshold else None
+        count = estimate if estimate is not None and estimate >= threshold else queryset.count()
+        cache.set(key, count, getattr(settings, 'API_CACHE_TIMEOUT', 60 * 60 * 24))
+    return count
+
+
+class CachedCountPaginator(DjangoPaginator):
+    def __init__(self, *args, models=(), **kwargs):
+        super().__init__(*args, **kwargs)
+        self.models = models
+
+    @cached_property
+    def count(self):
+        return cached_count(self.object_list, self.models)
+
+
+class CachedCountPagination(PageNumberPagination):
+    """
+    Page-number pagination that reuses the total across page fetches.
+
+    Set API_ESTIMATED_COUNT_THRESHOLD to report the planner estimate instead
+    of an exact count for unfiltered tables at least that large.
+    """
+    django_paginator_class = CachedCountPaginator
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.django_paginator_class = partial(
+            CachedCountPaginator, models=tuple(getattr(view, 'cache_models', ()))
+        )
+        return super().paginate_queryset(queryset, request, view)
@@ -0,0 +1,86 @@
+"""
+Optional orjson-backed JSON renderer and parser.
+
+Both fall back to DRF's stdlib implementations when orjson is not installed,
+and for every case orjson cannot reproduce byte for byte (indented output,
+ASCII-only output, non-UTF-8 request bodies, non-strict NaN handling, floats
+in exponent form and out-of-range floats, which strict rendering refuses).
+Non-native types (datetime, Decimal, UUID, lazy strings, ...) go through
+DRF's own JSONEncoder.default, so they are encoded exactly as before.
+Install it from requirements-optional.txt, then enable with API_FAST_JSON=True;
+measure first with manage.py benchmark_json.
+"""
+import math
+import re
+
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+
+# orjson writes 1e16 and 1e-7 where the stdlib writes 1e+16 and 1e-07. This
+# also matches such text inside strings, which merely costs a fallback.
+EXPONENT_RE = re.compile(rb'[0-9]e[-+]?[0-9]')
+
+
+def has_non_finite_float(data):
+    """Whether NaN or an infinity is nested anywhere in ``data``"""
+    if isinstance(data, float):
+        return not math.isfinite(data)
+    if isinstance(data, dict):
+        data = data.values()
+    elif not isinstance(data, (list, tuple)):
+        return False
+    return any(has_non_finite_float(item) for item in data)
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSONRenderer producing the same bytes via orjson when it can"""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or self.ensure_ascii or not self.compact:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(
+                data,
+                default=JSONEncoder().default,
+                option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+            )
+        except orjson.JSONEncodeError:
+            # e.g. integers wider than 64 bits; let the stdlib handle it
+            return super().render(data, accepted_media_type, renderer_context)
+
+        # orjson writes NaN and infinities as null, where strict rendering raises
+        if EXPONENT_RE.search(ret) or (b'null' in ret and has_non_finite_float(data)):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        # Same strict-javascript-subset escaping as JSONRenderer
+        return ret.replace('\u2028'.encode(), b'\\u2028').replace('\u2029'.encode(), b'\\u2029')
+
+
+class FastJSONParser(JSONParser):
+    """JSONParser decoding UTF-8 request bodies via orjson"""
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+
+        if orjson is None or not self.strict or encoding.lower().replace('-', '') != 'utf8':
+            return super().parse(stream, media_type, parser_context)
+
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
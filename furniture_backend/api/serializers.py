@@ -1,22 +1,66 @@
+import os
+
+from django.conf import settings
+from django.core.validators import get_available_image_extensions
 from rest_framework import serializers
 from furniture.models import (
     GalleryCategory, GalleryProject, GalleryImage,
     CustomRequest, ContactMessage, ContactImage,
-    Service, Material, Testimonial, FAQ
+    Service, Material, Testimonial, FAQ, UploadSession
 )
 
 
+class SparseFieldsMixin:
+    """
+    Accept ``fields`` (keep only these) and ``omit`` (drop these) kwargs.
+    Public views pass them from the query string, see api/fieldsets.py.
+    """
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        omit = kwargs.pop('omit', None)
+        super().__init__(*args, **kwargs)
+
+        for name in list(self.fields):
+            if (fields and name not in fields) or (omit and name in omit):
+                self.fields.pop(name)
+
+
+class SrcsetField(serializers.Field):
+    """
+    ``{format: srcset}`` built from an image's derivatives, e.g.
+    ``{"webp": "https://.../x_320w.webp 320w, https://.../x_640w.webp 640w"}``.
+    Views prefetch ``derivatives`` so this costs no query per row.
+    """
+    def __init__(self, **kwargs):
+        kwargs['source'] = 'derivatives'
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, derivatives):
+        request = self.context.get('request')
+        srcset = {}
+        for derivative in derivatives.all():
+            url = derivative.file.url
+            if request is not None:
+                url = request.build_absolute_uri(url)
+            srcset.setdefault(derivative.format, []).append(f'{url} {derivative.width}w')
+        return {image_format: ', '.join(candidates) for image_format, candidates in srcset.items()}
+
+
 # Gallery Serializers
 class GalleryImageSerializer(serializers.ModelSerializer):
+    srcset = SrcsetField()
+
     class Meta:
         model = GalleryImage
         fields = [
-            'id', 'image', 'title', 'description', 'alt_text',
+            'id', 'image', 'srcset', 'width', 'height', 'file_size',
+            'dominant_color', 'placeholder', 'title', 'description', 'alt_text',
             'is_primary', 'is_before_image', 'tags', 'order', 'created_at'
         ]
 
 
-class GalleryProjectListSerializer(serializers.ModelSerializer):
+class GalleryProjectListSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     primary_image = GalleryImageSerializer(read_only=True)
     image_count = serializers.IntegerField(read_only=True)
     category_name = serializers.CharField(source='gallery_category.name', read_only=True)
@@ -31,7 +75,7 @@ class GalleryProjectListSerializer(serializers.ModelSerializer):
         ]
 
 
-class GalleryProjectDetailSerializer(serializers.ModelSerializer):
+class GalleryProjectDetailSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     images = GalleryImageSerializer(many=True, read_only=True)
     gallery_category = serializers.StringRelatedField(read_only=True)
     image_count = serializers.IntegerField(read_only=True)
@@ -46,22 +90,25 @@ class GalleryProjectDetailSerializer(serializers.ModelSerializer):
         ]
 
 
-class GalleryCategorySerializer(serializers.ModelSerializer):
+class GalleryCategorySerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    cover_image_srcset = SrcsetField()
     projects = serializers.SerializerMethodField()
-    project_count = serializers.IntegerField(read_only=True)
-    total_images = serializers.IntegerField(read_only=True)
+    project_count = serializers.IntegerField(source='active_project_count', read_only=True)
+    total_images = serializers.IntegerField(source='image_count', read_only=True)
 
     class Meta:
         model = GalleryCategory
         fields = [
-            'id', 'name', 'slug', 'description', 'cover_image',
+            'id', 'name', 'slug', 'description', 'cover_image', 'cover_image_srcset',
             'projects', 'project_count', 'total_images', 'created_at'
         ]
 
     def get_projects(self, obj):
         # Only include projects if specifically requested
         if self.context.get('include_projects', False):
-            projects = obj.gallery_projects.filter(is_active=True)
+            projects = obj.gallery_projects.filter(
+                is_active=True
+            ).select_related('gallery_category').with_image_summary()
             return GalleryProjectListSerializer(
                 projects,
                 many=True,
@@ -77,6 +124,31 @@ class AdminGalleryImageSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
+class UploadSessionSerializer(serializers.ModelSerializer):
+    expires_at = serializers.DateTimeField(read_only=True)
+
+    class Meta:
+        model = UploadSession
+        fields = [
+            'id', 'gallery_project', 'filename', 'length', 'offset',
+            'title', 'alt_text', 'description', 'created_at', 'expires_at'
+        ]
+        read_only_fields = ['offset']
+
+    def validate_filename(self, value):
+        extension = os.path.splitext(value)[1].lstrip('.').lower()
+        if extension not in get_available_image_extensions():
+            raise serializers.ValidationError(f'Unsupported image type: {extension or value}')
+        return os.path.basename(value)
+
+    def validate_length(self, value):
+        if not 0 < value <= settings.UPLOAD_SESSION_MAX_BYTES:
+            raise serializers.ValidationError(
+                f'Must be between 1 and {settings.UPLOAD_SESSION_MAX_BYTES} bytes'
+            )
+        return value
+
+
 class AdminGalleryProjectSerializer(serializers.ModelSerializer):
     images = AdminGalleryImageSerializer(many=True, read_only=True)
     category_name = serializers.CharField(source='gallery_category.name', read_only=True)
@@ -98,8 +170,8 @@ class AdminGalleryProjectSerializer(serializers.ModelSerializer):
 
 class AdminGalleryCategorySerializer(serializers.ModelSerializer):
     projects = AdminGalleryProjectSerializer(source='gallery_projects', many=True, read_only=True)
-    project_count = serializers.IntegerField(read_only=True)
-    total_images = serializers.IntegerField(read_only=True)
+    project_count = serializers.IntegerField(source='active_project_count', read_only=True)
+    total_images = serializers.IntegerField(source='image_count', read_only=True)
 
     class Meta:
         model = GalleryCategory
@@ -118,7 +190,10 @@ class ContactImageSerializer(serializers.ModelSerializer):
     """Serializer for ContactImage model"""
     class Meta:
         model = ContactImage
-        fields = ['id', 'image', 'alt_text', 'created_at']
+        fields = [
+            'id', 'image', 'width', 'height', 'file_size',
+            'dominant_color', 'placeholder', 'alt_text', 'created_at'
+        ]
         read_only_fields = ['created_at']
 
 
@@ -195,29 +270,32 @@ class AdminCustomRequestSerializer(serializers.ModelSerializer):
 
 
 # Service & Material Serializers
-class ServiceSerializer(serializers.ModelSerializer):
+class ServiceSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Serializer for Service model"""
+    srcset = SrcsetField()
+
     class Meta:
         model = Service
         fields = [
             'id', 'title', 'slug', 'short_description', 'description',
-            'image', 'icon', 'is_active', 'sort_order', 'created_at'
+            'image', 'srcset', 'icon', 'is_active', 'sort_order', 'created_at'
         ]
 
 
-class MaterialSerializer(serializers.ModelSerializer):
+class MaterialSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Serializer for Material model"""
     type_display = serializers.CharField(source='get_type_display', read_only=True)
+    srcset = SrcsetField()
 
     class Meta:
         model = Material
         fields = [
-            'id', 'name', 'type', 'type_display', 'description', 'image',
+            'id', 'name', 'type', 'type_display', 'description', 'image', 'srcset',
             'is_active', 'sort_order', 'created_at'
         ]
 
 
-class TestimonialSerializer(serializers.ModelSerializer):
+class TestimonialSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Serializer for Testimonial model"""
     project_title = serializers.CharField(source='project.title', read_only=True)
     project_slug = serializers.CharField(source='project.slug', read_only=True)
@@ -230,7 +308,7 @@ class TestimonialSerializer(serializers.ModelSerializer):
         ]
 
 
-class FAQSerializer(serializers.ModelSerializer):
+class FAQSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Serializer for FAQ model"""
     category_display = serializers.CharField(source='get_category_display', read_only=True)
 
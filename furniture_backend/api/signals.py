@@ -0,0 +1,64 @@
+"""
+Cache invalidation signals for the API.
+
+Any write to a model served by the public API bumps that model's generation
+once it commits, which retires every cached response built from it (see
+api/cache.py). Models
+paged by the admin API are tracked too, for their cached page counts
+(see api/pagination.py). Image data written outside save(), such as
+derivatives rendered after the write commits, invalidates the model again,
+and so do set-based writes announced with rows_changed. A QuerySet.delete()
+sends post_delete for every row, but invalidates each model only once.
+
+The landing page bundle is rebuilt after writes to what it shows, at most
+once per transaction and once per request, after the response is sent.
+"""
+from functools import partial
+
+from django.core.signals import request_finished, request_started
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+
+from furniture.images import images_updated
+from furniture.models import (
+    GalleryCategory, GalleryProject, GalleryImage,
+    CustomRequest, ContactMessage,
+    Service, Material, Testimonial, FAQ, first_in_bulk_delete, rows_changed
+)
+from .cache import bump_generation, run_request_warms, start_request_warms, warm_after_write
+from .views import HomeBundleView
+
+
+CACHED_MODELS = (
+    GalleryCategory, GalleryProject, GalleryImage,
+    CustomRequest, ContactMessage,
+    Service, Material, Testimonial, FAQ,
+)
+
+
+def invalidate_api_cache(sender, origin=None, using=None, **kwargs):
+    """Bump the generation of a cached model once its write commits"""
+    if first_in_bulk_delete(origin, ('api_cache', sender)):
+        # Not before: a read in between would cache the old rows under the new generation
+        transaction.on_commit(partial(bump_generation, sender), using=using)
+
+
+def warm_home_bundle(sender, **kwargs):
+    """Rebuild the landing page bundle once the write is complete"""
+    warm_after_write(HomeBundleView.warm_name, HomeBundleView.as_view())
+
+
+for model in CACHED_MODELS:
+    post_save.connect(invalidate_api_cache, sender=model)
+    post_delete.connect(invalidate_api_cache, sender=model)
+    images_updated.connect(invalidate_api_cache, sender=model)
+    rows_changed.connect(invalidate_api_cache, sender=model)
+
+for model in HomeBundleView.cache_models:
+    post_save.connect(warm_home_bundle, sender=model)
+    post_delete.connect(warm_home_bundle, sender=model)
+    images_updated.connect(warm_home_bundle, sender=model)
+    rows_changed.connect(warm_home_bundle, sender=model)
+
+request_started.connect(start_request_warms, dispatch_uid='api:start_request_warms')
+request_finished.connect(run_request_warms, dispatch_uid='api:run_request_warms')
@@ -1,3 +1,1069 @@
-from django.test import TestCase
+import datetime
+import decimal
+import io
+import json
+import os
+import shutil
+import tempfile
+import time
+import uuid
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils.translation import gettext_lazy
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from furniture.models import ContactImage, GalleryCategory, GalleryProject, GalleryImage, MediaBlob
+from furniture.ordering import spaced_position
+from .renderers import FastJSONParser, FastJSONRenderer
+
+
+TEST_MEDIA_ROOT = os.path.join(tempfile.gettempdir(), 'ansa-test-media')
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT)
+class GalleryProjectListQueryTests(TestCase):
+    """The project list endpoints must cost the same queries for any page size"""
+
+    def setUp(self):
+        cache.clear()
+        self.category = GalleryCategory.objects.create(name='Kitchens')
+
+    def create_projects(self, count, images_per_project=3):
+        for i in range(count):
+            project = GalleryProject.objects.create(
+                gallery_category=self.category,
+                title=f'Kitchen {i}',
+                featured=True
+            )
+            for order in range(images_per_project):
+                GalleryImage.objects.create(
+                    gallery_project=project,
+                    image=SimpleUploadedFile(f'photo{order}.jpg', b'data'),
+                    is_primary=(order == 0),
+                    order=order
+                )
+
+    def assertListQueries(self, url, num):
+        cache.clear()
+        ContentType.objects.get_for_models(GalleryCategory, GalleryImage)
+        with self.assertNumQueries(num):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_project_list_query_count_is_constant(self):
+        self.create_projects(2)
+        self.assertListQueries('/api/gallery-projects/', 3)
+
+        self.create_projects(10)
+        response = self.assertListQueries('/api/gallery-projects/', 3)
+
+        results = response.json()['results']
+        self.assertEqual(len(results), 12)
+        self.assertEqual(results[0]['image_count'], 3)
+        self.assertTrue(results[0]['primary_image']['is_primary'])
+
+    def test_featured_list_query_count_is_constant(self):
+        self.create_projects(2)
+        self.assertListQueries('/api/featured-gallery/', 3)
+
+        self.create_projects(10)
+        self.assertListQueries('/api/featured-gallery/', 3)
+
+    def test_category_projects_query_count_is_constant(self):
+        url = f'/api/gallery-categories/{self.category.slug}/projects/'
+        self.create_projects(2)
+        self.assertListQueries(url, 3)
+
+        self.create_projects(10)
+        response = self.assertListQueries(url, 3)
+        self.assertEqual(len(response.json()), 12)
+
+    def test_project_without_images(self):
+        self.create_projects(1, images_per_project=0)
+        response = self.assertListQueries('/api/gallery-projects/', 2)
+
+        project = response.json()['results'][0]
+        self.assertEqual(project['image_count'], 0)
+        self.assertIsNone(project['primary_image'])
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT)
+class SparseFieldsetTests(TestCase):
+    """?fields= and ?omit= trim the output and the columns loaded, never adding queries"""
+
+    setUp = GalleryProjectListQueryTests.setUp
+    create_projects = GalleryProjectListQueryTests.create_projects
+    assertListQueries = GalleryProjectListQueryTests.assertListQueries
+
+    def test_fields_and_omit_shape_output(self):
+        self.create_projects(1)
+        project = self.client.get('/api/gallery-projects/?fields=title,slug').json()['results'][0]
+        self.assertEqual(set(project), {'title', 'slug'})
+
+        project = self.client.get('/api/gallery-projects/?omit=description,primary_image').json()['results'][0]
+        self.assertNotIn('description', project)
+        self.assertNotIn('primary_image', project)
+        self.assertIn('image_count', project)
+
+    def test_unknown_fields_are_ignored(self):
+        self.create_projects(1)
+        project = self.client.get('/api/gallery-projects/?fields=title,bogus').json()['results'][0]
+        self.assertEqual(set(project), {'title'})
+        self.assertEqual(self.client.get('/api/gallery-projects/?fields=bogus').json()['results'], [{}])
+
+        full = self.client.get('/api/gallery-projects/').json()['results'][0]
+        self.assertEqual(self.client.get('/api/gallery-projects/?omit=bogus').json()['results'][0], full)
+
+    def test_unused_columns_are_deferred(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        self.create_projects(1)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/api/gallery-projects/?fields=title,slug')
+        sql = ' '.join(query['sql'] for query in queries)
+        self.assertIn('"furniture_galleryproject"."title"', sql)
+        self.assertNotIn('"furniture_galleryproject"."description"', sql)
+        self.assertNotIn('"furniture_galleryproject"."materials_used"', sql)
+
+    def test_sparse_lists_have_no_n_plus_one(self):
+        url = '/api/gallery-projects/?fields=title,category_name,primary_image,image_count'
+        self.create_projects(2)
+        self.assertListQueries(url, 3)
+
+        self.create_projects(10)
+        results = self.assertListQueries(url, 3).json()['results']
+        self.assertEqual(len(results), 12)
+        self.assertEqual(results[0]['category_name'], 'Kitchens')
+
+    def test_sparse_method_fields_have_no_n_plus_one(self):
+        from furniture.models import Service
+
+        ContentType.objects.get_for_model(Service)
+        for count in (2, 10):
+            for i in range(count):
+                Service.objects.create(title=f'Service {count}-{i}', description='-')
+            # COUNT, the page, and one query for every row's derivatives
+            self.assertListQueries('/api/services/?fields=title,srcset', 3)
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT)
+class GalleryCategoryListQueryTests(TestCase):
+    """Category counts are stored on the row, not computed per request"""
+
+    def setUp(self):
+        cache.clear()
+
+    def create_category(self, name, active_projects=2, inactive_projects=1):
+        category = GalleryCategory.objects.create(name=name)
+        for i in range(active_projects + inactive_projects):
+            project = GalleryProject.objects.create(
+                gallery_category=category,
+                title=f'{name} {i}',
+                is_active=i < active_projects
+            )
+            GalleryImage.objects.create(
+                gallery_project=project,
+                image=SimpleUploadedFile('photo.jpg', b'data')
+            )
+        return category
+
+    def test_category_list_counts_in_one_query(self):
+        self.create_category('Kitchens')
+        ContentType.objects.get_for_model(GalleryCategory)
+        with self.assertNumQueries(3):  # pagination COUNT + list + cover derivatives
+            self.client.get('/api/gallery-categories/')
+
+        for name in ('Wardrobes', 'Offices', 'Bedrooms'):
+            self.create_category(name)
+        cache.clear()
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/gallery-categories/')
+
+        results = response.json()['results']
+        self.assertEqual(len(results), 4)
+        for category in results:
+            self.assertEqual(category['project_count'], 2)
+            self.assertEqual(category['total_images'], 2)
+
+
+class GalleryProjectCursorPaginationTests(TestCase):
+    """?cursor= walks the gallery in display order without COUNT(*)"""
+
+    def setUp(self):
+        cache.clear()
+        self.category = GalleryCategory.objects.create(name='Kitchens')
+        for i in range(30):
+            GalleryProject.objects.create(
+                gallery_category=self.category,
+                title=f'Kitchen {i}',
+                sort_order=i % 3
+            )
+
+    def test_cursor_walk_matches_display_order(self):
+        expected = list(
+            GalleryProject.objects.order_by('sort_order', '-created_at', 'id').values_list('slug', flat=True)
+        )
+
+        seen = []
+        url = '/api/gallery-projects/?cursor='
+        while url:
+            with self.assertNumQueries(1):
+                response = self.client.get(url)
+            data = response.json()
+            self.assertNotIn('count', data)
+            seen.extend(project['slug'] for project in data['results'])
+            url = data['next']
+
+        self.assertEqual(seen, expected)
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/gallery-projects/?cursor=not-a-cursor')
+        self.assertEqual(response.status_code, 404)
+
+    def test_page_numbers_still_default(self):
+        data = self.client.get('/api/gallery-projects/').json()
+        self.assertEqual(data['count'], 30)
+        self.assertEqual(len(data['results']), 12)
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT)
+class CachedCountTests(TestCase):
+    """Cached page totals are retired by writes to any model the count depends on"""
+
+    def setUp(self):
+        cache.clear()
+        self.category = GalleryCategory.objects.create(name='Kitchens')
+        self.project = GalleryProject.objects.create(gallery_category=self.category, title='Oak kitchen')
+        GalleryImage.objects.create(gallery_project=self.project, image=SimpleUploadedFile('photo.jpg', b'data'))
+
+    def test_joined_models_invalidate(self):
+        from .pagination import cached_count
+
+        images = GalleryImage.objects.filter(gallery_project__is_active=True)
+        self.assertEqual(cached_count(images), 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(cached_count(images), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.project.is_active = False
+            self.project.save()
+        self.assertEqual(cached_count(images), 0)
+
+    def test_view_cache_models_invalidate(self):
+        from types import SimpleNamespace
+        from rest_framework.request import Request
+        from rest_framework.test import APIRequestFactory
+        from .pagination import CachedCountPagination
+
+        def count():
+            pagination = CachedCountPagination()
+            request = Request(APIRequestFactory().get('/'))
+            pagination.paginate_queryset(
+                GalleryProject.objects.order_by('pk'), request, SimpleNamespace(cache_models=(GalleryCategory,))
+            )
+            return pagination.page.paginator.count
+
+        self.assertEqual(count(), 1)
+        # A write that sends no signal for GalleryProject goes unnoticed...
+        GalleryProject.objects.bulk_create([GalleryProject(gallery_category=self.category, title='Walnut', slug='walnut')])
+        self.assertEqual(count(), 1)
+        # ...until any of the view's cache_models changes
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category.save()
+        self.assertEqual(count(), 2)
+
+
+class CachedResponseTests(TestCase):
+    """Public responses come from the cache until a write bumps their generation"""
+
+    def setUp(self):
+        from furniture.models import Service
+
+        cache.clear()
+        self.service = Service.objects.create(title='Kitchens', description='Fitted kitchens')
+
+    def get(self, url='/api/services/', **extra):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, **extra)
+        self.assertEqual(response.status_code, 200)
+        return response, len(queries)
+
+    def test_hit_and_miss(self):
+        first, misses = self.get()
+        self.assertGreater(misses, 0)
+        second, hits = self.get()
+        self.assertEqual(hits, 0)
+        self.assertEqual(first.content, second.content)
+
+        # Another query string is another entry
+        _, misses = self.get('/api/services/?fields=title')
+        self.assertGreater(misses, 0)
+
+    def test_save_and_delete_invalidate(self):
+        self.get()
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.service.title = 'Wardrobes'
+            self.service.save()
+            # Uncommitted: readers still get the committed rows from the cache
+            self.assertEqual(self.get()[1], 0)
+        for callback in callbacks:
+            callback()
+        response, misses = self.get()
+        self.assertGreater(misses, 0)
+        self.assertIn('Wardrobes', response.content.decode())
+
+        # Other models' entries are untouched
+        self.get('/api/faqs/')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.service.delete()
+        response, misses = self.get()
+        self.assertGreater(misses, 0)
+        self.assertNotIn('Wardrobes', response.content.decode())
+        self.assertEqual(self.get('/api/faqs/')[1], 0)
+
+    def test_keyed_per_language(self):
+        english, _ = self.get(HTTP_ACCEPT_LANGUAGE='en')
+        italian, misses = self.get(HTTP_ACCEPT_LANGUAGE='it-IT,it;q=0.9')
+        self.assertGreater(misses, 0)
+        self.assertIn('Accept-Language', english['Vary'])
+
+        # ?lang= and Accept-Language name the same entry; unknown languages get the default
+        self.assertEqual(self.get('/api/services/?lang=it')[1], 0)
+        self.assertEqual(self.get(HTTP_ACCEPT_LANGUAGE='de')[1], 0)
+        self.assertNotEqual(english['ETag'], italian['ETag'])
+
+
+class ConditionalRequestTests(TestCase):
+    """Revalidating clients get a 304 without any query until a write"""
+
+    def setUp(self):
+        from furniture.models import Service
+
+        cache.clear()
+        self.service = Service.objects.create(title='Kitchens', description='Fitted kitchens')
+        self.response = self.client.get('/api/services/')
+
+    def test_if_none_match(self):
+        etag = self.response['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/services/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['ETag'], etag)
+
+        self.assertEqual(self.client.get('/api/services/', HTTP_IF_NONE_MATCH='"other"').status_code, 200)
+
+    def test_if_modified_since(self):
+        last_modified = self.response['Last-Modified']
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/services/', HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+    def test_validators_change_after_write(self):
+        from unittest import mock
+
+        etag, last_modified = self.response['ETag'], self.response['Last-Modified']
+        # Last-Modified has one-second resolution: write a second later
+        with mock.patch('api.cache.time.time', return_value=time.time() + 1), \
+                self.captureOnCommitCallbacks(execute=True):
+            self.service.title = 'Wardrobes'
+            self.service.save()
+
+        response = self.client.get('/api/services/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertIn('Wardrobes', response.content.decode())
+
+        response = self.client.get('/api/services/', HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['Last-Modified'], last_modified)
+
+
+class FastJSONTests(SimpleTestCase):
+    """FastJSONRenderer/FastJSONParser are drop-in replacements for DRF's"""
+
+    def test_renders_identical_bytes(self):
+        data = {
+            'created_at': datetime.datetime(2024, 1, 2, 3, 4, 5, 678000, tzinfo=datetime.timezone.utc),
+            'project_date': datetime.date(2024, 1, 2),
+            'duration': datetime.timedelta(hours=1),
+            'price': decimal.Decimal('12.50'),
+            'uuid': uuid.UUID(int=1),
+            'label': gettext_lazy('Kitchens'),
+            'text': 'Cucina “su misura” – Tiranë \u2028',
+            'tags': ('oak', 'quartz'),
+            1: None,
+        }
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_floats_render_like_stdlib(self):
+        data = {'big': 1e16, 'small': [1e-7, 2.5], 'text': 'grade 1e5 oak', 'none': None}
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+        for value in (float('nan'), float('inf')):
+            data = {'results': [{'score': value, 'primary_image': None}]}
+            with self.assertRaises(ValueError):
+                JSONRenderer().render(data)
+            with self.assertRaises(ValueError):
+                FastJSONRenderer().render(data)
+
+    def test_parses_like_stdlib(self):
+        body = '{"name": "Tiranë", "values": [1, 2.5, null, true]}'.encode('utf-8')
+        self.assertEqual(
+            FastJSONParser().parse(io.BytesIO(body)),
+            JSONParser().parse(io.BytesIO(body))
+        )
+
+    def test_parse_error(self):
+        with self.assertRaises(ParseError):
+            FastJSONParser().parse(io.BytesIO(b'{"name": '))
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT, IMAGE_DERIVATIVE_RENDERING='inline')
+class SimilarProjectsTests(TestCase):
+    """/similar/ ranks other active projects by their closest image"""
+
+    def setUp(self):
+        cache.clear()
+        self.category = GalleryCategory.objects.create(name='Kitchens')
+
+    def create_project(self, title, image, **kwargs):
+        from io import BytesIO
+        project = GalleryProject.objects.create(gallery_category=self.category, title=title, **kwargs)
+        buffer = BytesIO()
+        image.save(buffer, 'PNG')
+        with self.captureOnCommitCallbacks(execute=True):
+            GalleryImage.objects.create(
+                gallery_project=project, image=SimpleUploadedFile('photo.png', buffer.getvalue())
+            )
+        return project
+
+    def test_similar_projects(self):
+        from PIL import Image
+
+        gradient = Image.linear_gradient('L').resize((128, 128)).convert('RGB').rotate(90)
+        project = self.create_project('Oak', gradient)
+        self.create_project('Oak copy', gradient.point(lambda value: min(255, value + 8)))
+        self.create_project('Hidden copy', gradient, is_active=False)
+        self.create_project('Other', gradient.rotate(180))
+
+        response = self.client.get(f'/api/gallery-projects/{project.slug}/similar/?distance=4')
+        self.assertEqual([p['title'] for p in response.json()], ['Oak copy'])
+
+        response = self.client.get(f'/api/gallery-projects/{project.slug}/similar/?distance=99')
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT, INTAKE_WORKERS=2, INTAKE_MAX_PIXELS=20_000)
+class CustomRequestIntakeTests(TestCase):
+    """Customer photos are upright, downscaled and stripped of metadata"""
+
+    def photo(self, name, width, height, orientation):
+        from io import BytesIO
+        from PIL import Image
+
+        exif = Image.Exif()
+        exif[0x0112] = orientation
+        exif[0x010f] = 'PhoneMaker'
+        buffer = BytesIO()
+        Image.new('RGB', (width, height), (90, 60, 30)).save(buffer, 'JPEG', exif=exif)
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/jpeg')
+
+    def test_photos_are_sanitized(self):
+        from PIL import Image
+
+        response = self.client.post('/api/custom-request/', {
+            'name': 'Ana',
+            'email': 'ana@example.com',
+            'message': 'A kitchen like this',
+            'images': [
+                self.photo('kitchen.jpg', 400, 200, orientation=6),
+                SimpleUploadedFile('notes.jpg', b'not an image'),
+            ],
+        })
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['rejected_images'], ['notes.jpg'])
+
+        contact_image = ContactImage.objects.get()
+        with contact_image.image.open('rb') as f:
+            image = Image.open(f)
+            image.load()
+        # Rotated upright, then scaled under 20k pixels
+        self.assertLess(image.width, image.height)
+        self.assertLessEqual(image.width * image.height, 20_000)
+        self.assertFalse(image.getexif())
+
+
+@override_settings(
+    MEDIA_ROOT=TEST_MEDIA_ROOT,
+    IMAGE_DERIVATIVE_WIDTHS=[320],
+    IMAGE_DERIVATIVE_RENDERING='inline',
+)
+class ResumableUploadTests(TestCase):
+    """Gallery images uploaded in chunks, resuming after a failed one"""
+
+    def setUp(self):
+        from django.contrib.auth.models import User
+        from PIL import Image
+
+        self.upload_root = tempfile.mkdtemp(prefix='ansa-uploads-')
+        self.addCleanup(shutil.rmtree, self.upload_root, ignore_errors=True)
+        settings_override = self.settings(UPLOAD_SESSION_ROOT=self.upload_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'secret'))
+        category = GalleryCategory.objects.create(name='Kitchens')
+        self.project = GalleryProject.objects.create(gallery_category=category, title='Oak kitchen')
+
+        buffer = io.BytesIO()
+        Image.effect_noise((300, 200), 64).convert('RGB').save(buffer, 'JPEG')
+        self.content = buffer.getvalue()
+
+    def start(self, **data):
+        response = self.client.post('/api/admin/uploads/', {
+            'gallery_project': self.project.pk, 'filename': 'kitchen.jpg', 'length': len(self.content), **data
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 201, response.content)
+        return response['Location'], response.json()['id']
+
+    def patch(self, url, offset, data):
+        return self.client.patch(
+            url, data, content_type='application/offset+octet-stream', HTTP_UPLOAD_OFFSET=str(offset)
+        )
+
+    def test_chunked_upload_with_retry(self):
+        from furniture.models import UploadSession
+
+        url, session_id = self.start(title='Worktop')
+        half = len(self.content) // 2
+
+        self.assertEqual(self.patch(url, 0, self.content[:half]).status_code, 200)
+        # A retried chunk at a stale offset is refused and told where to resume
+        response = self.patch(url, 0, self.content[:half])
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response['Upload-Offset'], str(half))
+
+        response = self.client.head(url)
+        self.assertEqual(response['Upload-Offset'], str(half))
+
+        self.assertEqual(self.client.post(f'{url}finalize/').status_code, 409)
+        self.assertEqual(self.patch(url, half, self.content[half:] + b'extra').status_code, 413)
+        self.assertEqual(self.patch(url, half, self.content[half:])['Upload-Offset'], str(len(self.content)))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(f'{url}finalize/')
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(response.json()['title'], 'Worktop')
+
+        image = GalleryImage.objects.get()
+        self.assertTrue(image.is_primary)
+        self.assertEqual((image.width, image.height), (300, 200))
+        with image.image.open('rb') as f:
+            self.assertEqual(f.read(), self.content)
+        self.assertFalse(UploadSession.objects.filter(pk=session_id).exists())
+        self.assertEqual(MediaBlob.objects.get(name=image.image.name).ref_count, 1)
+        self.assertEqual(os.listdir(self.upload_root), [])
+        self.project.refresh_from_db()
+        self.assertEqual(self.project.image_count, 1)
+
+    def test_failed_finalize_can_be_retried(self):
+        from unittest import mock
+        from django.db import DatabaseError
+        from furniture.models import UploadSession
+        from furniture.uploads import finalize_upload
+
+        url, session_id = self.start()
+        self.patch(url, 0, self.content)
+        session = UploadSession.objects.get(pk=session_id)
+
+        with mock.patch.object(UploadSession, 'delete', side_effect=DatabaseError('gone away')), \
+                self.assertRaises(DatabaseError):
+            finalize_upload(session)
+        self.assertFalse(GalleryImage.objects.exists())
+        self.assertFalse(MediaBlob.objects.filter(ref_count__gt=0).exists())
+        with open(session.path, 'rb') as f:
+            self.assertEqual(f.read(), self.content)
+
+        # The part file is only removed once the session's deletion commits
+        with self.captureOnCommitCallbacks() as callbacks:
+            image = finalize_upload(UploadSession.objects.get(pk=session_id))
+        self.assertTrue(os.path.exists(session.path))
+        for callback in callbacks:
+            callback()
+        self.assertFalse(os.path.exists(session.path))
+        with image.image.open('rb') as f:
+            self.assertEqual(f.read(), self.content)
+        self.assertEqual(MediaBlob.objects.get(name=image.image.name).ref_count, 1)
+
+    def test_invalid_image_and_abandoned_upload(self):
+        url, _ = self.start(length=10)
+        self.patch(url, 0, b'not a jpeg')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(f'{url}finalize/')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.head(url).status_code, 404)
+
+        url, _ = self.start()
+        self.patch(url, 0, self.content[:100])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.delete(url).status_code, 204)
+        self.assertEqual(os.listdir(self.upload_root), [])
+        self.assertFalse(GalleryImage.objects.exists())
+
+
+@override_settings(
+    MEDIA_ROOT=TEST_MEDIA_ROOT,
+    IMAGE_DERIVATIVE_WIDTHS=[320],
+    IMAGE_DERIVATIVE_RENDERING='inline',
+)
+class BulkImageIngestTests(TestCase):
+    """Admin image uploads cost the same queries for any number of files"""
+
+    def setUp(self):
+        from django.contrib.auth.models import User
+
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'secret'))
+        self.category = GalleryCategory.objects.create(name='Kitchens')
+        self.project = GalleryProject.objects.create(gallery_category=self.category, title='Oak kitchen')
+        ContentType.objects.get_for_model(GalleryImage)
+
+    def photos(self, count, offset=0):
+        from PIL import Image
+
+        files = []
+        for i in range(count):
+            buffer = io.BytesIO()
+            Image.new('RGB', (400, 300), (offset + i * 10, 80, 40)).save(buffer, 'JPEG')
+            files.append(SimpleUploadedFile(f'photo{i}.jpg', buffer.getvalue(), content_type='image/jpeg'))
+        return files
+
+    def upload(self, photos):
+        url = f'/api/admin/gallery-projects/{self.project.pk}/upload_images/'
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.post(url, {'images': photos})
+        self.assertEqual(response.status_code, 201, response.content)
+        return response, callbacks
+
+    def test_queries_do_not_grow_with_images(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        with CaptureQueriesContext(connection) as few:
+            self.upload(self.photos(2))
+        with CaptureQueriesContext(connection) as many:
+            self.upload(self.photos(12, offset=100))
+        self.assertEqual(len(many), len(few))
+
+    def test_ingested_images_match_saved_ones(self):
+        GalleryImage.objects.create(gallery_project=self.project, image=self.photos(1, offset=200)[0], is_primary=True)
+        photos = self.photos(3)
+        # The same file twice shares one blob
+        photos.append(SimpleUploadedFile('again.jpg', photos[0].read(), content_type='image/jpeg'))
+        photos[0].seek(0)
+
+        response, callbacks = self.upload(photos)
+        self.assertEqual([image['order'] for image in response.json()], [1024, 2048, 3072, 4096])
+
+        images = list(GalleryImage.objects.filter(gallery_project=self.project).order_by('order'))
+        self.assertEqual(images[1].image.name, images[4].image.name)
+        self.assertEqual(MediaBlob.objects.get(name=images[1].image.name).ref_count, 2)
+        self.assertEqual(images[1].title, 'Oak kitchen - Image 2')
+        self.assertEqual((images[1].width, images[1].height), (400, 300))
+        self.assertTrue(images[1].phash)
+        self.assertTrue(images[0].is_primary)
+
+        self.project.refresh_from_db()
+        self.category.refresh_from_db()
+        self.assertEqual(self.project.image_count, 5)
+        self.assertEqual(self.project.primary_image, images[0])
+        self.assertEqual(self.category.image_count, 5)
+
+        for callback in callbacks:
+            callback()
+        self.assertTrue(all(image.derivatives.exists() for image in images[1:]))
+
+    def test_failed_project_create_leaves_nothing(self):
+        from unittest import mock
+
+        with mock.patch.object(GalleryImage.objects, 'bulk_ingest', side_effect=OSError('disk full')), \
+                self.assertLogs('api.admin_views', 'ERROR'):
+            response = self.client.post('/api/admin/gallery-projects/', {
+                'gallery_category': self.category.pk, 'title': 'Walnut desk', 'images': self.photos(2),
+            })
+        self.assertEqual(response.status_code, 500)
+        self.assertFalse(GalleryProject.objects.filter(title='Walnut desk').exists())
+
+    def test_failed_project_update_changes_nothing(self):
+        from unittest import mock
+        from django.test.client import BOUNDARY, MULTIPART_CONTENT, encode_multipart
+
+        url = f'/api/admin/gallery-projects/{self.project.pk}/'
+        body = encode_multipart(BOUNDARY, {'title': 'Walnut desk', 'images': self.photos(2)})
+        with mock.patch.object(GalleryImage.objects, 'bulk_ingest', side_effect=OSError('disk full')), \
+                self.assertRaises(OSError):
+            self.client.patch(url, body, content_type=MULTIPART_CONTENT)
+        self.project.refresh_from_db()
+        self.assertEqual(self.project.title, 'Oak kitchen')
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT)
+class BulkReorderTests(TestCase):
+    """Drag-and-drop reordering is validated and written set-based"""
+
+    def setUp(self):
+        from django.contrib.auth.models import User
+
+        cache.clear()
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'secret'))
+        category = GalleryCategory.objects.create(name='Kitchens')
+        self.project = GalleryProject.objects.create(gallery_category=category, title='Oak kitchen')
+
+    def add_images(self, count):
+        return GalleryImage.objects.bulk_create(
+            GalleryImage(gallery_project=self.project, image=f'gallery/{i}.jpg', order=i) for i in range(count)
+        )
+
+    def reorder(self, url, data):
+        return self.client.post(url, data, content_type='application/json')
+
+    def test_image_reorder_is_one_statement_for_any_size(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        url = '/api/admin/gallery-images/bulk_update_order/'
+        few, many = self.add_images(5), self.add_images(200)
+        counts = []
+        for images in (few, many):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.reorder(url, {'ids': [image.pk for image in reversed(images)]})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()['updated'], len(images))
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+        orders = dict(GalleryImage.objects.filter(pk__in=[i.pk for i in many]).values_list('pk', 'order'))
+        self.assertEqual([orders[image.pk] for image in many], [spaced_position(i) for i in range(199, -1, -1)])
+
+        # Spaced ORDER_GAP apart, so the next move writes one row instead of renumbering
+        response = self.reorder(f'/api/admin/gallery-images/{many[0].pk}/move/', {'before': many[1].pk})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.json()['rebalanced'])
+
+        # The key the endpoint took before it was generic still works
+        response = self.reorder(url, {'image_orders': [{'id': few[0].pk, 'order': 7}]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(GalleryImage.objects.get(pk=few[0].pk).order, 7)
+
+    def test_invalid_requests_change_nothing(self):
+        images = self.add_images(2)
+        url = '/api/admin/gallery-images/bulk_update_order/'
+
+        response = self.reorder(url, {'orders': [{'id': images[0].pk, 'order': 1}, {'id': 999999, 'order': 0}]})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['ids'], [999999])
+        self.assertEqual(self.reorder(url, {'orders': [{'id': images[0].pk, 'order': -1}]}).status_code, 400)
+        self.assertEqual(self.reorder(url, {'ids': [images[0].pk, images[0].pk]}).status_code, 400)
+        self.assertEqual(self.reorder(url, {}).status_code, 400)
+        self.assertEqual(list(GalleryImage.objects.order_by('pk').values_list('order', flat=True)), [0, 1])
+
+    def test_move_endpoint(self):
+        first, second, third = self.add_images(3)
+        other_project = GalleryProject.objects.create(gallery_category=self.project.gallery_category, title='Walnut')
+        stranger = GalleryImage.objects.create(gallery_project=other_project, image='gallery/x.jpg')
+
+        response = self.reorder(f'/api/admin/gallery-images/{third.pk}/move/', {'before': first.pk})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            list(self.project.images.values_list('pk', flat=True)), [third.pk, first.pk, second.pk]
+        )
+        self.assertEqual(self.reorder(f'/api/admin/gallery-images/{third.pk}/move/', {'after': stranger.pk}).status_code, 400)
+        self.assertEqual(self.reorder(f'/api/admin/gallery-images/{third.pk}/move/', {}).status_code, 400)
+
+    def test_reorder_invalidates_cached_lists(self):
+        from furniture.models import FAQ
+
+        first = FAQ.objects.create(question='Lead time?', answer='Six weeks', sort_order=0)
+        second = FAQ.objects.create(question='Delivery?', answer='Yes', sort_order=1)
+        self.assertEqual([faq['id'] for faq in self.client.get('/api/faqs/').json()['results']], [first.pk, second.pk])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.reorder('/api/admin/faqs/bulk_update_order/', {'ids': [second.pk, first.pk]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([faq['id'] for faq in self.client.get('/api/faqs/').json()['results']], [second.pk, first.pk])
+
+
+class BatchActionTests(TestCase):
+    """Batch admin actions are one set-based write with one invalidation"""
+
+    def setUp(self):
+        from django.contrib.auth.models import User
+
+        cache.clear()
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'secret'))
+        self.kitchens = GalleryCategory.objects.create(name='Kitchens')
+        self.wardrobes = GalleryCategory.objects.create(name='Wardrobes')
+        self.projects = [
+            GalleryProject.objects.create(gallery_category=self.kitchens, title=f'Kitchen {i}') for i in range(3)
+        ]
+        for project in self.projects:
+            for i in range(2):
+                GalleryImage.objects.create(gallery_project=project, image=f'gallery/{project.pk}-{i}.jpg')
+
+    def batch(self, resource, data):
+        return self.client.post(f'/api/admin/{resource}/batch/', data, content_type='application/json')
+
+    def assertCounts(self, category, active_projects, images):
+        category.refresh_from_db()
+        self.assertEqual((category.active_project_count, category.image_count), (active_projects, images))
+
+    def test_project_updates_report_changes_and_refresh_counters(self):
+        ids = [project.pk for project in self.projects]
+        self.assertCounts(self.kitchens, 3, 6)
+
+        response = self.batch('gallery-projects', {'ids': ids[:2], 'operation': 'set_active', 'value': False})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'operation': 'set_active', 'requested': 2, 'changed': 2})
+        self.assertCounts(self.kitchens, 1, 2)
+        # Rows already in that state are not counted as changed
+        response = self.batch('gallery-projects', {'ids': ids, 'operation': 'set_active', 'value': False})
+        self.assertEqual(response.json()['changed'], 1)
+
+        response = self.batch('gallery-projects', {'ids': ids, 'operation': 'set_featured', 'value': 'true'})
+        self.assertEqual(response.json()['changed'], 3)
+        self.assertEqual(GalleryProject.objects.filter(featured=True).count(), 3)
+
+        self.batch('gallery-projects', {'ids': ids, 'operation': 'set_active', 'value': True})
+        response = self.batch('gallery-projects', {
+            'ids': ids[1:], 'operation': 'set_category', 'value': self.wardrobes.pk
+        })
+        self.assertEqual(response.json()['changed'], 2)
+        self.assertCounts(self.kitchens, 1, 2)
+        self.assertCounts(self.wardrobes, 2, 4)
+
+    def test_moving_onto_a_taken_slug_changes_nothing(self):
+        GalleryProject.objects.create(gallery_category=self.wardrobes, title='Kitchen 1')
+
+        response = self.batch('gallery-projects', {
+            'ids': [project.pk for project in self.projects], 'operation': 'set_category', 'value': self.wardrobes.pk
+        })
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('kitchen-1', response.json()['error'])
+        self.assertEqual(GalleryProject.objects.filter(gallery_category=self.kitchens).count(), 3)
+
+    def test_image_updates(self):
+        ids = list(GalleryImage.objects.values_list('pk', flat=True))
+        response = self.batch('gallery-images', {'ids': ids, 'operation': 'set_tags', 'value': 'oak, walnut'})
+        self.assertEqual(response.json()['changed'], 6)
+        response = self.batch('gallery-images', {'ids': ids[:2], 'operation': 'set_alt_text', 'value': 'Oak kitchen'})
+        self.assertEqual(response.json()['changed'], 2)
+        self.assertEqual(set(GalleryImage.objects.values_list('tags', flat=True)), {'oak, walnut'})
+        self.assertEqual(GalleryImage.objects.filter(alt_text='Oak kitchen').count(), 2)
+
+    def test_deletes_refresh_counters_and_invalidate_once(self):
+        from unittest import mock
+
+        images = list(self.projects[0].images.values_list('pk', flat=True))
+        with mock.patch('api.signals.bump_generation') as bump, self.captureOnCommitCallbacks(execute=True):
+            response = self.batch('gallery-images', {'ids': images, 'operation': 'delete'})
+        self.assertEqual(response.json()['changed'], 2)
+        self.assertEqual(bump.call_args_list.count(mock.call(GalleryImage)), 1)
+        self.projects[0].refresh_from_db()
+        self.assertEqual(self.projects[0].image_count, 0)
+        self.assertCounts(self.kitchens, 3, 4)
+
+        with mock.patch('api.signals.bump_generation') as bump, self.captureOnCommitCallbacks(execute=True):
+            response = self.batch('gallery-projects', {
+                'ids': [project.pk for project in self.projects[:2]], 'operation': 'delete'
+            })
+        self.assertEqual(response.json()['changed'], 2)
+        self.assertEqual(bump.call_args_list.count(mock.call(GalleryProject)), 1)
+        self.assertEqual(bump.call_args_list.count(mock.call(GalleryImage)), 1)
+        self.assertCounts(self.kitchens, 1, 2)
+
+    def test_invalid_batches_are_rejected(self):
+        from .admin_views import MAX_BATCH_SIZE
+
+        pk = self.projects[0].pk
+        self.assertEqual(self.batch('gallery-projects', {'ids': [pk], 'operation': 'set_tags', 'value': 'x'}).status_code, 400)
+        self.assertEqual(self.batch('gallery-projects', {'ids': [pk], 'operation': 'set_active'}).status_code, 400)
+        self.assertEqual(self.batch('gallery-projects', {'ids': [], 'operation': 'delete'}).status_code, 400)
+        self.assertEqual(self.batch('gallery-projects', {'ids': ['x'], 'operation': 'delete'}).status_code, 400)
+        response = self.batch('gallery-projects', {'ids': list(range(MAX_BATCH_SIZE + 1)), 'operation': 'delete'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(GalleryProject.objects.count(), 3)
+
+
+class AdminDashboardStatsTests(TestCase):
+    """Dashboard statistics take one query per table, or just the stats row"""
+
+    def setUp(self):
+        from django.contrib.auth.models import User
+        from furniture.models import ContactMessage, CustomRequest
+
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'secret'))
+        category = GalleryCategory.objects.create(name='Kitchens')
+        GalleryProject.objects.create(gallery_category=category, title='Oak kitchen', featured=True)
+        GalleryProject.objects.create(gallery_category=category, title='Pine kitchen', is_active=False)
+        for status in ('new', 'new', 'done'):
+            CustomRequest.objects.create(name='Ana', email='ana@example.com', message='Hi', status=status)
+        ContactMessage.objects.create(name='Ben', email='ben@example.com', message='Hello')
+
+    def get_stats(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        self.client.get('/api/admin/stats/')  # session and user lookups
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/admin/stats/')
+        self.assertEqual(response.status_code, 200)
+        aggregates = [q for q in queries.captured_queries if 'COUNT(' in q['sql'] or 'dashboardstats' in q['sql']]
+        return response.json(), len(aggregates)
+
+    def test_one_aggregate_per_table(self):
+        stats, queries = self.get_stats()
+        self.assertEqual(queries, 4)
+        self.assertEqual(stats['gallery_projects'], {'total': 2, 'active': 1, 'featured': 1, 'recent': 2})
+        self.assertEqual(stats['custom_requests'], {'total': 3, 'new': 2, 'in_progress': 0, 'completed': 1, 'recent': 3})
+        self.assertEqual(stats['contact_messages'], {'total': 1, 'unread': 1, 'recent': 1})
+
+        with override_settings(DASHBOARD_STATS_MATERIALIZED=True):
+            materialized, _ = self.get_stats()
+            # The stored row, then only the last 7 days of each table
+            _, queries = self.get_stats()
+        self.assertEqual(materialized, stats)
+        self.assertEqual(queries, 4)
+
+    def test_viewset_stats(self):
+        response = self.client.get('/api/admin/gallery-projects/stats/')
+        self.assertEqual(response.json(), {
+            'total_projects': 2, 'active_projects': 1, 'featured_projects': 1, 'projects_with_images': 0
+        })
+        response = self.client.get('/api/admin/custom-requests/stats/')
+        self.assertEqual(response.json(), {
+            'total_requests': 3, 'new_requests': 2, 'in_progress_requests': 0, 'done_requests': 1
+        })
+
+
+class HomeBundleWarmTests(TestCase):
+    """The landing page bundle is served from the cache and rebuilt once per write"""
+
+    def setUp(self):
+        from furniture.models import FAQ
+
+        cache.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.faq = FAQ.objects.create(question='Lead time?', answer='Six weeks')
+
+    def test_hit_and_miss(self):
+        with self.assertNumQueries(5):
+            first = self.client.get('/api/home/')
+        with self.assertNumQueries(0):
+            second = self.client.get('/api/home/')
+        self.assertEqual(first.content, second.content)
+
+    def test_write_rewarms_remembered_variants(self):
+        from furniture.models import FAQ
+
+        self.client.get('/api/home/', HTTP_ACCEPT_LANGUAGE='it-IT,it;q=0.9')
+        with self.captureOnCommitCallbacks(execute=True):
+            FAQ.objects.create(question='Delivery?', answer='Yes')
+
+        # Served from the rebuilt entry, ?lang= and Accept-Language alike
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/home/?lang=it')
+        self.assertEqual(len(response.json()['faqs']), 2)
+
+    def test_one_warm_per_transaction(self):
+        from unittest import mock
+        from furniture.models import FAQ, Service
+
+        self.client.get('/api/home/')
+        with mock.patch('api.cache.warm_cached_view') as warm, self.captureOnCommitCallbacks(execute=True):
+            for i in range(3):
+                FAQ.objects.create(question=f'Question {i}?', answer='-')
+            Service.objects.create(title='Kitchens', description='-')
+            FAQ.objects.all().delete()
+        self.assertEqual(warm.call_count, 1)
+
+    def test_variants_ignore_query_and_unknown_languages(self):
+        from unittest import mock
+        from .cache import WARM_KEY_PREFIX, WARM_VARIANT_TTL
+
+        for i in range(30):
+            self.client.get(f'/api/home/?junk={i}', HTTP_ACCEPT_LANGUAGE=f'x{i}')
+        self.client.get('/api/home/?lang=it')
+        variants = cache.get(f'{WARM_KEY_PREFIX}:home')
+        self.assertEqual(sorted(language for _, _, _, language in variants), ['en', 'it'])
+
+        # Variants nobody asked for within the TTL are no longer warmed
+        with mock.patch('api.cache.time.time', return_value=max(variants.values()) + WARM_VARIANT_TTL), \
+                mock.patch('api.cache.build_get_request') as build:
+            from .cache import warm_cached_view
+            warm_cached_view('home', lambda request: None)
+        build.assert_not_called()
+
+
+class PublishSnapshotTests(TestCase):
+    """publish_snapshot writes one file per language and page, and survives failing paths"""
+
+    def setUp(self):
+        cache.clear()
+        kitchens = GalleryCategory.objects.create(name='Kitchens')
+        offices = GalleryCategory.objects.create(name='Offices')
+        for i in range(12):
+            GalleryProject.objects.create(gallery_category=kitchens, title=f'Kitchen {i}')
+        # Slugs are only unique per category: /gallery-projects/oak/ is ambiguous
+        GalleryProject.objects.create(gallery_category=kitchens, title='Oak')
+        GalleryProject.objects.create(gallery_category=offices, title='Oak')
+
+        self.output = tempfile.mkdtemp(prefix='ansa-snapshot-')
+        self.addCleanup(shutil.rmtree, self.output, ignore_errors=True)
+
+    def publish(self):
+        from django.core.management import call_command
+
+        out, err = io.StringIO(), io.StringIO()
+        call_command('publish_snapshot', '--output', self.output, stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+
+    def read(self, *parts):
+        with open(os.path.join(self.output, *parts), 'rb') as f:
+            return f.read()
+
+    def test_pages_and_failing_paths(self):
+        out, err = self.publish()
+
+        page_two = self.client.get('/api/gallery-projects/?lang=it&page=2', HTTP_HOST='localhost:8000')
+        self.assertEqual(self.read('it', 'api', 'gallery-projects', 'page-2.json'), page_two.content)
+        self.assertEqual(len(json.loads(self.read('en', 'api', 'gallery-projects', 'index.json'))['results']), 12)
+        self.assertTrue(os.path.exists(os.path.join(self.output, 'en', 'api', 'gallery-projects', 'kitchen-0', 'index.json')))
+
+        # The ambiguous slug fails on its own; every other path is still published
+        self.assertIn('/api/gallery-projects/oak/?lang=en failed', err)
+        self.assertFalse(os.path.exists(os.path.join(self.output, 'en', 'api', 'gallery-projects', 'oak')))
+        self.assertIn(f'{len(settings.API_LANGUAGES)} failed', out)
+        self.assertTrue(os.path.exists(os.path.join(self.output, 'al', 'api', 'home', 'index.json')))
+
+        out, _ = self.publish()
+        self.assertIn(' 0 written', out)
+
+    def test_removed_rows_lose_their_files(self):
+        self.publish()
+        with self.captureOnCommitCallbacks(execute=True):
+            GalleryProject.objects.filter(slug__in=['kitchen-0', 'kitchen-1']).delete()
+        out, _ = self.publish()
+
+        self.assertFalse(os.path.exists(os.path.join(self.output, 'en', 'api', 'gallery-projects', 'kitchen-0', 'index.json')))
+        self.assertFalse(os.path.exists(os.path.join(self.output, 'en', 'api', 'gallery-projects', 'page-2.json')))
@@ -7,7 +7,8 @@ from .admin_views import (
     AdminContactMessageViewSet, AdminDashboardStatsView,
     AdminCustomRequestViewSet, AdminServiceViewSet,
     AdminMaterialViewSet, AdminTestimonialViewSet, AdminFAQViewSet,
-    AdminGalleryCategoryViewSet, AdminGalleryProjectViewSet, AdminGalleryImageViewSet
+    AdminGalleryCategoryViewSet, AdminGalleryProjectViewSet, AdminGalleryImageViewSet,
+    AdminUploadSessionViewSet
 )
 
 from .views import GalleryCategoryViewSet, GalleryProjectViewSet, FeaturedGalleryProjectsView
@@ -28,6 +29,7 @@ admin_router.register(r'custom-requests', AdminCustomRequestViewSet, basename='a
 admin_router.register(r'gallery-categories', AdminGalleryCategoryViewSet, basename='admin-gallery-category')
 admin_router.register(r'gallery-projects', AdminGalleryProjectViewSet, basename='admin-gallery-project')
 admin_router.register(r'gallery-images', AdminGalleryImageViewSet, basename='admin-gallery-image')
+admin_router.register(r'uploads', AdminUploadSessionViewSet, basename='admin-upload')
 admin_router.register(r'services', AdminServiceViewSet, basename='admin-service')
 admin_router.register(r'materials', AdminMaterialViewSet, basename='admin-material')
 admin_router.register(r'testimonials', AdminTestimonialViewSet, basename='admin-testimonial')
@@ -41,6 +43,7 @@ urlpatterns = [
     path('contact/', views.ContactMessageView.as_view(), name='contact'),
     path('custom-request/', views.CustomRequestView.as_view(), name='custom-request'),
     path('featured-gallery/', FeaturedGalleryProjectsView.as_view(), name='featured-gallery'),
+    path('home/', views.HomeBundleView.as_view(), name='home'),
 
     # CSRF token endpoint
     path('csrf-token/', CSRFTokenView.as_view(), name='csrf-token'),
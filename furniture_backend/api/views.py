@@ -1,29 +1,47 @@
+import os
+
+from django.core.files.base import ContentFile
 from rest_framework import viewsets, generics
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.parsers import MultiPartParser, FormParser
+from rest_framework.settings import api_settings
+from rest_framework.views import APIView
 
 from furniture.models import (
     GalleryCategory, GalleryProject, GalleryImage,
     CustomRequest, ContactMessage, ContactImage,
     Service, Material, Testimonial, FAQ
 )
+from furniture.intake import sanitize_uploads
+from furniture.similarity import SIMILAR_DISTANCE, parse_distance, similar_projects
 from .serializers import (
     GalleryCategorySerializer, GalleryProjectListSerializer,
     GalleryProjectDetailSerializer, ContactMessageSerializer,
     CustomRequestSerializer, ServiceSerializer,
     MaterialSerializer, TestimonialSerializer, FAQSerializer
 )
+from .cache import CachedResponseMixin, remember_request
+from .fieldsets import SparseFieldsetMixin, defer_unused_fields, get_sparse_fieldset
+from .pagination import GalleryProjectPagination
 
 
-class GalleryCategoryViewSet(viewsets.ReadOnlyModelViewSet):
+class GalleryCategoryViewSet(CachedResponseMixin, SparseFieldsetMixin, viewsets.ReadOnlyModelViewSet):
     """
     ViewSet for Gallery Categories (read-only for public)
     """
-    queryset = GalleryCategory.objects.filter(is_active=True).order_by('sort_order', 'name')
+    cache_models = (GalleryCategory, GalleryProject, GalleryImage)
+    queryset = GalleryCategory.objects.filter(is_active=True).prefetch_related('derivatives').order_by('sort_order', 'name')
     serializer_class = GalleryCategorySerializer
     lookup_field = 'slug'
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == 'projects':
+            # Only the category's id is read there
+            queryset = queryset.prefetch_related(None)
+        return queryset
+
     def get_serializer_context(self):
         context = super().get_serializer_context()
         # Include projects if specifically requested
@@ -34,23 +52,37 @@ class GalleryCategoryViewSet(viewsets.ReadOnlyModelViewSet):
     def projects(self, request, slug=None):
         """Get all projects for a specific category"""
         category = self.get_object()
-        projects = category.gallery_projects.filter(is_active=True).order_by('sort_order', '-created_at')
+        projects = category.gallery_projects.filter(
+            is_active=True
+        ).select_related('gallery_category').with_image_summary().order_by('sort_order', '-created_at')
 
         # Apply filters
         featured_only = request.query_params.get('featured', '').lower() == 'true'
         if featured_only:
             projects = projects.filter(featured=True)
 
-        serializer = GalleryProjectListSerializer(projects, many=True, context={'request': request})
+        fieldset = get_sparse_fieldset(request)
+        projects = defer_unused_fields(projects, GalleryProjectListSerializer, fieldset, keep=['slug'])
+
+        # Unpaginated unless the client asks for a cursor walk
+        paginator = GalleryProjectPagination()
+        if paginator.is_cursor_request(request):
+            page = paginator.paginate_queryset(projects, request, view=self)
+            serializer = GalleryProjectListSerializer(page, many=True, context={'request': request}, **fieldset)
+            return paginator.get_paginated_response(serializer.data)
+
+        serializer = GalleryProjectListSerializer(projects, many=True, context={'request': request}, **fieldset)
         return Response(serializer.data)
 
 
-class GalleryProjectViewSet(viewsets.ReadOnlyModelViewSet):
+class GalleryProjectViewSet(CachedResponseMixin, SparseFieldsetMixin, viewsets.ReadOnlyModelViewSet):
     """
     ViewSet for Gallery Projects (read-only for public)
     """
-    queryset = GalleryProject.objects.filter(is_active=True).select_related('gallery_category').prefetch_related('images')
+    cache_models = (GalleryProject, GalleryCategory, GalleryImage)
+    queryset = GalleryProject.objects.filter(is_active=True).select_related('gallery_category')
     serializer_class = GalleryProjectListSerializer
+    pagination_class = GalleryProjectPagination
     lookup_field = 'slug'
 
     def get_serializer_class(self):
@@ -61,6 +93,11 @@ class GalleryProjectViewSet(viewsets.ReadOnlyModelViewSet):
     def get_queryset(self):
         queryset = super().get_queryset()
 
+        if self.action == 'retrieve':
+            queryset = queryset.prefetch_related('images__derivatives')
+        else:
+            queryset = queryset.with_image_summary()
+
         # Filter by category
         category_slug = self.request.query_params.get('category')
         if category_slug:
@@ -73,16 +110,41 @@ class GalleryProjectViewSet(viewsets.ReadOnlyModelViewSet):
 
         return queryset.order_by('sort_order', '-created_at')
 
+    @action(detail=True, methods=['get'])
+    def similar(self, request, slug=None):
+        """Projects with images that look like this project's, most similar first"""
+        project = self.get_object()
+        try:
+            distance = parse_distance(request.query_params.get('distance'), SIMILAR_DISTANCE)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=400)
+
+        ranked = similar_projects(project, distance)
+        projects = GalleryProject.objects.filter(
+            is_active=True
+        ).select_related('gallery_category').with_image_summary().in_bulk(
+            [project_id for _, project_id in ranked]
+        )
+        similar = [projects[project_id] for _, project_id in ranked if project_id in projects]
+
+        serializer = GalleryProjectListSerializer(
+            similar[:api_settings.PAGE_SIZE], many=True, context={'request': request},
+            **get_sparse_fieldset(request)
+        )
+        return Response(serializer.data)
+
 
-class FeaturedGalleryProjectsView(generics.ListAPIView):
+class FeaturedGalleryProjectsView(CachedResponseMixin, SparseFieldsetMixin, generics.ListAPIView):
     """
     List featured gallery projects
     """
+    cache_models = (GalleryProject, GalleryCategory, GalleryImage)
     queryset = GalleryProject.objects.filter(
         is_active=True,
         featured=True
-    ).select_related('gallery_category').prefetch_related('images').order_by('sort_order', '-created_at')
+    ).select_related('gallery_category').with_image_summary().order_by('sort_order', '-created_at')
     serializer_class = GalleryProjectListSerializer
+    pagination_class = GalleryProjectPagination
 
 
 class CustomRequestView(generics.CreateAPIView):
@@ -96,26 +158,33 @@ class CustomRequestView(generics.CreateAPIView):
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        custom_request = serializer.save()
 
-        # Handle multiple image uploads (inspiration photos)
+        # Handle multiple image uploads (inspiration photos): re-encoded
+        # without metadata in the intake pool before anything is stored
         images = request.FILES.getlist('images')
-        for image in images:
+        sanitized = sanitize_uploads(images)
+
+        custom_request = serializer.save()
+        rejected = []
+        for image, content in zip(images, sanitized):
+            if content is None:
+                rejected.append(image.name)
+                continue
             ContactImage.objects.create(
                 contact_request=custom_request,
-                image=image
+                image=ContentFile(content, name=f'{os.path.splitext(image.name)[0]}.jpg')
             )
 
         # You can add email notification logic here
         # send_custom_request_notification_email(custom_request)
 
-        return Response(
-            {
-                'message': 'Thank you for your custom request! We will review it and get back to you soon.',
-                'request_id': custom_request.id
-            },
-            status=201
-        )
+        data = {
+            'message': 'Thank you for your custom request! We will review it and get back to you soon.',
+            'request_id': custom_request.id
+        }
+        if rejected:
+            data['rejected_images'] = rejected
+        return Response(data, status=201)
 
 
 class ContactMessageView(generics.CreateAPIView):
@@ -139,20 +208,22 @@ class ContactMessageView(generics.CreateAPIView):
         )
 
 
-class ServiceViewSet(viewsets.ReadOnlyModelViewSet):
+class ServiceViewSet(CachedResponseMixin, SparseFieldsetMixin, viewsets.ReadOnlyModelViewSet):
     """
     ViewSet for Services (read-only for public)
     """
-    queryset = Service.objects.filter(is_active=True).order_by('sort_order', 'title')
+    cache_models = (Service,)
+    queryset = Service.objects.filter(is_active=True).prefetch_related('derivatives').order_by('sort_order', 'title')
     serializer_class = ServiceSerializer
     lookup_field = 'slug'
 
 
-class MaterialViewSet(viewsets.ReadOnlyModelViewSet):
+class MaterialViewSet(CachedResponseMixin, SparseFieldsetMixin, viewsets.ReadOnlyModelViewSet):
     """
     ViewSet for Materials (read-only for public)
     """
-    queryset = Material.objects.filter(is_active=True).order_by('type', 'sort_order', 'name')
+    cache_models = (Material,)
+    queryset = Material.objects.filter(is_active=True).prefetch_related('derivatives').order_by('type', 'sort_order', 'name')
     serializer_class = MaterialSerializer
 
     def get_queryset(self):
@@ -166,10 +237,11 @@ class MaterialViewSet(viewsets.ReadOnlyModelViewSet):
         return queryset
 
 
-class TestimonialViewSet(viewsets.ReadOnlyModelViewSet):
+class TestimonialViewSet(CachedResponseMixin, SparseFieldsetMixin, viewsets.ReadOnlyModelViewSet):
     """
     ViewSet for Testimonials (read-only for public)
     """
+    cache_models = (Testimonial, GalleryProject)
     queryset = Testimonial.objects.filter(is_active=True).select_related('project').order_by('-created_at')
     serializer_class = TestimonialSerializer
 
@@ -189,10 +261,11 @@ class TestimonialViewSet(viewsets.ReadOnlyModelViewSet):
         return queryset
 
 
-class FAQViewSet(viewsets.ReadOnlyModelViewSet):
+class FAQViewSet(CachedResponseMixin, SparseFieldsetMixin, viewsets.ReadOnlyModelViewSet):
     """
     ViewSet for FAQs (read-only for public)
     """
+    cache_models = (FAQ,)
     queryset = FAQ.objects.filter(is_active=True).order_by('category', 'sort_order', 'created_at')
     serializer_class = FAQSerializer
 
@@ -222,3 +295,38 @@ class FAQViewSet(viewsets.ReadOnlyModelViewSet):
         ]
 
         return Response(result)
+
+
+class HomeBundleView(CachedResponseMixin, APIView):
+    """
+    Everything the landing page needs in one response: the first page of
+    featured projects, gallery categories, services, featured testimonials
+    and FAQs. Rebuilt after every relevant write (see api/signals.py), so
+    visitors are always served from the cache.
+    """
+    cache_models = (GalleryProject, GalleryCategory, GalleryImage, Service, Testimonial, FAQ)
+    warm_name = 'home'
+
+    def get(self, request):
+        remember_request(self.warm_name, request)
+
+        page_size = api_settings.PAGE_SIZE
+        context = {'request': request}
+
+        return Response({
+            'featured_projects': GalleryProjectListSerializer(
+                FeaturedGalleryProjectsView.queryset.all()[:page_size], many=True, context=context
+            ).data,
+            'gallery_categories': GalleryCategorySerializer(
+                GalleryCategoryViewSet.queryset.all()[:page_size], many=True, context=context
+            ).data,
+            'services': ServiceSerializer(
+                ServiceViewSet.queryset.all()[:page_size], many=True, context=context
+            ).data,
+            'testimonials': TestimonialSerializer(
+                TestimonialViewSet.queryset.filter(is_featured=True)[:page_size], many=True, context=context
+            ).data,
+            'faqs': FAQSerializer(
+                FAQViewSet.queryset.all()[:page_size], many=True, context=context
+            ).data,
+        })
@@ -0,0 +1,481 @@
+"""
+Responsive image derivatives and intrinsic image metadata.
+
+Every uploaded GalleryImage, Material, Service and GalleryCategory cover is
+rendered once into a fixed ladder of widths (IMAGE_DERIVATIVE_WIDTHS) in each
+of IMAGE_DERIVATIVE_FORMATS. The files go where the row's upload_to puts its
+uploads, named after the stored original, e.g.
+
+    blobs/3f/a2/<sha256>.jpg                  (a content-addressed original)
+    gallery/3/2024/5/<sha256>_640w.webp
+    gallery/3/2024/5/<sha256>_640w.jpeg
+
+and recorded as ImageDerivative rows, which the serializers turn into srcset
+strings. Originals are never upscaled: the ladder stops at the original width.
+Rows sharing one content-addressed file (furniture/storage.py) share its
+derivative files as well, so a duplicate upload renders nothing.
+
+Rendering never runs in the request that uploaded the image. After commit,
+rows are handed to a pool of IMAGE_DERIVATIVE_WORKERS processes, or left for
+manage.py reprocess_media --pending, which also picks up whatever a pool
+lost (see IMAGE_DERIVATIVE_RENDERING). Until then the API serves the
+original alone: derivatives of a replaced file are dropped when it is saved.
+
+GalleryImage and ContactImage also store their upright dimensions, byte
+size, dominant colour and a tiny inline placeholder (a base64 WebP data URI,
+about 16px wide) so clients can reserve layout and paint something while
+the real image downloads, plus a perceptual hash for furniture/similarity.py.
+"""
+import base64
+import io
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import django
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.core.files.base import ContentFile
+from django.db import connections, models, transaction
+from django.dispatch import Signal
+from PIL import ExifTags, Image, ImageOps
+
+
+DEFAULT_WIDTHS = (320, 640, 960, 1280, 1920)
+DEFAULT_FORMATS = ('webp', 'jpeg')
+DEFAULT_QUALITY = 80
+
+PIL_FORMATS = {'webp': 'WEBP', 'jpeg': 'JPEG'}
+
+# Size of the preview the dominant colour is computed from
+PREVIEW_SIZE = 64
+PLACEHOLDER_SIZE = 16
+PLACEHOLDER_QUALITY = 30
+# EXIF orientations that rotate the image by 90 or 270 degrees
+TRANSPOSED_ORIENTATIONS = (5, 6, 7, 8)
+
+# Rows per background rendering job, so a batch upload is spread over the pool
+RENDER_BATCH_SIZE = 10
+
+# Sent with a model as sender when image data of its rows changed outside
+# save() (derivatives rendered, metadata backfilled), so cached API
+# responses embedding the old data are invalidated. ``instance`` is set
+# when a single row changed; ``derivatives=True`` when only derivatives did.
+images_updated = Signal()
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def derivative_widths():
+    return sorted(getattr(settings, 'IMAGE_DERIVATIVE_WIDTHS', DEFAULT_WIDTHS))
+
+
+def derivative_formats():
+    return list(getattr(settings, 'IMAGE_DERIVATIVE_FORMATS', DEFAULT_FORMATS))
+
+
+def derivative_base(instance, field_name):
+    """
+    Storage name derivatives of ``instance.<field_name>`` are named after:
+    the stored file's name, in the directory the field's upload_to gives
+    the row (so content-addressed originals do not put them under blobs/).
+    """
+    field = instance._meta.get_field(field_name)
+    basename = os.path.basename(getattr(instance, field_name).name)
+    return os.path.join(os.path.dirname(field.generate_filename(instance, basename)), basename)
+
+
+def derivative_name(name, width, image_format):
+    """Storage name of a derivative of the file ``name``"""
+    stem, _ = os.path.splitext(name)
+    return f'{stem}_{width}w.{image_format}'
+
+
+def ladder_for(original_width):
+    """Widths to render for an original this wide, largest first"""
+    widths = [width for width in derivative_widths() if width < original_width]
+    widths.append(min(original_width, derivative_widths()[-1]))
+    return sorted(set(widths), reverse=True)
+
+
+def load_image(fp, max_size=None):
+    """
+    Decode an image upright according to its EXIF orientation. With
+    ``max_size``, JPEGs are decoded at the smallest scale still covering it.
+    """
+    image = Image.open(fp)
+    if max_size:
+        image.draft('RGB', max_size)
+    image = ImageOps.exif_transpose(image)
+    image.load()
+    return image
+
+
+def open_image(field_file):
+    """Open a stored image for rendering the derivative ladder"""
+    field_file.open('rb')
+    try:
+        return load_image(field_file, (derivative_widths()[-1], derivative_widths()[-1]))
+    finally:
+        field_file.close()
+
+
+def to_rgb(image):
+    """``image`` as plain RGB, with any transparency flattened onto white"""
+    if image.mode == 'RGB':
+        return image
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def encode(image, image_format, quality=None):
+    """Encode ``image`` as ``image_format`` and return the bytes"""
+    quality = quality or getattr(settings, 'IMAGE_DERIVATIVE_QUALITY', DEFAULT_QUALITY)
+
+    if image_format == 'jpeg' and image.mode != 'RGB':
+        image = to_rgb(image)
+    elif image_format == 'webp' and image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'A' in image.getbands() or image.mode == 'P' else 'RGB')
+
+    buffer = io.BytesIO()
+    options = {'quality': quality}
+    if image_format == 'jpeg':
+        options.update(optimize=True, progressive=True)
+    else:
+        options.update(method=4)
+    image.save(buffer, PIL_FORMATS[image_format], **options)
+    return buffer.getvalue()
+
+
+def render_ladder(image):
+    """
+    Yield (width, height, resized image) for every rung of the ladder.
+    Each rung is resized from the one above it rather than from the
+    original, which is much cheaper for large photos.
+    """
+    current = image
+    for width in ladder_for(image.width):
+        height = max(1, round(image.height * width / image.width))
+        if current.size != (width, height):
+            current = current.resize((width, height), Image.LANCZOS)
+        yield width, height, current
+
+
+def shared_derivatives(source_name, content_type, object_id):
+    """Copies, for another row, of the derivatives already rendered from ``source_name``"""
+    from .models import ImageDerivative
+
+    first = ImageDerivative.objects.filter(source_name=source_name).order_by('pk').first()
+    if first is None:
+        return []
+
+    siblings = ImageDerivative.objects.filter(
+        source_name=source_name, content_type_id=first.content_type_id, object_id=first.object_id
+    )
+    return [
+        ImageDerivative(
+            content_type=content_type,
+            object_id=object_id,
+            source_name=source_name,
+            format=sibling.format,
+            width=sibling.width,
+            height=sibling.height,
+            file=sibling.file.name,
+            size=sibling.size,
+        )
+        for sibling in siblings
+    ]
+
+
+def generate_derivatives(instance, field_name, force=False, notify=True):
+    """
+    (Re)build the derivatives of ``instance.<field_name>``, replacing any
+    rendered from a previous file (or all of them with ``force``). Returns the
+    number of derivatives stored. Images Pillow cannot read are logged and
+    get no derivatives. Without ``notify``, images_updated is left to the
+    caller, to send once for many rows.
+    """
+    from .models import ImageDerivative
+
+    field_file = getattr(instance, field_name)
+    content_type = ContentType.objects.get_for_model(instance)
+    existing = list(ImageDerivative.objects.filter(content_type=content_type, object_id=instance.pk))
+    if not force and existing and field_file and all(d.source_name == field_file.name for d in existing):
+        return len(existing)
+
+    storage = ImageDerivative._meta.get_field('file').storage
+    derivatives = []
+    if field_file and not force:
+        # A content-addressed file shared with another row: share its derivatives too
+        derivatives = shared_derivatives(field_file.name, content_type, instance.pk)
+
+    if field_file and not derivatives:
+        try:
+            image = open_image(field_file)
+            base = derivative_base(instance, field_name)
+            for width, height, resized in render_ladder(image):
+                for image_format in derivative_formats():
+                    content = encode(resized, image_format)
+                    name = storage.save(derivative_name(base, width, image_format), ContentFile(content))
+                    derivatives.append(ImageDerivative(
+                        content_type=content_type,
+                        object_id=instance.pk,
+                        source_name=field_file.name,
+                        format=image_format,
+                        width=width,
+                        height=height,
+                        file=name,
+                        size=len(content),
+                    ))
+        except (OSError, ValueError, Image.DecompressionBombError) as e:
+            logger.warning(f'Could not render derivatives of {field_file.name}: {e}')
+            for derivative in derivatives:
+                storage.delete(derivative.file.name)
+            derivatives = []
+
+    if not existing and not derivatives:
+        return 0
+
+    with transaction.atomic():
+        ImageDerivative.objects.filter(pk__in=[d.pk for d in existing]).delete()
+        ImageDerivative.objects.bulk_create(derivatives)
+
+    delete_unused_files({d.file.name for d in existing} - {d.file.name for d in derivatives})
+
+    if notify:
+        images_updated.send(sender=type(instance), instance=instance, derivatives=True)
+    return len(derivatives)
+
+
+def delete_unused_files(names):
+    """Delete the derivative files ``names``, unless another row still uses them"""
+    from .models import ImageDerivative
+
+    storage = ImageDerivative._meta.get_field('file').storage
+    names = set(names)
+    names -= set(ImageDerivative.objects.filter(file__in=names).values_list('file', flat=True))
+    for name in names:
+        storage.delete(name)
+
+
+def drop_stale_derivatives(instance, field_name):
+    """
+    Delete the derivatives rendered from anything but the current file of
+    ``instance.<field_name>``, so that the API serves the new original alone
+    until its own derivatives are rendered. Files go once the write commits.
+    """
+    from .models import ImageDerivative
+
+    stale = ImageDerivative.objects.filter(
+        content_type=ContentType.objects.get_for_model(instance), object_id=instance.pk
+    ).exclude(source_name=getattr(instance, field_name).name or '')
+    names = set(stale.values_list('file', flat=True))
+    if names:
+        stale.delete()
+        transaction.on_commit(partial(delete_unused_files, names))
+
+
+def pending_derivatives(model, field_name):
+    """Rows of ``model`` with a file but no derivatives rendered from it yet"""
+    from .models import ImageDerivative
+
+    rendered = ImageDerivative.objects.filter(
+        content_type=ContentType.objects.get_for_model(model),
+        object_id=models.OuterRef('pk'),
+        source_name=models.OuterRef(field_name),
+    )
+    return (
+        model._default_manager
+        .exclude(**{f'{field_name}__isnull': True})
+        .exclude(**{field_name: ''})
+        .exclude(models.Exists(rendered))
+    )
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # Spawned, not forked: children must not share this process's
+            # database connections
+            _executor = ProcessPoolExecutor(
+                max_workers=getattr(settings, 'IMAGE_DERIVATIVE_WORKERS', 2),
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=django.setup,
+            )
+        return _executor
+
+
+def discard_executor(executor):
+    """Forget a broken pool; the next job starts a fresh one"""
+    global _executor
+    with _executor_lock:
+        if _executor is executor:
+            _executor = None
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+def render_derivatives_later(model, field_name, pks):
+    """
+    Render the missing derivatives of the rows ``pks`` of ``model`` outside
+    the request, as IMAGE_DERIVATIVE_RENDERING says: in the process pool
+    ('pool'), in manage.py reprocess_media --pending ('queue'), or right
+    now ('inline', for development and tests). Call after commit.
+    """
+    pks = list(pks)
+    mode = getattr(settings, 'IMAGE_DERIVATIVE_RENDERING', 'pool')
+    if not pks or mode == 'queue':
+        return
+
+    label = model._meta.label_lower
+    if mode == 'inline':
+        if reprocess_derivatives(label, field_name, pks, force=False)[0]:
+            images_updated.send(sender=model, derivatives=True)
+        return
+
+    executor = get_executor()
+    for start in range(0, len(pks), RENDER_BATCH_SIZE):
+        try:
+            future = executor.submit(
+                reprocess_derivatives, label, field_name, pks[start:start + RENDER_BATCH_SIZE], False
+            )
+        except RuntimeError:
+            # A broken or shut down pool; reprocess_media --pending renders these
+            logger.exception(f'Could not queue derivatives of {label} {pks[start:]}')
+            discard_executor(executor)
+            return
+        future.add_done_callback(partial(derivatives_rendered, model, executor))
+
+
+def derivatives_rendered(model, executor, future):
+    """Done callback of a pool job: one images_updated per job"""
+    try:
+        processed, _ = future.result()
+    except Exception:
+        logger.exception(
+            f'Rendering {model._meta.verbose_name} derivatives failed; '
+            'reprocess_media --pending renders them'
+        )
+        if getattr(executor, '_broken', False):
+            discard_executor(executor)
+        return
+
+    try:
+        if processed:
+            images_updated.send(sender=model, derivatives=True)
+    finally:
+        # This runs in the pool's management thread, which never ends
+        connections.close_all()
+
+
+def reprocess_derivatives(model_label, field_name, pks, force=True):
+    """
+    Re-render the derivatives of the rows ``pks`` of ``model_label`` with the
+    current settings (only missing ones without ``force``). Returns (rows
+    processed, bytes of source read). Runs in the background pool and the
+    workers of manage.py reprocess_media, whose caller sends images_updated
+    once for many rows instead of once per row.
+    """
+    from django.apps import apps
+
+    model = apps.get_model(model_label)
+    processed = size = 0
+    for instance in model._default_manager.filter(pk__in=pks).order_by('pk'):
+        field_file = getattr(instance, field_name)
+        if not field_file:
+            continue
+        try:
+            size += field_file.size
+        except OSError:
+            pass
+        generate_derivatives(instance, field_name, force=force, notify=False)
+        processed += 1
+    return processed, size
+
+
+def dominant_color(image):
+    """Most common colour of a small RGB image, as #rrggbb"""
+    palette_image = image.quantize(colors=8)
+    palette = palette_image.getpalette()
+    _, index = max(palette_image.getcolors())
+    return '#%02x%02x%02x' % tuple(palette[index * 3:index * 3 + 3])
+
+
+def placeholder_data_uri(image):
+    """A blurry PLACEHOLDER_SIZE preview of ``image`` as a data: URI"""
+    image = image.copy()
+    image.thumbnail((PLACEHOLDER_SIZE, PLACEHOLDER_SIZE))
+    content = encode(image, 'webp', quality=PLACEHOLDER_QUALITY)
+    return 'data:image/webp;base64,' + base64.b64encode(content).decode('ascii')
+
+
+def difference_hash(image):
+    """64-bit dHash of ``image`` as 16 hex digits: one bit per horizontal gradient"""
+    pixels = list(image.convert('L').resize((9, 8), Image.LANCZOS).getdata())
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            value = (value << 1) | (pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+    return f'{value:016x}'
+
+
+def read_image_metadata(fp):
+    """Upright width and height, dominant colour, placeholder and dHash of an image"""
+    image = Image.open(fp)
+    width, height = image.size
+    if image.getexif().get(ExifTags.Base.Orientation) in TRANSPOSED_ORIENTATIONS:
+        width, height = height, width
+
+    image.draft('RGB', (PREVIEW_SIZE, PREVIEW_SIZE))
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail((PREVIEW_SIZE, PREVIEW_SIZE))
+    image = to_rgb(image)
+
+    return {
+        'width': width,
+        'height': height,
+        'dominant_color': dominant_color(image),
+        'placeholder': placeholder_data_uri(image),
+        'phash': difference_hash(image),
+    }
+
+
+def populate_image_metadata(instance, field_name='image'):
+    """
+    Set the metadata fields of ``instance`` from its (possibly not yet
+    saved) image. Unreadable images still get their byte size, so they are
+    not analysed again on every save. Returns True if the image was readable.
+    """
+    field_file = getattr(instance, field_name)
+    if not field_file:
+        return False
+
+    committed = field_file._committed
+    try:
+        field_file.open('rb')
+        try:
+            instance.file_size = field_file.size
+            metadata = read_image_metadata(field_file)
+        finally:
+            if committed:
+                field_file.close()
+            else:
+                # The upload is still to be written to storage
+                field_file.seek(0)
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        logger.warning(f'Could not read metadata of {field_file.name}: {e}')
+        return False
+
+    for name, value in metadata.items():
+        setattr(instance, name, value)
+    return True
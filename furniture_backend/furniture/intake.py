@@ -0,0 +1,184 @@
+"""
+Sanitation of customer photos uploaded with a custom request.
+
+Each photo is decoded, turned upright according to its EXIF orientation,
+downscaled to at most INTAKE_MAX_PIXELS and re-encoded as a plain JPEG, which
+drops EXIF (GPS position included), XMP and any other embedded metadata.
+HEIC photos are accepted when pillow-heif is installed.
+
+The work runs in a bounded pool of INTAKE_WORKERS processes, so the photos
+of one request are processed in parallel and a hostile file cannot stall a
+web worker: anything over INTAKE_MAX_SOURCE_PIXELS is refused before it is
+decoded, and a photo still not done INTAKE_TIMEOUT seconds after it was
+submitted is dropped. A pool with a stuck worker is retired: new requests get
+a fresh pool, while the work other requests already queued on the old one
+still completes. Set INTAKE_WORKERS to 0 to process photos inline.
+
+The worker side of this module imports nothing from Django, so it also works
+with the spawn and forkserver start methods.
+"""
+import io
+import logging
+import os
+import threading
+import warnings
+from concurrent.futures import ProcessPoolExecutor, wait
+
+from PIL import Image, ImageOps
+
+try:
+    from pillow_heif import register_heif_opener
+except ImportError:  # pragma: no cover - optional dependency
+    pass
+else:
+    register_heif_opener()
+
+
+DEFAULT_MAX_PIXELS = 12_000_000
+DEFAULT_MAX_SOURCE_PIXELS = 100_000_000
+DEFAULT_QUALITY = 85
+DEFAULT_TIMEOUT = 20
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class RejectedImage(Exception):
+    """The upload is not an image we are willing to store"""
+
+
+def sanitize_image(source, max_pixels, max_source_pixels, quality):
+    """
+    JPEG bytes of the image in ``source`` (a path or bytes), upright,
+    without metadata and at most ``max_pixels`` large. Runs in a worker.
+    """
+    with warnings.catch_warnings():
+        # The source size is checked against max_source_pixels below, not the
+        # process-wide Image.MAX_IMAGE_PIXELS, which this must not change: it
+        # also runs inline in the web process
+        warnings.simplefilter('ignore', Image.DecompressionBombWarning)
+        try:
+            image = Image.open(source if isinstance(source, str) else io.BytesIO(source))
+            width, height = image.size
+            if width * height > max_source_pixels:
+                raise RejectedImage(f'{width}x{height} pixels is over the {max_source_pixels} pixel limit')
+            if width * height > max_pixels:
+                scale = (max_pixels / (width * height)) ** 0.5
+                image.draft('RGB', (int(width * scale), int(height * scale)))
+            image = ImageOps.exif_transpose(image)
+            image.load()
+        except (OSError, ValueError, SyntaxError, Image.DecompressionBombError) as e:
+            raise RejectedImage(str(e))
+
+    if image.width * image.height > max_pixels:
+        scale = (max_pixels / (image.width * image.height)) ** 0.5
+        image = image.resize(
+            (max(1, int(image.width * scale)), max(1, int(image.height * scale))), Image.LANCZOS
+        )
+
+    if image.mode != 'RGB':
+        rgba = image.convert('RGBA')
+        image = Image.new('RGB', rgba.size, (255, 255, 255))
+        image.paste(rgba, mask=rgba.getchannel('A'))
+
+    buffer = io.BytesIO()
+    # No exif/icc_profile arguments: the re-encoded file carries no metadata
+    image.save(buffer, 'JPEG', quality=quality, optimize=True, progressive=True)
+    return buffer.getvalue()
+
+
+def get_executor(workers):
+    global _executor
+    with _executor_lock:
+        # A crashed worker breaks the whole pool for good
+        if _executor is None or getattr(_executor, '_broken', False):
+            _executor = ProcessPoolExecutor(max_workers=workers)
+        return _executor
+
+
+def retire_executor(executor, grace):
+    """
+    Hand no more work to a pool whose worker is stuck or dead; the next call
+    starts a fresh one. Work already queued on it still runs, and its
+    processes are ended after ``grace`` seconds, by when every request
+    waiting on the pool has given up on it.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is not executor:
+            # Already retired by another request
+            return
+        _executor = None
+
+    # ProcessPoolExecutor cannot cancel a running task, so end its processes
+    processes = list((getattr(executor, '_processes', None) or {}).values())
+    executor.shutdown(wait=False)
+    timer = threading.Timer(grace, terminate_processes, [processes])
+    timer.daemon = True
+    timer.start()
+
+
+def terminate_processes(processes):
+    for process in processes:
+        process.terminate()
+
+
+def sanitize_uploads(uploads):
+    """
+    Sanitized JPEG bytes for each uploaded file, in order, or None for a
+    file that was rejected. Uploads are processed in parallel.
+    """
+    from django.conf import settings
+
+    options = (
+        getattr(settings, 'INTAKE_MAX_PIXELS', DEFAULT_MAX_PIXELS),
+        getattr(settings, 'INTAKE_MAX_SOURCE_PIXELS', DEFAULT_MAX_SOURCE_PIXELS),
+        getattr(settings, 'INTAKE_QUALITY', DEFAULT_QUALITY),
+    )
+    workers = getattr(settings, 'INTAKE_WORKERS', min(4, os.cpu_count() or 1))
+    timeout = getattr(settings, 'INTAKE_TIMEOUT', DEFAULT_TIMEOUT)
+
+    # Large uploads are already on disk: hand the worker the path, not the bytes
+    sources = [
+        upload.temporary_file_path() if hasattr(upload, 'temporary_file_path') else upload.read()
+        for upload in uploads
+    ]
+
+    if not workers:
+        results = []
+        for upload, source in zip(uploads, sources):
+            try:
+                results.append(sanitize_image(source, *options))
+            except RejectedImage as e:
+                logger.warning(f'Rejected upload {upload.name}: {e}')
+                results.append(None)
+        return results
+
+    executor = get_executor(workers)
+    futures = [executor.submit(sanitize_image, source, *options) for source in sources]
+    # One deadline for the whole request, however many photos it has
+    _, not_done = wait(futures, timeout=timeout)
+
+    # Photos still queued behind other requests' work are simply withdrawn
+    stuck = [future for future in not_done if not future.cancel()]
+    if stuck:
+        retire_executor(executor, timeout)
+
+    results = []
+    for upload, future in zip(uploads, futures):
+        if future in not_done:
+            logger.warning(f'Rejected upload {upload.name}: not processed within {timeout}s')
+            results.append(None)
+            continue
+        try:
+            results.append(future.result())
+        except RejectedImage as e:
+            logger.warning(f'Rejected upload {upload.name}: {e}')
+            results.append(None)
+        except Exception:
+            # e.g. BrokenProcessPool after a crashed worker
+            logger.exception(f'Could not process upload {upload.name}')
+            results.append(None)
+    return results
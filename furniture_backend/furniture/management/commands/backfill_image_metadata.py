@@ -0,0 +1,60 @@
+"""
+Management command to store intrinsic metadata of already uploaded images
+Usage: python manage.py backfill_image_metadata [--all] [--batch-size 200]
+
+Reads width, height, byte size, dominant colour, placeholder and perceptual
+hash of every GalleryImage and ContactImage missing them (or of all of them
+with --all). New uploads get theirs on save; this covers rows from before.
+"""
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from furniture.images import images_updated, populate_image_metadata
+from furniture.models import ContactImage, GalleryImage
+
+
+class Command(BaseCommand):
+    help = 'Compute dimensions, size, dominant colour, placeholders and hashes of stored images'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Recompute images that already have metadata too',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=200,
+            help='Rows written per UPDATE (default: 200)',
+        )
+
+    def handle(self, *args, **options):
+        for model in (GalleryImage, ContactImage):
+            queryset = model.objects.all()
+            if not options['all']:
+                queryset = queryset.filter(Q(file_size__isnull=True) | Q(phash=''))
+            queryset = queryset.only('id', 'image', *model.METADATA_FIELDS).order_by('pk')
+
+            self.stdout.write(f'Reading {model._meta.verbose_name_plural}...')
+            readable = unreadable = 0
+            batch = []
+            for instance in queryset.iterator(chunk_size=options['batch_size']):
+                if populate_image_metadata(instance):
+                    readable += 1
+                else:
+                    unreadable += 1
+                batch.append(instance)
+
+                if len(batch) >= options['batch_size']:
+                    model.objects.bulk_update(batch, model.METADATA_FIELDS)
+                    batch = []
+
+            if batch:
+                model.objects.bulk_update(batch, model.METADATA_FIELDS)
+            if readable or unreadable:
+                images_updated.send(sender=model)
+
+            self.stdout.write(f'  ✓ {readable} updated, {unreadable} unreadable')
+
+        self.stdout.write(self.style.SUCCESS('Image metadata backfill complete.'))
@@ -0,0 +1,73 @@
+"""
+Management command to remove media files no database row refers to
+Usage: python manage.py media_gc [--delete | --quarantine] [--min-age 86400] [--batch-size 500]
+
+Without --delete or --quarantine it only reports what would be removed.
+Deleted images, contact photos and replaced material/service images leave
+their files behind; this finds them by streaming every referenced name from
+the database and walking MEDIA_ROOT (see furniture/media_gc.py).
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.template.defaultfilters import filesizeformat
+
+from furniture.media_gc import DEFAULT_BATCH_SIZE, collect_garbage
+
+
+class Command(BaseCommand):
+    help = 'Report, delete or quarantine orphaned media files'
+
+    def add_arguments(self, parser):
+        action = parser.add_mutually_exclusive_group()
+        action.add_argument(
+            '--delete',
+            action='store_true',
+            help='Delete orphaned files',
+        )
+        action.add_argument(
+            '--quarantine',
+            nargs='?',
+            const=settings.MEDIA_GC_QUARANTINE_ROOT,
+            help=f'Move orphaned files here instead (default: {settings.MEDIA_GC_QUARANTINE_ROOT})',
+        )
+        parser.add_argument(
+            '--min-age',
+            type=int,
+            default=settings.MEDIA_GC_MIN_AGE,
+            help=f'Keep files modified less than this many seconds ago (default: {settings.MEDIA_GC_MIN_AGE})',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help=f'Files checked and removed per batch (default: {DEFAULT_BATCH_SIZE})',
+        )
+
+    def handle(self, *args, **options):
+        dry_run = not (options['delete'] or options['quarantine'])
+        verbose = options['verbosity'] > 1
+
+        def on_batch(orphans):
+            if verbose:
+                for name, size in orphans:
+                    self.stdout.write(f'  {name} ({filesizeformat(size)})')
+
+        self.stdout.write('Looking for orphaned media files...' + (' (dry run)' if dry_run else ''))
+        report = collect_garbage(
+            dry_run=dry_run,
+            quarantine=options['quarantine'],
+            min_age=options['min_age'],
+            batch_size=options['batch_size'],
+            on_batch=on_batch,
+        )
+
+        self.stdout.write(f"  ✓ {report['referenced']} referenced names")
+        self.stdout.write(f"  ✓ {report['orphans']} orphaned files ({filesizeformat(report['orphan_bytes'])})")
+        if dry_run:
+            self.stdout.write(self.style.SUCCESS('Dry run complete; run with --delete or --quarantine to remove them.'))
+            return
+
+        verb = 'quarantined' if options['quarantine'] else 'deleted'
+        self.stdout.write(f"  ✓ {report['removed']} files {verb} ({filesizeformat(report['removed_bytes'])})")
+        self.stdout.write(f"  ✓ {report['blobs']} unreferenced blob records purged")
+        self.stdout.write(self.style.SUCCESS('Media garbage collection complete.'))
@@ -0,0 +1,31 @@
+"""
+Management command to renumber manually ordered lists whose gaps ran out
+Usage: python manage.py rebalance_ordering [--all]
+
+Moves take the midpoint between two neighbours (see furniture/ordering.py),
+so repeated moves into one spot use up the room there. Run this
+periodically (e.g. nightly) to space such lists ORDER_GAP apart again
+before a move has to; the visible order never changes.
+"""
+from django.core.management.base import BaseCommand
+
+from furniture.ordering import ORDER_FIELDS, rebalance
+
+
+class Command(BaseCommand):
+    help = 'Respace order/sort_order values of lists whose neighbours are too close'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Renumber every list, not only the tight ones',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write('Rebalancing manual ordering...')
+        for model in ORDER_FIELDS:
+            renumbered = rebalance(model, force=options['all'])
+            self.stdout.write(f'  ✓ {model._meta.verbose_name_plural}: {renumbered} list(s) renumbered')
+
+        self.stdout.write(self.style.SUCCESS('Ordering rebalanced.'))
@@ -0,0 +1,43 @@
+"""
+Management command to repair the denormalized gallery counters
+Usage: python manage.py recount_gallery
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from furniture.models import GalleryCategory, GalleryProject, rows_changed
+
+
+PROJECT_COUNTERS = ('id', 'image_count', 'primary_image_id')
+CATEGORY_COUNTERS = ('id', 'active_project_count', 'image_count')
+
+
+class Command(BaseCommand):
+    help = 'Recompute stored image counts, primary images and project counts for the gallery'
+
+    def handle(self, *args, **kwargs):
+        self.stdout.write('Recounting gallery projects and categories...')
+
+        projects_before = set(GalleryProject.objects.values_list(*PROJECT_COUNTERS))
+        categories_before = set(GalleryCategory.objects.values_list(*CATEGORY_COUNTERS))
+
+        with transaction.atomic():
+            # Refreshing projects refreshes the categories they belong to;
+            # the explicit category pass also covers categories with no projects.
+            GalleryProject.objects.all().refresh_image_summary()
+            GalleryCategory.objects.all().refresh_counts()
+
+        projects_drifted = len(
+            set(GalleryProject.objects.values_list(*PROJECT_COUNTERS)) - projects_before
+        )
+        categories_drifted = len(
+            set(GalleryCategory.objects.values_list(*CATEGORY_COUNTERS)) - categories_before
+        )
+
+        if projects_drifted or categories_drifted:
+            # The repair was set-based: retire the responses built from the drifted counts
+            for model in (GalleryProject, GalleryCategory):
+                rows_changed.send(sender=model)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Done. Repaired {projects_drifted} project(s) and {categories_drifted} category(ies).'
+        ))
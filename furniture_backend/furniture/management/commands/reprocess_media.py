@@ -0,0 +1,237 @@
+"""
+Management command to re-render image derivatives with the current settings
+Usage: python manage.py reprocess_media [--since 2024-05-01] [--models galleryimage material]
+                                        [--workers 8] [--shard-size 25] [--restart] [--pending]
+
+Run it after changing IMAGE_DERIVATIVE_WIDTHS, IMAGE_DERIVATIVE_FORMATS or
+IMAGE_DERIVATIVE_QUALITY. Rows are sent in shards of --shard-size to a pool
+of --workers processes (all cores by default; 0 renders in this process).
+
+With --pending only rows still missing derivatives of their current file
+are rendered: the queue of uploads when IMAGE_DERIVATIVE_RENDERING is
+'queue', and any a background pool lost otherwise. Run it from cron then.
+
+Progress is written to a checkpoint file after every shard; running the
+same command again after an interruption resumes where it stopped. The
+checkpoint is removed once a run completes, or ignored with --restart.
+"""
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from furniture.images import images_updated, pending_derivatives, reprocess_derivatives
+from furniture.models import IMAGE_DERIVATIVE_FIELDS
+
+
+DEFAULT_CHECKPOINT = os.path.join(settings.BASE_DIR, '.reprocess_media.json')
+# Seconds between two progress lines
+PROGRESS_INTERVAL = 10
+
+
+class Command(BaseCommand):
+    help = 'Re-render responsive image derivatives in parallel, resuming interrupted runs'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--since',
+            help=(
+                'Only rows created or updated since this date or datetime (ISO 8601); '
+                'models without updated_at (gallery images) by created_at alone'
+            ),
+        )
+        parser.add_argument(
+            '--models',
+            nargs='+',
+            choices=sorted(model._meta.model_name for model in IMAGE_DERIVATIVE_FIELDS),
+            help='Only these models (default: all with derivatives)',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Worker processes (default: one per core; 0 to render in this process)',
+        )
+        parser.add_argument(
+            '--shard-size',
+            type=int,
+            default=25,
+            help='Rows per unit of work (default: 25)',
+        )
+        parser.add_argument(
+            '--checkpoint',
+            default=DEFAULT_CHECKPOINT,
+            help=f'Checkpoint file (default: {DEFAULT_CHECKPOINT})',
+        )
+        parser.add_argument(
+            '--pending',
+            action='store_true',
+            help='Only render rows whose derivatives are missing, keeping current ones',
+        )
+        parser.add_argument(
+            '--restart',
+            action='store_true',
+            help='Ignore an existing checkpoint and start over',
+        )
+
+    def handle(self, *args, **options):
+        since = self.parse_since(options['since'])
+        models = [
+            model for model in IMAGE_DERIVATIVE_FIELDS
+            if not options['models'] or model._meta.model_name in options['models']
+        ]
+        self.checkpoint_path = options['checkpoint']
+        self.run = {
+            'since': options['since'],
+            'models': [model._meta.label_lower for model in models],
+            'pending': options['pending'],
+        }
+        self.done = self.load_checkpoint(options['restart'])
+
+        self.executor = None
+        if options['workers'] > 0:
+            # Workers must not inherit this process's database connections
+            connections.close_all()
+            self.executor = ProcessPoolExecutor(max_workers=options['workers'], initializer=django.setup)
+            # Start them (all at once under fork) before any query opens a connection here
+            self.executor.submit(int).result()
+        self.max_in_flight = max(1, options['workers']) * 4
+
+        self.images = self.bytes = 0
+        self.started = self.last_progress = time.monotonic()
+        try:
+            for model in models:
+                self.reprocess(model, since, options['shard_size'], options['pending'])
+        finally:
+            if self.executor is not None:
+                self.executor.shutdown(cancel_futures=True)
+
+        try:
+            os.remove(self.checkpoint_path)
+        except FileNotFoundError:
+            pass
+        self.stdout.write(self.style.SUCCESS(f'Reprocessing complete: {self.throughput()}'))
+
+    def parse_since(self, value):
+        if not value:
+            return None
+        since = parse_datetime(value)
+        if since is None and parse_date(value) is not None:
+            since = parse_datetime(f'{value}T00:00:00')
+        if since is None:
+            raise CommandError(f'Invalid --since value: {value}')
+        if timezone.is_naive(since):
+            since = timezone.make_aware(since)
+        return since
+
+    def load_checkpoint(self, restart):
+        """{model label: highest pk done} of an interrupted run with the same arguments"""
+        if restart:
+            return {}
+        try:
+            with open(self.checkpoint_path) as f:
+                checkpoint = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except ValueError:
+            raise CommandError(f'Unreadable checkpoint {self.checkpoint_path}; rerun with --restart')
+
+        if checkpoint.get('run') != self.run:
+            self.stdout.write(self.style.WARNING(
+                'Ignoring a checkpoint left by a run with different arguments'
+            ))
+            return {}
+        self.stdout.write(f"Resuming from checkpoint {self.checkpoint_path}")
+        return checkpoint['done']
+
+    def save_checkpoint(self):
+        tmp_path = f'{self.checkpoint_path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'run': self.run, 'done': self.done}, f)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def reprocess(self, model, since, shard_size, pending=False):
+        label = model._meta.label_lower
+        field_name = IMAGE_DERIVATIVE_FIELDS[model]
+        if pending:
+            queryset = pending_derivatives(model, field_name)
+        else:
+            queryset = model._default_manager.exclude(**{field_name: ''})
+        self.force = not pending
+        if label in self.done:
+            queryset = queryset.filter(pk__gt=self.done[label])
+        if since is not None:
+            changed = Q(created_at__gte=since)
+            if any(field.name == 'updated_at' for field in model._meta.fields):
+                changed |= Q(updated_at__gte=since)
+            queryset = queryset.filter(changed)
+
+        self.stdout.write(f'Reprocessing {model._meta.verbose_name_plural}...')
+        images_before = self.images
+
+        # Shards complete out of order; the checkpoint only moves past a
+        # shard once every shard before it is done too.
+        in_flight = deque()
+        shard = []
+        for pk in queryset.order_by('pk').values_list('pk', flat=True).iterator(chunk_size=shard_size * 10):
+            shard.append(pk)
+            if len(shard) >= shard_size:
+                in_flight.append((shard[-1], self.submit(label, field_name, shard)))
+                shard = []
+                while len(in_flight) >= self.max_in_flight or (in_flight and in_flight[0][1].done()):
+                    self.complete(label, *in_flight.popleft())
+        if shard:
+            in_flight.append((shard[-1], self.submit(label, field_name, shard)))
+        while in_flight:
+            self.complete(label, *in_flight.popleft())
+
+        if self.images > images_before:
+            images_updated.send(sender=model, derivatives=True)
+        self.stdout.write(f'  ✓ {self.images - images_before} {model._meta.verbose_name_plural}')
+
+    def submit(self, label, field_name, pks):
+        if self.executor is None:
+            return InlineResult(reprocess_derivatives(label, field_name, pks, self.force))
+        return self.executor.submit(reprocess_derivatives, label, field_name, pks, self.force)
+
+    def complete(self, label, last_pk, future):
+        images, size = future.result()
+        self.images += images
+        self.bytes += size
+        self.done[label] = last_pk
+        self.save_checkpoint()
+
+        now = time.monotonic()
+        if now - self.last_progress >= PROGRESS_INTERVAL:
+            self.last_progress = now
+            self.stdout.write(f'  … {self.throughput()}')
+
+    def throughput(self):
+        elapsed = max(time.monotonic() - self.started, 1e-6)
+        megabytes = self.bytes / 1024 ** 2
+        return (
+            f'{self.images} images, {megabytes:.1f} MB in {elapsed:.1f}s '
+            f'({self.images / elapsed:.1f} images/s, {megabytes / elapsed:.2f} MB/s)'
+        )
+
+
+class InlineResult:
+    """Stands in for a Future when rendering in this process"""
+
+    def __init__(self, result):
+        self._result = result
+
+    def done(self):
+        return True
+
+    def result(self):
+        return self._result
@@ -0,0 +1,207 @@
+"""
+Garbage collection of media files no database row refers to.
+
+Deleting a GalleryImage, ContactImage, project or category removes rows but
+leaves their files under MEDIA_ROOT, and so does replacing the image of a
+Material or Service. collect_garbage() finds those orphans and deletes them,
+or moves them to a quarantine directory, in batches.
+
+Memory stays flat however large the media tree is: referenced names are
+streamed from every FileField of every model with .iterator() into an
+on-disk SQLite index, the tree is walked lazily with os.scandir, and walked
+files are checked against the index a batch at a time.
+
+Files younger than ``min_age`` are never touched: an upload is written to
+disk (and a reused blob touched) before its row is committed. Older leftovers
+of interrupted uploads in blobs/tmp are collected like any other orphan.
+Right before each removal the file is checked again, so a blob that an upload
+reused while the tree was being walked (a MediaBlob reference, a fresh mtime)
+is kept.
+"""
+import logging
+import os
+import sqlite3
+import tempfile
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.db import models
+from django.utils import timezone
+
+from .storage import blob_sha256
+
+
+DEFAULT_MIN_AGE = 24 * 60 * 60
+DEFAULT_BATCH_SIZE = 500
+
+logger = logging.getLogger(__name__)
+
+
+def file_fields():
+    """(model, field name) of every FileField/ImageField in the project"""
+    for model in apps.get_models():
+        for field in model._meta.concrete_fields:
+            if isinstance(field, models.FileField):
+                yield model, field.name
+
+
+def referenced_names(batch_size=DEFAULT_BATCH_SIZE):
+    """Stream every file name stored in the database"""
+    for model, field_name in file_fields():
+        names = model._default_manager.exclude(**{field_name: ''}).exclude(**{f'{field_name}__isnull': True})
+        yield from names.values_list(field_name, flat=True).iterator(chunk_size=batch_size)
+
+
+class ReferenceIndex:
+    """Referenced names in a temporary on-disk SQLite table, for batched lookups"""
+
+    def __init__(self, names, batch_size=DEFAULT_BATCH_SIZE):
+        self.directory = tempfile.TemporaryDirectory(prefix='media-gc-')
+        self.connection = sqlite3.connect(os.path.join(self.directory.name, 'references.sqlite3'))
+        self.connection.execute('CREATE TABLE refs (name TEXT PRIMARY KEY) WITHOUT ROWID')
+        self.count = 0
+
+        batch = []
+        for name in names:
+            batch.append((name,))
+            if len(batch) >= batch_size:
+                self.add(batch)
+                batch = []
+        self.add(batch)
+        self.connection.commit()
+
+    def add(self, batch):
+        self.connection.executemany('INSERT OR IGNORE INTO refs (name) VALUES (?)', batch)
+        self.count += len(batch)
+
+    def referenced(self, names):
+        """The subset of ``names`` that is referenced"""
+        placeholders = ','.join('?' * len(names))
+        rows = self.connection.execute(f'SELECT name FROM refs WHERE name IN ({placeholders})', names)
+        return {name for name, in rows}
+
+    def close(self):
+        self.connection.close()
+        self.directory.cleanup()
+
+
+def walk_media(root, exclude=()):
+    """Yield (name relative to ``root``, size, mtime) of every file, lazily"""
+    root = str(root)
+    excluded = {os.path.normpath(os.path.join(root, path)) for path in exclude}
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        try:
+            entries = os.scandir(directory)
+        except FileNotFoundError:
+            continue
+        with entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if os.path.normpath(entry.path) not in excluded:
+                        stack.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    stat = entry.stat(follow_symlinks=False)
+                    name = os.path.relpath(entry.path, root).replace(os.sep, '/')
+                    yield name, stat.st_size, stat.st_mtime
+
+
+def find_orphans(index, root, min_age=DEFAULT_MIN_AGE, exclude=(), batch_size=DEFAULT_BATCH_SIZE):
+    """Yield batches of (name, size) of files under ``root`` missing from ``index``"""
+    cutoff = time.time() - min_age
+    batch = []
+    for name, size, mtime in walk_media(root, exclude):
+        if mtime <= cutoff:
+            batch.append((name, size))
+        if len(batch) >= batch_size:
+            yield orphans_in(index, batch)
+            batch = []
+    if batch:
+        yield orphans_in(index, batch)
+
+
+def orphans_in(index, batch):
+    referenced = index.referenced([name for name, _ in batch])
+    return [(name, size) for name, size in batch if name not in referenced]
+
+
+def remove_orphans(root, orphans, quarantine=None, cutoff=None):
+    """
+    Delete ``orphans`` (or move them under ``quarantine``) unless a blob row
+    refers to them again or they were modified after ``cutoff`` (a
+    timestamp); returns those removed.
+    """
+    from .models import MediaBlob
+
+    shas = [sha256 for sha256 in (blob_sha256(name) for name, _ in orphans) if sha256]
+    in_use = set(
+        MediaBlob.objects.filter(sha256__in=shas, ref_count__gt=0).values_list('name', flat=True)
+    ) if shas else set()
+
+    removed = []
+    for name, size in orphans:
+        if name in in_use:
+            continue
+        path = os.path.join(root, name)
+        try:
+            if cutoff is not None and os.stat(path).st_mtime > cutoff:
+                continue
+            if quarantine:
+                target = os.path.join(quarantine, name)
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                os.replace(path, target)
+            else:
+                os.remove(path)
+        except FileNotFoundError:
+            continue
+        except OSError:
+            logger.exception(f'Could not remove orphaned media file {name}')
+            continue
+        removed.append((name, size))
+    return removed
+
+
+def collect_garbage(dry_run=True, quarantine=None, min_age=None, batch_size=DEFAULT_BATCH_SIZE, on_batch=None):
+    """
+    Find (and unless ``dry_run``, remove) every orphaned file under
+    MEDIA_ROOT. ``on_batch(orphans)`` is called for each batch found.
+    Returns a report dict with counts and bytes.
+    """
+    from .models import MediaBlob
+
+    if min_age is None:
+        min_age = getattr(settings, 'MEDIA_GC_MIN_AGE', DEFAULT_MIN_AGE)
+    root = str(settings.MEDIA_ROOT)
+    exclude = list(settings.MEDIA_GC_EXCLUDE)
+    if quarantine and os.path.abspath(quarantine).startswith(os.path.abspath(root) + os.sep):
+        exclude.append(os.path.relpath(quarantine, root))
+
+    report = {'referenced': 0, 'orphans': 0, 'orphan_bytes': 0, 'removed': 0, 'removed_bytes': 0, 'blobs': 0}
+    started = timezone.now()
+    # Files touched after this are in use again, whatever the walk saw
+    cutoff = time.time() - min_age
+    index = ReferenceIndex(referenced_names(batch_size), batch_size)
+    try:
+        report['referenced'] = index.count
+        for orphans in find_orphans(index, root, min_age, exclude, batch_size):
+            if not orphans:
+                continue
+            report['orphans'] += len(orphans)
+            report['orphan_bytes'] += sum(size for _, size in orphans)
+            if on_batch:
+                on_batch(orphans)
+            if not dry_run:
+                removed = remove_orphans(root, orphans, quarantine, cutoff)
+                report['removed'] += len(removed)
+                report['removed_bytes'] += sum(size for _, size in removed)
+    finally:
+        index.close()
+
+    if not dry_run:
+        # Blob rows whose last reference went away before the grace period;
+        # their files were among the orphans above.
+        cutoff = started - timezone.timedelta(seconds=min_age)
+        report['blobs'], _ = MediaBlob.objects.unreferenced().filter(updated_at__lt=cutoff).delete()
+    return report
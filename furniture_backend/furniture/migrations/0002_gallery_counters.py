@@ -0,0 +1,68 @@
+# Generated by Django 5.0.1 on 2026-10-17 00:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def populate_gallery_counters(apps, schema_editor):
+    GalleryCategory = apps.get_model('furniture', 'GalleryCategory')
+    GalleryProject = apps.get_model('furniture', 'GalleryProject')
+    GalleryImage = apps.get_model('furniture', 'GalleryImage')
+
+    images = GalleryImage.objects.filter(gallery_project=models.OuterRef('pk')).order_by()
+    GalleryProject.objects.update(
+        image_count=Coalesce(
+            models.Subquery(images.values('gallery_project').annotate(total=models.Count('pk')).values('total')),
+            0, output_field=models.IntegerField()
+        ),
+        primary_image=models.Subquery(
+            images.filter(is_primary=True).order_by('order', 'created_at').values('pk')[:1]
+        ),
+    )
+
+    active_projects = GalleryProject.objects.filter(
+        gallery_category=models.OuterRef('pk'),
+        is_active=True
+    ).order_by().values('gallery_category')
+    GalleryCategory.objects.update(
+        active_project_count=Coalesce(
+            models.Subquery(active_projects.annotate(total=models.Count('pk')).values('total')),
+            0, output_field=models.IntegerField()
+        ),
+        image_count=Coalesce(
+            models.Subquery(active_projects.annotate(total=models.Sum('image_count')).values('total')),
+            0, output_field=models.IntegerField()
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('furniture', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gallerycategory',
+            name='active_project_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='gallerycategory',
+            name='image_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Images in active projects'),
+        ),
+        migrations.AddField(
+            model_name='galleryproject',
+            name='image_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='galleryproject',
+            name='primary_image',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='furniture.galleryimage'),
+        ),
+        migrations.RunPython(populate_gallery_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.0.1 on 2026-10-17 00:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('furniture', '0002_gallery_counters'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='galleryproject',
+            index=models.Index(fields=['is_active', 'sort_order', '-created_at', 'id'], name='gallery_project_keyset_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='galleryproject',
+            index=models.Index(fields=['gallery_category', 'is_active', 'sort_order', '-created_at', 'id'], name='gallery_cat_project_keyset_idx'),
+        ),
+    ]
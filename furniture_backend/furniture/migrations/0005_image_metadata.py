@@ -0,0 +1,63 @@
+# Generated by Django 5.0.1 on 2026-10-17 00:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('furniture', '0004_image_derivatives'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='contactimage',
+            name='dominant_color',
+            field=models.CharField(blank=True, editable=False, help_text='#rrggbb', max_length=7),
+        ),
+        migrations.AddField(
+            model_name='contactimage',
+            name='file_size',
+            field=models.PositiveIntegerField(blank=True, editable=False, help_text='Bytes', null=True),
+        ),
+        migrations.AddField(
+            model_name='contactimage',
+            name='height',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='contactimage',
+            name='placeholder',
+            field=models.TextField(blank=True, editable=False, help_text='Tiny blurred preview as a data: URI'),
+        ),
+        migrations.AddField(
+            model_name='contactimage',
+            name='width',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='galleryimage',
+            name='dominant_color',
+            field=models.CharField(blank=True, editable=False, help_text='#rrggbb', max_length=7),
+        ),
+        migrations.AddField(
+            model_name='galleryimage',
+            name='file_size',
+            field=models.PositiveIntegerField(blank=True, editable=False, help_text='Bytes', null=True),
+        ),
+        migrations.AddField(
+            model_name='galleryimage',
+            name='height',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='galleryimage',
+            name='placeholder',
+            field=models.TextField(blank=True, editable=False, help_text='Tiny blurred preview as a data: URI'),
+        ),
+        migrations.AddField(
+            model_name='galleryimage',
+            name='width',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+    ]
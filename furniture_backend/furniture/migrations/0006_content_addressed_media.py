@@ -0,0 +1,45 @@
+# Generated by Django 5.0.1 on 2026-10-17 00:31
+
+import furniture.models
+import furniture.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('furniture', '0005_image_metadata'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='contactimage',
+            name='image',
+            field=models.ImageField(storage=furniture.storage.ContentAddressedStorage(), upload_to=furniture.models.contact_image_path),
+        ),
+        migrations.AlterField(
+            model_name='galleryimage',
+            name='image',
+            field=models.ImageField(storage=furniture.storage.ContentAddressedStorage(), upload_to=furniture.models.gallery_image_path),
+        ),
+        migrations.AlterField(
+            model_name='imagederivative',
+            name='source_name',
+            field=models.CharField(db_index=True, help_text='Original file the derivative was rendered from', max_length=255),
+        ),
+        migrations.CreateModel(
+            name='MediaBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sha256', models.CharField(max_length=64, unique=True)),
+                ('name', models.CharField(help_text='Storage name of the file', max_length=255)),
+                ('size', models.PositiveBigIntegerField(help_text='File size in bytes')),
+                ('ref_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['ref_count', 'updated_at'], name='furniture_m_ref_cou_da86a5_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.0.1 on 2026-10-17 00:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('furniture', '0006_content_addressed_media'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='contactimage',
+            name='phash',
+            field=models.CharField(blank=True, editable=False, help_text='Perceptual hash (dHash), hex', max_length=16),
+        ),
+        migrations.AddField(
+            model_name='galleryimage',
+            name='phash',
+            field=models.CharField(blank=True, editable=False, help_text='Perceptual hash (dHash), hex', max_length=16),
+        ),
+    ]
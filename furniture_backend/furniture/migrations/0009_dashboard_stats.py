@@ -0,0 +1,48 @@
+# Generated by Django 5.0.1 on 2026-10-17 00:54
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('furniture', '0008_upload_session'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DashboardStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('category_count', models.IntegerField(default=0)),
+                ('active_category_count', models.IntegerField(default=0)),
+                ('project_count', models.IntegerField(default=0)),
+                ('active_project_count', models.IntegerField(default=0)),
+                ('featured_project_count', models.IntegerField(default=0)),
+                ('projects_with_images', models.IntegerField(default=0)),
+                ('image_count', models.IntegerField(default=0)),
+                ('primary_image_count', models.IntegerField(default=0)),
+                ('before_image_count', models.IntegerField(default=0)),
+                ('custom_request_count', models.IntegerField(default=0)),
+                ('new_custom_request_count', models.IntegerField(default=0)),
+                ('in_progress_custom_request_count', models.IntegerField(default=0)),
+                ('done_custom_request_count', models.IntegerField(default=0)),
+                ('message_count', models.IntegerField(default=0)),
+                ('unread_message_count', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Dashboard stats',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='contactmessage',
+            index=models.Index(fields=['created_at'], name='furniture_c_created_02923b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customrequest',
+            index=models.Index(fields=['created_at'], name='furniture_c_created_8183f9_idx'),
+        ),
+    ]
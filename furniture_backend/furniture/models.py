@@ -1,9 +1,46 @@
-from django.db import models
+from django.conf import settings
+from django.contrib.contenttypes.fields import GenericForeignKey, GenericRelation
+from django.contrib.contenttypes.models import ContentType
+from django.db import models, transaction
+from django.db.models.functions import Coalesce, Now
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import Signal, receiver
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.utils import timezone
 from django.utils.text import slugify
 from django.contrib.auth.models import User
 import uuid
 import os
+from collections import Counter
+from datetime import timedelta
+from functools import partial
+
+from .images import (
+    drop_stale_derivatives, images_updated, populate_image_metadata, render_derivatives_later
+)
+from .similarity import gallery_image_index
+from .storage import blob_sha256, blob_storage
+
+
+# Sent with a model as sender after set-based writes (QuerySet.update(),
+# bulk_create(), ...) that bypass post_save/post_delete, once per batch, so
+# cached API responses built from its rows are invalidated.
+rows_changed = Signal()
+
+
+def first_in_bulk_delete(origin, key):
+    """
+    Whether a post_delete receiver should do its once-per-delete work
+    (``key``) for this row: always for a single delete, but only for the
+    first row of a QuerySet.delete(), the ``origin`` of every row it deletes.
+    """
+    if not isinstance(origin, models.QuerySet):
+        return True
+    handled = origin.__dict__.setdefault('_bulk_delete_handled', set())
+    if key in handled:
+        return False
+    handled.add(key)
+    return True
 
 
 # Helper function for gallery images
@@ -33,6 +70,29 @@ def gallery_image_path(instance, filename):
 
 
 # Gallery Models - Main Portfolio System
+class GalleryCategoryQuerySet(models.QuerySet):
+    def refresh_counts(self):
+        """
+        Recompute the stored active project and image counts of these
+        categories in a single UPDATE. Project image counts must be current.
+        """
+        active_projects = GalleryProject.objects.filter(
+            gallery_category=models.OuterRef('pk'),
+            is_active=True
+        ).order_by().values('gallery_category')
+
+        return self.update(
+            active_project_count=Coalesce(
+                models.Subquery(active_projects.annotate(total=models.Count('pk')).values('total')),
+                0, output_field=models.IntegerField()
+            ),
+            image_count=Coalesce(
+                models.Subquery(active_projects.annotate(total=models.Sum('image_count')).values('total')),
+                0, output_field=models.IntegerField()
+            ),
+        )
+
+
 class GalleryCategory(models.Model):
     """Gallery categories for portfolio projects"""
     name = models.CharField(max_length=100, unique=True)
@@ -41,8 +101,18 @@ class GalleryCategory(models.Model):
     cover_image = models.ImageField(upload_to='gallery/categories/', blank=True, null=True)
     is_active = models.BooleanField(default=True)
     sort_order = models.PositiveIntegerField(default=0)
+    active_project_count = models.PositiveIntegerField(default=0, editable=False)
+    image_count = models.PositiveIntegerField(
+        default=0, editable=False, help_text="Images in active projects"
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    derivatives = GenericRelation('ImageDerivative')
+
+    objects = GalleryCategoryQuerySet.as_manager()
+
+    # Maintained by GalleryCategoryQuerySet.refresh_counts(), never by save()
+    COUNTER_FIELDS = ('active_project_count', 'image_count')
 
     class Meta:
         verbose_name_plural = "Gallery Categories"
@@ -51,6 +121,7 @@ class GalleryCategory(models.Model):
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.name)
+        _exclude_counter_fields(self, kwargs)
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -58,7 +129,39 @@ class GalleryCategory(models.Model):
 
     @property
     def project_count(self):
-        return self.gallery_projects.filter(is_active=True).count()
+        return self.active_project_count
+
+    @property
+    def total_images(self):
+        return self.image_count
+
+
+class GalleryProjectQuerySet(models.QuerySet):
+    def with_image_summary(self):
+        """Join the stored primary image, the only image a list needs"""
+        return self.select_related('primary_image').prefetch_related('primary_image__derivatives')
+
+    def refresh_image_summary(self):
+        """
+        Recompute the stored image count and primary image pointer of these
+        projects in a single UPDATE, then the counts of their categories.
+        """
+        images = GalleryImage.objects.filter(gallery_project=models.OuterRef('pk')).order_by()
+        category_ids = list(self.values_list('gallery_category_id', flat=True).distinct())
+
+        updated = self.update(
+            image_count=Coalesce(
+                models.Subquery(
+                    images.values('gallery_project').annotate(total=models.Count('pk')).values('total')
+                ),
+                0, output_field=models.IntegerField()
+            ),
+            primary_image=models.Subquery(
+                images.filter(is_primary=True).order_by('order', 'created_at').values('pk')[:1]
+            ),
+        )
+        GalleryCategory.objects.filter(pk__in=category_ids).refresh_counts()
+        return updated
 
 
 class GalleryProject(models.Model):
@@ -90,12 +193,37 @@ class GalleryProject(models.Model):
     featured = models.BooleanField(default=False, help_text="Show in featured projects")
     is_active = models.BooleanField(default=True)
     sort_order = models.PositiveIntegerField(default=0)
+    image_count = models.PositiveIntegerField(default=0, editable=False)
+    primary_image = models.ForeignKey(
+        'GalleryImage',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        editable=False,
+        related_name='+'
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = GalleryProjectQuerySet.as_manager()
+
+    # Maintained by GalleryProjectQuerySet.refresh_image_summary(), never by save()
+    COUNTER_FIELDS = ('image_count', 'primary_image')
+
     class Meta:
         ordering = ['sort_order', '-created_at']
         unique_together = ['gallery_category', 'slug']
+        indexes = [
+            # Keyset pagination order (api.pagination.GalleryProjectPagination)
+            models.Index(
+                fields=['is_active', 'sort_order', '-created_at', 'id'],
+                name='gallery_project_keyset_idx'
+            ),
+            models.Index(
+                fields=['gallery_category', 'is_active', 'sort_order', '-created_at', 'id'],
+                name='gallery_cat_project_keyset_idx'
+            ),
+        ]
 
     def save(self, *args, **kwargs):
         if not self.slug:
@@ -108,28 +236,94 @@ class GalleryProject(models.Model):
             ).exclude(pk=self.pk).exists():
                 self.slug = f"{base_slug}-{counter}"
                 counter += 1
-        super().save(*args, **kwargs)
+
+        # The project may have moved category or been (de)activated
+        category_ids = {self.gallery_category_id}
+        if not self._state.adding:
+            category_ids.update(
+                GalleryProject.objects.filter(pk=self.pk).values_list('gallery_category_id', flat=True)
+            )
+
+        _exclude_counter_fields(self, kwargs)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            GalleryCategory.objects.filter(pk__in=category_ids).refresh_counts()
 
     def __str__(self):
         return f"{self.gallery_category.name} - {self.title}"
 
-    @property
-    def primary_image(self):
-        return self.images.filter(is_primary=True).first()
 
-    @property
-    def image_count(self):
-        return self.images.count()
+class ImageMetadataModel(models.Model):
+    """
+    Intrinsic metadata of ``image``, read once when a file is uploaded (see
+    furniture/images.py), so clients can reserve layout before it loads.
+    """
+    width = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    height = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    file_size = models.PositiveIntegerField(null=True, blank=True, editable=False, help_text="Bytes")
+    dominant_color = models.CharField(max_length=7, blank=True, editable=False, help_text="#rrggbb")
+    placeholder = models.TextField(blank=True, editable=False, help_text="Tiny blurred preview as a data: URI")
+    phash = models.CharField(max_length=16, blank=True, editable=False, help_text="Perceptual hash (dHash), hex")
 
+    METADATA_FIELDS = ('width', 'height', 'file_size', 'dominant_color', 'placeholder', 'phash')
 
-class GalleryImage(models.Model):
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        # A new upload, or a row saved before metadata existed
+        if self.image and (not self.image._committed or self.file_size is None):
+            populate_image_metadata(self)
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], *self.METADATA_FIELDS}
+        super().save(*args, **kwargs)
+
+
+class GalleryImageQuerySet(models.QuerySet):
+    def next_order(self):
+        """Order value that puts a new image after all of these, a gap apart"""
+        from .ordering import ORDER_GAP
+
+        max_order = self.aggregate(max_order=models.Max('order'))['max_order']
+        return ORDER_GAP if max_order is None else max_order + ORDER_GAP
+
+    def bulk_ingest(self, images):
+        """
+        Insert new, unsaved ``images`` with one INSERT. Their files are
+        written to storage and their metadata read first, so the transaction
+        only holds the rows. Does in bulk what save() and its receivers do
+        per row: blob references, project counters, and after commit the
+        derivatives, similarity index and cached responses. Unlike save(),
+        a primary image here does not demote the project's current one.
+        """
+        image_field = GalleryImage._meta.get_field('image')
+        for image in images:
+            populate_image_metadata(image)
+            # What the INSERT would do, done before the transaction
+            image_field.pre_save(image, add=True)
+
+        with transaction.atomic(using=self.db):
+            created = self.bulk_create(images)
+            MediaBlob.objects.acquire_many(image.image.name for image in created)
+            GalleryProject.objects.filter(
+                pk__in={image.gallery_project_id for image in created}
+            ).refresh_image_summary()
+
+            transaction.on_commit(partial(
+                render_derivatives_later, GalleryImage, 'image', [image.pk for image in created]
+            ), using=self.db)
+            transaction.on_commit(partial(images_updated.send, sender=GalleryImage), using=self.db)
+        return created
+
+
+class GalleryImage(ImageMetadataModel):
     """Individual images in gallery projects"""
     gallery_project = models.ForeignKey(
         GalleryProject,
         on_delete=models.CASCADE,
         related_name='images'
     )
-    image = models.ImageField(upload_to=gallery_image_path)
+    image = models.ImageField(upload_to=gallery_image_path, storage=blob_storage)
     title = models.CharField(max_length=200, blank=True)
     description = models.TextField(blank=True)
     alt_text = models.CharField(max_length=200, blank=True)
@@ -138,6 +332,9 @@ class GalleryImage(models.Model):
     tags = models.CharField(max_length=300, blank=True, help_text="Comma-separated tags")
     order = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
+    derivatives = GenericRelation('ImageDerivative')
+
+    objects = GalleryImageQuerySet.as_manager()
 
     class Meta:
         ordering = ['order', 'created_at']
@@ -146,18 +343,140 @@ class GalleryImage(models.Model):
         ]
 
     def save(self, *args, **kwargs):
-        # Ensure only one primary image per project
-        if self.is_primary:
-            GalleryImage.objects.filter(
-                gallery_project=self.gallery_project,
-                is_primary=True
-            ).update(is_primary=False)
-        super().save(*args, **kwargs)
+        # The image may have moved to another project
+        project_ids = {self.gallery_project_id}
+        if not self._state.adding:
+            project_ids.update(
+                GalleryImage.objects.filter(pk=self.pk).values_list('gallery_project_id', flat=True)
+            )
+
+        with transaction.atomic():
+            # Ensure only one primary image per project
+            if self.is_primary:
+                GalleryImage.objects.filter(
+                    gallery_project=self.gallery_project,
+                    is_primary=True
+                ).update(is_primary=False)
+            super().save(*args, **kwargs)
+            GalleryProject.objects.filter(pk__in=project_ids).refresh_image_summary()
 
     def __str__(self):
         return f"{self.gallery_project.title} - {self.title or f'Image {self.order}'}"
 
 
+def _exclude_counter_fields(instance, save_kwargs):
+    """
+    Keep a plain save() of a stale instance from overwriting denormalized
+    counters, which are only ever written by the set-based refresh methods.
+    """
+    if not instance._state.adding and save_kwargs.get('update_fields') is None:
+        save_kwargs['update_fields'] = [
+            field.name for field in instance._meta.concrete_fields
+            if not field.primary_key and field.name not in instance.COUNTER_FIELDS
+        ]
+
+
+def _deleted_from(origin):
+    return origin.model if isinstance(origin, models.QuerySet) else type(origin)
+
+
+def _refresh_projects(pks):
+    GalleryProject.objects.filter(pk__in=pks).refresh_image_summary()
+
+
+def _refresh_categories(pks):
+    GalleryCategory.objects.filter(pk__in=pks).refresh_counts()
+
+
+def _refresh_after_delete(origin, refresh, pk):
+    """
+    Recount ``pk`` with ``refresh``. A QuerySet.delete() sends post_delete
+    per row, so its pks are collected and recounted together after commit.
+    """
+    if not isinstance(origin, models.QuerySet):
+        refresh({pk})
+        return
+    pending = origin.__dict__.setdefault('_counter_refreshes', {})
+    if refresh not in pending:
+        pks = pending[refresh] = set()
+        transaction.on_commit(lambda: refresh(pks))
+    pending[refresh].add(pk)
+
+
+@receiver(post_delete, sender=GalleryImage)
+def refresh_counters_after_image_delete(sender, instance, origin=None, **kwargs):
+    # Cascades from a project or category delete are recounted by the
+    # project receiver below, or need no recount at all.
+    if _deleted_from(origin) in (GalleryProject, GalleryCategory):
+        return
+    _refresh_after_delete(origin, _refresh_projects, instance.gallery_project_id)
+
+
+@receiver(post_delete, sender=GalleryProject)
+def refresh_counters_after_project_delete(sender, instance, origin=None, **kwargs):
+    if _deleted_from(origin) is GalleryCategory:
+        return
+    _refresh_after_delete(origin, _refresh_categories, instance.gallery_category_id)
+
+
+class UploadSessionQuerySet(models.QuerySet):
+    def expired(self):
+        cutoff = timezone.now() - timedelta(seconds=settings.UPLOAD_SESSION_TTL)
+        return self.filter(updated_at__lt=cutoff)
+
+    def active(self):
+        cutoff = timezone.now() - timedelta(seconds=settings.UPLOAD_SESSION_TTL)
+        return self.filter(updated_at__gte=cutoff)
+
+
+class UploadSession(models.Model):
+    """A resumable upload of one gallery image (see furniture/uploads.py)"""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    gallery_project = models.ForeignKey(
+        GalleryProject,
+        on_delete=models.CASCADE,
+        related_name='upload_sessions'
+    )
+    filename = models.CharField(max_length=255)
+    length = models.PositiveBigIntegerField(help_text="Final size of the file in bytes")
+    offset = models.PositiveBigIntegerField(default=0, help_text="Bytes received so far")
+    title = models.CharField(max_length=200, blank=True)
+    alt_text = models.CharField(max_length=200, blank=True)
+    description = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = UploadSessionQuerySet.as_manager()
+
+    class Meta:
+        ordering = ['created_at']
+
+    @property
+    def path(self):
+        """Part file the received bytes are written to"""
+        return os.path.join(settings.UPLOAD_SESSION_ROOT, f'{self.pk}.part')
+
+    @property
+    def expires_at(self):
+        return self.updated_at + timedelta(seconds=settings.UPLOAD_SESSION_TTL)
+
+    def __str__(self):
+        return f"{self.filename} ({self.offset}/{self.length})"
+
+
+def remove_part_file(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+@receiver(post_delete, sender=UploadSession)
+def remove_upload_part_file(sender, instance, using=None, **kwargs):
+    # Not before commit: a rolled back finalize must find its bytes again
+    transaction.on_commit(partial(remove_part_file, instance.path), using=using)
+
+
 # Contact & Custom Request Models
 def contact_image_path(instance, filename):
     """Generate upload path for contact request images"""
@@ -213,6 +532,9 @@ class CustomRequest(models.Model):
         ordering = ['-created_at']
         verbose_name = "Custom Request"
         verbose_name_plural = "Custom Requests"
+        indexes = [
+            models.Index(fields=['created_at']),
+        ]
 
     def __str__(self):
         return f"{self.name} - {self.get_room_type_display()}"
@@ -225,14 +547,14 @@ class CustomRequest(models.Model):
         return dict(self.BUDGET_CHOICES).get(self.budget_range, self.budget_range)
 
 
-class ContactImage(models.Model):
+class ContactImage(ImageMetadataModel):
     """Images uploaded with contact requests"""
     contact_request = models.ForeignKey(
         CustomRequest,
         on_delete=models.CASCADE,
         related_name='images'
     )
-    image = models.ImageField(upload_to=contact_image_path)
+    image = models.ImageField(upload_to=contact_image_path, storage=blob_storage)
     alt_text = models.CharField(max_length=200, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
@@ -271,6 +593,7 @@ class ContactMessage(models.Model):
         ordering = ['-created_at']
         indexes = [
             models.Index(fields=['is_read', 'created_at']),
+            models.Index(fields=['created_at']),
         ]
 
     def __str__(self):
@@ -298,6 +621,7 @@ class Service(models.Model):
     sort_order = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    derivatives = GenericRelation('ImageDerivative')
 
     class Meta:
         ordering = ['sort_order', 'title']
@@ -338,6 +662,7 @@ class Material(models.Model):
     sort_order = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    derivatives = GenericRelation('ImageDerivative')
 
     class Meta:
         ordering = ['type', 'sort_order', 'name']
@@ -409,3 +734,411 @@ class FAQ(models.Model):
 
     def __str__(self):
         return self.question
+
+
+# Responsive image derivatives (see furniture/images.py)
+class ImageDerivative(models.Model):
+    """A resized, re-encoded rendition of an uploaded image"""
+    FORMAT_CHOICES = [
+        ('webp', 'WebP'),
+        ('jpeg', 'JPEG'),
+    ]
+
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+    object_id = models.PositiveIntegerField()
+    source = GenericForeignKey('content_type', 'object_id')
+    source_name = models.CharField(
+        max_length=255, db_index=True, help_text="Original file the derivative was rendered from"
+    )
+    format = models.CharField(max_length=10, choices=FORMAT_CHOICES)
+    width = models.PositiveIntegerField()
+    height = models.PositiveIntegerField()
+    file = models.FileField(max_length=255)
+    size = models.PositiveIntegerField(help_text="File size in bytes")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['format', 'width']
+        unique_together = ['content_type', 'object_id', 'format', 'width']
+
+    def __str__(self):
+        return f"{self.source_name} @ {self.width}w ({self.format})"
+
+
+# Image field each model renders derivatives of
+IMAGE_DERIVATIVE_FIELDS = {
+    GalleryImage: 'image',
+    GalleryCategory: 'cover_image',
+    Service: 'image',
+    Material: 'image',
+}
+
+
+def remember_derivative_source(sender, instance, raw=False, update_fields=None, **kwargs):
+    # A new upload is only written to storage (and named) during the save
+    field_name = IMAGE_DERIVATIVE_FIELDS[sender]
+    field_file = getattr(instance, field_name)
+    instance._derivative_source_changed = not raw and (
+        update_fields is None or field_name in update_fields
+    ) and (instance._state.adding or not field_file or not field_file._committed)
+
+
+def render_image_derivatives(sender, instance, raw=False, **kwargs):
+    if not instance.__dict__.pop('_derivative_source_changed', False):
+        return
+    field_name = IMAGE_DERIVATIVE_FIELDS[sender]
+    if not kwargs.get('created'):
+        drop_stale_derivatives(instance, field_name)
+    if getattr(instance, field_name):
+        # Never in this request: see render_derivatives_later()
+        transaction.on_commit(partial(render_derivatives_later, sender, field_name, [instance.pk]))
+
+
+for _model in IMAGE_DERIVATIVE_FIELDS:
+    pre_save.connect(remember_derivative_source, sender=_model, dispatch_uid=f'derivatives:{_model.__name__}')
+    post_save.connect(render_image_derivatives, sender=_model, dispatch_uid=f'derivatives:{_model.__name__}')
+
+
+# Content-addressed media (see furniture/storage.py)
+class MediaBlobQuerySet(models.QuerySet):
+    def acquire(self, name):
+        """Count one more row referencing the blob stored as ``name``"""
+        sha256 = blob_sha256(name)
+        if sha256 is None:
+            return
+        blob, created = self.get_or_create(
+            sha256=sha256,
+            defaults={'name': name, 'size': blob_storage.size(name), 'ref_count': 1}
+        )
+        if not created:
+            self.filter(pk=blob.pk).update(ref_count=models.F('ref_count') + 1, updated_at=Now())
+
+    def acquire_many(self, names):
+        """acquire() for each of ``names`` (repeats count again), in a few statements"""
+        names_by_sha = {}
+        counts = Counter()
+        for name in names:
+            sha256 = blob_sha256(name)
+            if sha256 is not None:
+                names_by_sha[sha256] = name
+                counts[sha256] += 1
+        if not counts:
+            return
+
+        self.bulk_create([
+            MediaBlob(sha256=sha256, name=name, size=blob_storage.size(name), ref_count=0)
+            for sha256, name in names_by_sha.items()
+        ], ignore_conflicts=True)
+        by_count = {}
+        for sha256, count in counts.items():
+            by_count.setdefault(count, []).append(sha256)
+        for count, shas in by_count.items():
+            self.filter(sha256__in=shas).update(ref_count=models.F('ref_count') + count, updated_at=Now())
+
+    def release(self, name):
+        """Count one row less referencing ``name``; unreferenced blobs stay until collected"""
+        sha256 = blob_sha256(name)
+        if sha256 is None:
+            return
+        self.filter(sha256=sha256, ref_count__gt=0).update(
+            ref_count=models.F('ref_count') - 1, updated_at=Now()
+        )
+
+    def unreferenced(self):
+        return self.filter(ref_count=0)
+
+
+class MediaBlob(models.Model):
+    """A stored file, shared by every row that uploaded the same content"""
+    sha256 = models.CharField(max_length=64, unique=True)
+    name = models.CharField(max_length=255, help_text="Storage name of the file")
+    size = models.PositiveBigIntegerField(help_text="File size in bytes")
+    ref_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = MediaBlobQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['ref_count', 'updated_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.ref_count} ref)"
+
+
+# Image field of each model whose files are content-addressed blobs
+BLOB_FIELDS = {
+    GalleryImage: 'image',
+    ContactImage: 'image',
+}
+
+
+@receiver(pre_save, sender=GalleryImage)
+@receiver(pre_save, sender=ContactImage)
+def remember_replaced_blob(sender, instance, raw=False, **kwargs):
+    # A new upload is only written to storage (and named) during the save
+    field_name = BLOB_FIELDS[sender]
+    field_file = getattr(instance, field_name)
+    instance._blob_uploaded = not raw and bool(field_file) and not field_file._committed
+    instance._replaced_blob = None
+    if instance._blob_uploaded and not instance._state.adding:
+        instance._replaced_blob = sender.objects.filter(pk=instance.pk).values_list(field_name, flat=True).first()
+
+
+@receiver(post_save, sender=GalleryImage)
+@receiver(post_save, sender=ContactImage)
+def count_blob_references(sender, instance, **kwargs):
+    if not getattr(instance, '_blob_uploaded', False):
+        return
+    instance._blob_uploaded = False
+    MediaBlob.objects.acquire(getattr(instance, BLOB_FIELDS[sender]).name)
+    if instance._replaced_blob:
+        MediaBlob.objects.release(instance._replaced_blob)
+
+
+@receiver(post_delete, sender=GalleryImage)
+@receiver(post_delete, sender=ContactImage)
+def release_blob(sender, instance, **kwargs):
+    MediaBlob.objects.release(getattr(instance, BLOB_FIELDS[sender]).name)
+
+
+@receiver(post_save, sender=GalleryImage)
+def index_image_hash(sender, instance, **kwargs):
+    image_id, phash, project_id = instance.pk, instance.phash, instance.gallery_project_id
+    transaction.on_commit(lambda: gallery_image_index.update(image_id, phash, project_id))
+
+
+@receiver(post_delete, sender=GalleryImage)
+def unindex_image_hash(sender, instance, origin=None, **kwargs):
+    if isinstance(origin, models.QuerySet):
+        # One rebuild rather than a removal per row
+        if first_in_bulk_delete(origin, 'similarity'):
+            transaction.on_commit(gallery_image_index.invalidate)
+        return
+    # Read now: the pk is cleared once the delete completes
+    image_id = instance.pk
+    transaction.on_commit(lambda: gallery_image_index.remove(image_id))
+
+
+@receiver(images_updated, sender=GalleryImage)
+def reindex_image_hashes(sender, instance=None, derivatives=False, **kwargs):
+    # Sent after bulk writes, which bypass the receivers above
+    if instance is None and not derivatives:
+        gallery_image_index.invalidate()
+
+
+# Admin dashboard statistics
+# Columns of DashboardStats counting each table, as conditions for a
+# conditional aggregate (None counts every row)
+DASHBOARD_COUNTERS = {
+    GalleryCategory: {
+        'category_count': None,
+        'active_category_count': models.Q(is_active=True),
+    },
+    GalleryProject: {
+        'project_count': None,
+        'active_project_count': models.Q(is_active=True),
+        'featured_project_count': models.Q(featured=True),
+        'projects_with_images': models.Q(image_count__gt=0),
+    },
+    GalleryImage: {
+        'image_count': None,
+        'primary_image_count': models.Q(is_primary=True),
+        'before_image_count': models.Q(is_before_image=True),
+    },
+    CustomRequest: {
+        'custom_request_count': None,
+        'new_custom_request_count': models.Q(status='new'),
+        'in_progress_custom_request_count': models.Q(status='in_progress'),
+        'done_custom_request_count': models.Q(status='done'),
+    },
+    ContactMessage: {
+        'message_count': None,
+        'unread_message_count': models.Q(is_read=False),
+    },
+}
+# Writes to these tables change rows outside save(): an image save demotes
+# the previous primary image and recounts its project's image_count. They
+# recount these tables after commit instead of adjusting the counters.
+DASHBOARD_RECOUNT = {
+    GalleryImage: (GalleryImage, GalleryProject),
+}
+
+
+def count_rows(queryset, conditions):
+    """{column: rows of ``queryset`` matching its condition}, in one query"""
+    return queryset.order_by().aggregate(**{
+        column: models.Count('pk', filter=condition) for column, condition in conditions.items()
+    })
+
+
+def dashboard_counts(queryset):
+    return count_rows(queryset, DASHBOARD_COUNTERS[queryset.model])
+
+
+def table_counts(tables, extra=None):
+    """
+    {column: count} of the dashboard counters of ``tables``, plus ``extra``
+    ({model: {column: condition}}) counters that are never stored. Read
+    from the DashboardStats row when DASHBOARD_STATS_MATERIALIZED, else
+    counted with one conditional aggregate query per table.
+    """
+    extra = extra or {}
+    counts = {}
+    materialized = settings.DASHBOARD_STATS_MATERIALIZED
+    if materialized:
+        stats = DashboardStats.objects.current()
+        counts = {column: getattr(stats, column) for model in tables for column in DASHBOARD_COUNTERS[model]}
+
+    for model in tables:
+        conditions = {} if materialized else dict(DASHBOARD_COUNTERS[model])
+        conditions.update(extra.get(model, {}))
+        if conditions:
+            counts.update(count_rows(model._default_manager.all(), conditions))
+    return counts
+
+
+class DashboardStatsQuerySet(models.QuerySet):
+    def current(self):
+        """The stats row, counted from scratch first if there is none yet"""
+        stats = self.filter(pk=DashboardStats.SINGLETON_PK).first()
+        if stats is None:
+            self.refresh()
+            stats = self.get(pk=DashboardStats.SINGLETON_PK)
+        return stats
+
+    def refresh(self, *tables):
+        """Recount the columns of ``tables`` (default: all), one aggregate query per table"""
+        row = self.filter(pk=DashboardStats.SINGLETON_PK)
+        if tables and row.exists():
+            values = {}
+            for model in tables:
+                values.update(dashboard_counts(model._default_manager.all()))
+            row.update(**values, updated_at=Now())
+            return
+
+        values = {}
+        for model in DASHBOARD_COUNTERS:
+            values.update(dashboard_counts(model._default_manager.all()))
+        self.update_or_create(pk=DashboardStats.SINGLETON_PK, defaults=values)
+
+    def add(self, delta):
+        """Add ``delta`` ({column: change}) to the stored counters"""
+        changes = {column: models.F(column) + change for column, change in delta.items() if change}
+        if changes:
+            self.filter(pk=DashboardStats.SINGLETON_PK).update(**changes, updated_at=Now())
+
+
+class DashboardStats(models.Model):
+    """
+    The admin dashboard counters (see DASHBOARD_COUNTERS) in a single row,
+    used when DASHBOARD_STATS_MATERIALIZED. Writes through the ORM adjust
+    it by the difference they make; manage.py refresh_dashboard_stats
+    recounts it from scratch.
+    """
+    # Not Positive: a counter gone stale must never make a write fail
+    category_count = models.IntegerField(default=0)
+    active_category_count = models.IntegerField(default=0)
+    project_count = models.IntegerField(default=0)
+    active_project_count = models.IntegerField(default=0)
+    featured_project_count = models.IntegerField(default=0)
+    projects_with_images = models.IntegerField(default=0)
+    image_count = models.IntegerField(default=0)
+    primary_image_count = models.IntegerField(default=0)
+    before_image_count = models.IntegerField(default=0)
+    custom_request_count = models.IntegerField(default=0)
+    new_custom_request_count = models.IntegerField(default=0)
+    in_progress_custom_request_count = models.IntegerField(default=0)
+    done_custom_request_count = models.IntegerField(default=0)
+    message_count = models.IntegerField(default=0)
+    unread_message_count = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = DashboardStatsQuerySet.as_manager()
+
+    SINGLETON_PK = 1
+
+    class Meta:
+        verbose_name_plural = "Dashboard stats"
+
+    def __str__(self):
+        return f"Dashboard stats ({self.updated_at:%Y-%m-%d %H:%M})"
+
+
+class PendingRecount:
+    """An on_commit callback recounting ``tables``, recognizable among the others"""
+
+    def __init__(self, tables):
+        self.tables, self.done = tables, False
+
+    def __call__(self):
+        self.done = True
+        DashboardStats.objects.refresh(*self.tables)
+
+
+def _recount_after_commit(sender):
+    """
+    Recount the tables a write to ``sender`` changes once it commits: once
+    per transaction, however many rows it writes (e.g. a project delete
+    cascading to its images).
+    """
+    tables = DASHBOARD_RECOUNT.get(sender, (sender,))
+    connection = transaction.get_connection()
+    scheduled = connection.in_atomic_block and any(
+        isinstance(entry[1], PendingRecount) and entry[1].tables == tables and not entry[1].done
+        for entry in connection.run_on_commit
+    )
+    if not scheduled:
+        transaction.on_commit(PendingRecount(tables))
+
+
+def count_row_before_write(sender, instance, signal, raw=False, origin=None, **kwargs):
+    """Remember what the row counts for before it is saved or deleted"""
+    if not settings.DASHBOARD_STATS_MATERIALIZED or raw or sender in DASHBOARD_RECOUNT:
+        return
+    if isinstance(origin, models.QuerySet):
+        return
+    if signal is pre_save and instance._state.adding:
+        instance._dashboard_counts = {}
+    else:
+        instance._dashboard_counts = dashboard_counts(sender._default_manager.filter(pk=instance.pk))
+
+
+def count_row_after_write(sender, instance, signal, raw=False, origin=None, **kwargs):
+    """Apply the difference a save or delete made to the stored counters"""
+    before = instance.__dict__.pop('_dashboard_counts', None)
+    if not settings.DASHBOARD_STATS_MATERIALIZED or raw:
+        return
+    if isinstance(origin, models.QuerySet):
+        # A bulk delete: recount once rather than per row
+        if first_in_bulk_delete(origin, ('dashboard', sender)):
+            _recount_after_commit(sender)
+        return
+    if sender in DASHBOARD_RECOUNT:
+        _recount_after_commit(sender)
+        return
+    if before is None:
+        return
+
+    after = dashboard_counts(sender._default_manager.filter(pk=instance.pk)) if signal is post_save else {}
+    DashboardStats.objects.add({
+        column: after.get(column, 0) - before.get(column, 0) for column in DASHBOARD_COUNTERS[sender]
+    })
+
+
+def recount_after_bulk_write(sender, instance=None, derivatives=False, **kwargs):
+    """Recount a table after set-based writes (rows_changed, images_updated)"""
+    if settings.DASHBOARD_STATS_MATERIALIZED and instance is None and not derivatives:
+        _recount_after_commit(sender)
+
+
+for _model in DASHBOARD_COUNTERS:
+    _uid = f'dashboard:{_model.__name__}'
+    pre_save.connect(count_row_before_write, sender=_model, dispatch_uid=_uid)
+    pre_delete.connect(count_row_before_write, sender=_model, dispatch_uid=_uid)
+    post_save.connect(count_row_after_write, sender=_model, dispatch_uid=_uid)
+    post_delete.connect(count_row_after_write, sender=_model, dispatch_uid=_uid)
+    rows_changed.connect(recount_after_bulk_write, sender=_model, dispatch_uid=_uid)
+    images_updated.connect(recount_after_bulk_write, sender=_model, dispatch_uid=_uid)
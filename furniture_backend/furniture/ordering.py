@@ -0,0 +1,165 @@
+"""
+Manual ordering of gallery images, projects and categories, services,
+materials and FAQs: the ``order`` or ``sort_order`` field each list sorts by.
+
+Positions are spaced ORDER_GAP apart, so moving an item before or after
+another writes a single row: it takes the midpoint between its new
+neighbours. Only when two neighbours have no room left between them is their
+list (the scope: a project's images, a type of material, a category of FAQs,
+or the whole table) renumbered, and manage.py rebalance_ordering renumbers
+tight lists ahead of time.
+
+Positions are written set-based: a drag-and-drop of a whole list becomes
+one UPDATE ... SET order = CASE id WHEN ... END per CASE_BATCH_SIZE rows,
+in a single transaction, followed by one cache invalidation.
+"""
+from django.db import models, transaction
+
+from .models import FAQ, GalleryCategory, GalleryImage, GalleryProject, Material, Service, rows_changed
+
+
+ORDER_FIELDS = {
+    GalleryImage: 'order',
+    GalleryProject: 'sort_order',
+    GalleryCategory: 'sort_order',
+    Service: 'sort_order',
+    Material: 'sort_order',
+    FAQ: 'sort_order',
+}
+# Fields whose rows form separate lists (Meta.ordering sorts by them first)
+SCOPE_FIELDS = {
+    GalleryImage: ('gallery_project_id',),
+    Material: ('type',),
+    FAQ: ('category',),
+}
+ORDER_GAP = 1024
+# Lists with neighbours closer than this are renumbered by rebalance_ordering
+REBALANCE_MIN_GAP = 16
+MAX_POSITION = 2 ** 31 - 1
+# Rows per CASE statement, keeping each well under database parameter limits
+CASE_BATCH_SIZE = 500
+
+
+def set_positions(model, positions):
+    """
+    Write ``positions`` ({pk: position}) to the order field of ``model``
+    atomically. Returns the number of rows updated.
+    """
+    field_name = ORDER_FIELDS[model]
+    items = list(positions.items())
+    updated = 0
+
+    with transaction.atomic():
+        for start in range(0, len(items), CASE_BATCH_SIZE):
+            batch = items[start:start + CASE_BATCH_SIZE]
+            updated += model._default_manager.filter(pk__in=[pk for pk, _ in batch]).update(**{
+                field_name: models.Case(
+                    *[models.When(pk=pk, then=models.Value(position)) for pk, position in batch],
+                    output_field=models.PositiveIntegerField(),
+                )
+            })
+
+        if model is GalleryImage:
+            # The primary image pointer prefers the first primary image in order
+            GalleryProject.objects.filter(
+                pk__in=GalleryImage.objects.filter(pk__in=positions).values('gallery_project')
+            ).refresh_image_summary()
+
+    rows_changed.send(sender=model)
+    return updated
+
+
+def scope_of(instance):
+    return {name: getattr(instance, name) for name in SCOPE_FIELDS.get(type(instance), ())}
+
+
+def ordered_positions(model, scope):
+    """[(pk, position)] of the list ``scope`` selects, in display order"""
+    queryset = model._default_manager.filter(**scope).order_by(*model._meta.ordering, 'pk')
+    return list(queryset.values_list('pk', ORDER_FIELDS[model]))
+
+
+def spaced_position(index):
+    """The position of the ``index``-th row of a list spaced ORDER_GAP apart"""
+    return (index + 1) * ORDER_GAP
+
+
+def spaced(rows):
+    """{pk: position} renumbering ``rows`` ORDER_GAP apart, keeping their order"""
+    return {pk: spaced_position(index) for index, (pk, _) in enumerate(rows)}
+
+
+def needs_rebalance(rows):
+    positions = [position for _, position in rows]
+    return any(b - a < REBALANCE_MIN_GAP for a, b in zip(positions, positions[1:]))
+
+
+def free_position(rows, target_pk, after):
+    """A position strictly between ``target_pk`` and its neighbour on one side, or None"""
+    index = next(i for i, (pk, _) in enumerate(rows) if pk == target_pk)
+    if after:
+        low = rows[index][1]
+        high = rows[index + 1][1] if index + 1 < len(rows) else None
+    else:
+        low = rows[index - 1][1] if index > 0 else None
+        high = rows[index][1]
+
+    if low is None:
+        position = high - ORDER_GAP if high > ORDER_GAP else high // 2
+        return position if position < high else None
+    if high is None:
+        position = low + ORDER_GAP
+        return position if position <= MAX_POSITION else None
+    return low + (high - low) // 2 if high - low >= 2 else None
+
+
+def move_next_to(instance, target, after=False):
+    """
+    Place ``instance`` right before (or ``after``) ``target`` in their list.
+    Writes only ``instance``, unless there is no room left there and the list
+    is renumbered first. Returns (new position, whether it was renumbered).
+    """
+    model = type(instance)
+    if type(target) is not model or scope_of(target) != scope_of(instance):
+        raise ValueError('Items can only be moved within the same list')
+    if target.pk == instance.pk:
+        raise ValueError('An item cannot be moved relative to itself')
+
+    field_name = ORDER_FIELDS[model]
+    with transaction.atomic():
+        rows = [row for row in ordered_positions(model, scope_of(instance)) if row[0] != instance.pk]
+        position = free_position(rows, target.pk, after)
+        rebalanced = position is None
+        if rebalanced:
+            positions = spaced(rows)
+            set_positions(model, positions)
+            position = free_position(list(positions.items()), target.pk, after)
+
+        model._default_manager.filter(pk=instance.pk).update(**{field_name: position})
+
+    setattr(instance, field_name, position)
+    rows_changed.send(sender=model)
+    return position, rebalanced
+
+
+def rebalance(model, force=False):
+    """
+    Renumber every list of ``model`` whose neighbours ran out of room (or
+    all of them with ``force``). Returns the number of lists renumbered.
+    """
+    scope_fields = SCOPE_FIELDS.get(model, ())
+    if scope_fields:
+        scopes = [
+            dict(zip(scope_fields, values))
+            for values in model._default_manager.order_by().values_list(*scope_fields).distinct()
+        ]
+    else:
+        scopes = [{}]
+
+    renumbered = 0
+    for scope in scopes:
+        rows = ordered_positions(model, scope)
+        if rows and (force or needs_rebalance(rows)):
+            set_positions(model, spaced(rows))
+            renumbered += 1
+    return renumbered
@@ -0,0 +1,204 @@
+"""
+On-demand image resizing: /media/resize/<width>x<height>/<path>?format=webp
+
+Any public image under MEDIA_ROOT can be requested at one of
+IMAGE_RESIZE_SIZES (a height of 0 keeps the aspect ratio) in one of
+IMAGE_DERIVATIVE_FORMATS. Public means under one of
+IMAGE_RESIZE_PUBLIC_PREFIXES, or the file of a gallery image, category,
+service or material; customer photos (contact/) and other blobs are not.
+The first request renders it; the result is kept in IMAGE_RESIZE_CACHE_ROOT,
+which never grows past IMAGE_RESIZE_CACHE_MAX_BYTES: the least recently used
+files are evicted first.
+
+Recency is tracked in a small SQLite index beside the cached files, so
+eviction never has to walk the cache directory. Rendering takes an exclusive
+lock per derivative, so concurrent requests for the same image (from any
+worker process) wait for a single render instead of all doing it.
+
+In production, route /media/resize/ to Django and the rest of /media/ to
+the web server as before.
+"""
+import hashlib
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+
+from django.conf import settings
+from PIL import Image
+
+from .images import encode, load_image
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+
+INDEX_NAME = 'index.sqlite3'
+# Seconds between two access-time writes for the same entry
+ACCESS_RESOLUTION = 60
+# Evict down to this share of the size cap, so a full cache does not evict on every render
+LOW_WATER_RATIO = 0.9
+EVICTION_BATCH = 100
+
+
+class ResizeCache:
+    """Size-capped LRU cache of rendered files on local disk"""
+
+    def __init__(self, root, max_bytes):
+        self.root = str(root)
+        self.max_bytes = max_bytes
+        os.makedirs(self.root, exist_ok=True)
+        with self.connect() as connection:
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS entries ('
+                'key TEXT PRIMARY KEY, size INTEGER NOT NULL, accessed REAL NOT NULL)'
+            )
+            connection.execute('CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)')
+
+    @contextmanager
+    def connect(self):
+        connection = sqlite3.connect(os.path.join(self.root, INDEX_NAME), timeout=30, isolation_level=None)
+        try:
+            yield connection
+        finally:
+            connection.close()
+
+    def path_for(self, key):
+        return os.path.join(self.root, key[:2], key[2:4], key)
+
+    def get(self, key):
+        """Path of the cached file for ``key``, or None"""
+        path = self.path_for(key)
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return None
+        self.touch(key, size)
+        return path
+
+    def get_or_render(self, key, render):
+        """
+        Path of the cached file for ``key``, calling ``render()`` for its
+        bytes on a miss. Only one caller renders a given key at a time.
+        """
+        path = self.get(key)
+        if path is not None:
+            return path
+
+        with self.lock(key):
+            # Someone else may have rendered it while we waited for the lock
+            path = self.get(key)
+            if path is not None:
+                return path
+
+            content = render()
+            path = self.path_for(key)
+            tmp_path = f'{path}.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+
+        self.add(key, len(content))
+        return path
+
+    @contextmanager
+    def lock(self, key):
+        lock_path = f'{self.path_for(key)}.lock'
+        os.makedirs(os.path.dirname(lock_path), exist_ok=True)
+        with open(lock_path, 'wb') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def touch(self, key, size):
+        """Mark ``key`` as used now (at most once per ACCESS_RESOLUTION)"""
+        now = time.time()
+        with self.connect() as connection:
+            connection.execute(
+                'INSERT INTO entries (key, size, accessed) VALUES (?, ?, ?) '
+                'ON CONFLICT (key) DO UPDATE SET accessed = excluded.accessed '
+                'WHERE entries.accessed < ?',
+                [key, size, now, now - ACCESS_RESOLUTION]
+            )
+
+    def add(self, key, size):
+        """Record a freshly rendered file and evict if over the size cap"""
+        with self.connect() as connection:
+            connection.execute(
+                'INSERT OR REPLACE INTO entries (key, size, accessed) VALUES (?, ?, ?)',
+                [key, size, time.time()]
+            )
+            total, = connection.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()
+            if total > self.max_bytes:
+                self.evict(connection, total - int(self.max_bytes * LOW_WATER_RATIO))
+
+    def evict(self, connection, excess):
+        """Delete least recently used files until ``excess`` bytes are freed"""
+        while excess > 0:
+            rows = connection.execute(
+                'SELECT key, size FROM entries ORDER BY accessed LIMIT ?', [EVICTION_BATCH]
+            ).fetchall()
+            if not rows:
+                break
+
+            evicted = []
+            for key, size in rows:
+                if excess <= 0:
+                    break
+                for path in (self.path_for(key), f'{self.path_for(key)}.lock'):
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass
+                evicted.append(key)
+                excess -= size
+
+            connection.executemany('DELETE FROM entries WHERE key = ?', [[key] for key in evicted])
+
+
+def is_public_image(name):
+    """Whether the MEDIA_ROOT-relative ``name`` may be served resized"""
+    from .models import IMAGE_DERIVATIVE_FIELDS
+
+    if name.startswith(tuple(settings.IMAGE_RESIZE_PUBLIC_PREFIXES)):
+        return True
+    # Content-addressed blobs are shared by public and private uploads
+    return any(
+        model._default_manager.filter(**{field_name: name}).exists()
+        for model, field_name in IMAGE_DERIVATIVE_FIELDS.items()
+    )
+
+
+def resize_cache_key(source, width, height, image_format):
+    """Stable name of a rendering; changes if the source file is replaced"""
+    stat = os.stat(source)
+    quality = getattr(settings, 'IMAGE_DERIVATIVE_QUALITY', None)
+    raw = f'{source}|{stat.st_mtime_ns}|{stat.st_size}|{width}x{height}|{quality}'
+    return f'{hashlib.sha256(raw.encode("utf-8")).hexdigest()}.{image_format}'
+
+
+def render_resized(source, width, height, image_format):
+    """Bytes of ``source`` fitted into width x height (0 = any), never upscaled"""
+    box = (width, height or 1)
+    with open(source, 'rb') as f:
+        image = load_image(f, box)
+    image.thumbnail((width, height or image.height), Image.LANCZOS)
+    return encode(image, image_format)
+
+
+@lru_cache(maxsize=None)
+def _resize_cache(root, max_bytes):
+    return ResizeCache(root, max_bytes)
+
+
+def get_resize_cache():
+    """The process-wide ResizeCache for the current settings"""
+    return _resize_cache(str(settings.IMAGE_RESIZE_CACHE_ROOT), settings.IMAGE_RESIZE_CACHE_MAX_BYTES)
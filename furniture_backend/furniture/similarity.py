@@ -0,0 +1,244 @@
+"""
+Visual similarity search over the gallery.
+
+Every GalleryImage stores a 64-bit difference hash (dHash) of its content
+(``phash``, computed with the other image metadata in furniture/images.py).
+Visually similar images have hashes a small Hamming distance apart.
+
+The hashes are indexed in an in-memory BK-tree per process, which answers
+"every image within distance d of this hash" by visiting only a small part
+of the tree instead of comparing against every image. The index is built
+lazily on the first query and updated incrementally when images are saved
+or deleted. Writes in other processes are picked up through a generation
+counter in the default cache: a process that sees a generation it did not
+produce itself rebuilds its index before answering.
+"""
+import threading
+
+from django.core.cache import cache
+
+
+GENERATION_KEY = 'furniture:similarity:generation'
+# Default search radii, in differing bits out of 64
+NEAR_DUPLICATE_DISTANCE = 4
+SIMILAR_DISTANCE = 12
+MAX_DISTANCE = 20
+# Rebuild once this many removed entries linger in the tree
+MAX_TOMBSTONES = 1000
+
+
+def hamming_distance(a, b):
+    return (a ^ b).bit_count()
+
+
+class BKTree:
+    """Burkhard-Keller tree of 64-bit hashes under the Hamming distance"""
+
+    def __init__(self):
+        # Node: [hash, set of item ids, {distance: child node}]
+        self.root = None
+
+    def add(self, value, item):
+        if self.root is None:
+            self.root = [value, {item}, {}]
+            return
+
+        node = self.root
+        while True:
+            distance = hamming_distance(value, node[0])
+            if distance == 0:
+                node[1].add(item)
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [value, {item}, {}]
+                return
+            node = child
+
+    def discard(self, value, item):
+        """Remove ``item`` from the node of ``value``, leaving the node in place"""
+        node = self.root
+        while node is not None:
+            distance = hamming_distance(value, node[0])
+            if distance == 0:
+                node[1].discard(item)
+                return
+            node = node[2].get(distance)
+
+    def search(self, value, max_distance):
+        """[(distance, item)] for every item within ``max_distance`` of ``value``"""
+        if self.root is None:
+            return []
+
+        matches = []
+        stack = [self.root]
+        pop, push = stack.pop, stack.append
+        while stack:
+            node_value, items, children = pop()
+            distance = (value ^ node_value).bit_count()
+            if distance <= max_distance:
+                matches.extend((distance, item) for item in items)
+
+            # Triangle inequality: only children this far from the node can hold matches
+            low, high = distance - max_distance, distance + max_distance
+            if len(children) <= high - low:
+                for child_distance, child in children.items():
+                    if low <= child_distance <= high:
+                        push(child)
+            else:
+                for child_distance in range(max(1, low), high + 1):
+                    child = children.get(child_distance)
+                    if child is not None:
+                        push(child)
+        return matches
+
+
+class GalleryImageIndex:
+    """BK-tree of GalleryImage hashes, also mapping each image to its project"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.tree = None
+        self.images = {}
+        self.tombstones = 0
+        self.generation = None
+
+    def build(self):
+        from .models import GalleryImage
+
+        generation = self.current_generation()
+        tree = BKTree()
+        images = {}
+        rows = GalleryImage.objects.exclude(phash='').values_list('id', 'phash', 'gallery_project_id')
+        for image_id, phash, project_id in rows.iterator(chunk_size=2000):
+            value = int(phash, 16)
+            tree.add(value, image_id)
+            images[image_id] = (value, project_id)
+
+        self.tree, self.images, self.tombstones, self.generation = tree, images, 0, generation
+
+    def current_generation(self):
+        generation = cache.get(GENERATION_KEY)
+        if generation is None:
+            cache.add(GENERATION_KEY, 0, None)
+            generation = cache.get(GENERATION_KEY)
+        return generation
+
+    def ensure_current(self):
+        if self.tree is None or self.tombstones > MAX_TOMBSTONES or self.current_generation() != self.generation:
+            self.build()
+
+    def search(self, phash, max_distance):
+        """(distance, image id, project id) of images within ``max_distance``, closest first"""
+        value = int(phash, 16)
+        with self.lock:
+            self.ensure_current()
+            matches = [
+                (distance, image_id, self.images[image_id][1])
+                for distance, image_id in self.tree.search(value, max_distance)
+            ]
+        return sorted(matches)
+
+    def update(self, image_id, phash, project_id):
+        """Index the (new) hash of a saved image"""
+        with self.lock:
+            self.remove_locked(image_id)
+            if phash and self.tree is not None:
+                value = int(phash, 16)
+                self.tree.add(value, image_id)
+                self.images[image_id] = (value, project_id)
+            self.bump_generation()
+
+    def remove(self, image_id):
+        with self.lock:
+            self.remove_locked(image_id)
+            self.bump_generation()
+
+    def remove_locked(self, image_id):
+        if self.tree is not None and image_id in self.images:
+            value, _ = self.images.pop(image_id)
+            self.tree.discard(value, image_id)
+            self.tombstones += 1
+
+    def invalidate(self):
+        """Rebuild on the next query, in every process (after bulk writes)"""
+        with self.lock:
+            self.tree = None
+            self.bump_generation()
+
+    def bump_generation(self):
+        try:
+            generation = cache.incr(GENERATION_KEY)
+        except ValueError:
+            cache.add(GENERATION_KEY, 1, None)
+            generation = None
+        # Only our own write happened since we were last in sync
+        if self.generation is not None and generation == self.generation + 1:
+            self.generation = generation
+        else:
+            self.tree = None
+
+
+gallery_image_index = GalleryImageIndex()
+
+
+def parse_distance(value, default):
+    """Search radius from a query parameter; ValueError unless 0..MAX_DISTANCE"""
+    if value in (None, ''):
+        return default
+    distance = int(value)
+    if not 0 <= distance <= MAX_DISTANCE:
+        raise ValueError(f'distance must be between 0 and {MAX_DISTANCE}')
+    return distance
+
+
+def similar_images(image, max_distance):
+    """Other images within ``max_distance`` of ``image``: [(distance, image id)]"""
+    if not image.phash:
+        return []
+    return [
+        (distance, image_id)
+        for distance, image_id, _ in gallery_image_index.search(image.phash, max_distance)
+        if image_id != image.pk
+    ]
+
+
+def duplicate_groups(max_distance):
+    """Groups (sorted lists of image ids) of images within ``max_distance`` of one another"""
+    with gallery_image_index.lock:
+        gallery_image_index.ensure_current()
+        images = gallery_image_index.images
+        tree = gallery_image_index.tree
+
+        # Union-find over every pair the tree reports as close
+        parent = {image_id: image_id for image_id in images}
+
+        def find(item):
+            while parent[item] != item:
+                parent[item] = parent[parent[item]]
+                item = parent[item]
+            return item
+
+        for image_id, (value, _) in images.items():
+            for _, other_id in tree.search(value, max_distance):
+                root, other_root = find(image_id), find(other_id)
+                if root != other_root:
+                    parent[max(root, other_root)] = min(root, other_root)
+
+    groups = {}
+    for image_id in parent:
+        groups.setdefault(find(image_id), []).append(image_id)
+    return sorted(sorted(group) for group in groups.values() if len(group) > 1)
+
+
+def similar_projects(project, max_distance):
+    """
+    Other projects owning an image within ``max_distance`` of one of
+    ``project``'s images, as [(best distance, project id)], closest first
+    """
+    best = {}
+    for phash in project.images.exclude(phash='').values_list('phash', flat=True):
+        for distance, _, project_id in gallery_image_index.search(phash, max_distance):
+            if project_id != project.pk and distance < best.get(project_id, max_distance + 1):
+                best[project_id] = distance
+    return sorted((distance, project_id) for project_id, distance in best.items())
@@ -0,0 +1,84 @@
+"""
+Content-addressed storage for uploaded media.
+
+Files are named after the SHA-256 of their content, computed while the
+upload is streamed to disk:
+
+    blobs/3f/a2/3fa2...c9.jpg
+
+so uploading the same photo twice stores it once: the second save finds the
+blob already there and just returns its name. Those names never change
+content, which makes them safe to cache forever. The MediaBlob table keeps a
+reference count per blob (see furniture/models.py).
+"""
+import hashlib
+import os
+import re
+import tempfile
+
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+BLOB_PREFIX = 'blobs'
+BLOB_NAME_RE = re.compile(rf'^{BLOB_PREFIX}/[0-9a-f]{{2}}/[0-9a-f]{{2}}/(?P<sha256>[0-9a-f]{{64}})(\.\w+)?$')
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def blob_sha256(name):
+    """SHA-256 encoded in a blob name, or None for any other file name"""
+    match = BLOB_NAME_RE.match(name or '')
+    return match.group('sha256') if match else None
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """FileSystemStorage that names files by the SHA-256 of their content"""
+
+    def get_available_name(self, name, max_length=None):
+        # The final name is only known once the content is hashed in _save()
+        return name
+
+    def _save(self, name, content):
+        _, ext = os.path.splitext(name)
+        digest = hashlib.sha256()
+
+        if hasattr(content, 'temporary_file_path'):
+            # Already on disk (a large upload):
+            # hash it where it is and move it into place
+            tmp_name = content.temporary_file_path()
+            with open(tmp_name, 'rb') as f:
+                for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+                    digest.update(chunk)
+            owned = False
+        else:
+            tmp_dir = os.path.join(self.location, BLOB_PREFIX, 'tmp')
+            os.makedirs(tmp_dir, exist_ok=True)
+            with tempfile.NamedTemporaryFile(dir=tmp_dir, delete=False) as tmp:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    tmp.write(chunk)
+            tmp_name = tmp.name
+            owned = True
+
+        sha256 = digest.hexdigest()
+        blob_name = f'{BLOB_PREFIX}/{sha256[:2]}/{sha256[2:4]}/{sha256}{ext.lower()}'
+        path = self.path(blob_name)
+
+        if os.path.exists(path):
+            if owned:
+                os.remove(tmp_name)
+            # A fresh mtime keeps the garbage collector off a blob about to be referenced again
+            os.utime(path)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # A rename when both are on one filesystem
+            file_move_safe(tmp_name, path, allow_overwrite=True)
+            if self.file_permissions_mode is not None:
+                os.chmod(path, self.file_permissions_mode)
+        return blob_name
+
+
+# Lives under MEDIA_ROOT/MEDIA_URL like the default storage
+blob_storage = ContentAddressedStorage()
@@ -1,3 +1,825 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from PIL import Image
+
+from .models import (
+    ContactImage, ContactMessage, CustomRequest, DashboardStats, GalleryCategory, GalleryProject,
+    GalleryImage, MediaBlob, Service, rows_changed
+)
+
+
+TEST_MEDIA_ROOT = os.path.join(tempfile.gettempdir(), 'ansa-test-media')
+
+
+def make_jpeg(width, height, name='photo.jpg', color=(180, 120, 60), orientation=None):
+    buffer = BytesIO()
+    exif = Image.Exif()
+    if orientation:
+        exif[0x0112] = orientation
+    Image.new('RGB', (width, height), color).save(buffer, 'JPEG', exif=exif)
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/jpeg')
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT)
+class GalleryCounterTests(TestCase):
+    """Denormalized gallery counters follow every write path"""
+
+    def setUp(self):
+        self.category = GalleryCategory.objects.create(name='Kitchens')
+        self.project = GalleryProject.objects.create(gallery_category=self.category, title='Oak kitchen')
+
+    def add_image(self, project=None, **kwargs):
+        return GalleryImage.objects.create(
+            gallery_project=project or self.project,
+            image=SimpleUploadedFile('photo.jpg', b'data'),
+            **kwargs
+        )
+
+    def assertCounters(self, project_images, primary, active_projects, category_images):
+        self.project.refresh_from_db()
+        self.category.refresh_from_db()
+        self.assertEqual(self.project.image_count, project_images)
+        self.assertEqual(self.project.primary_image, primary)
+        self.assertEqual(self.category.active_project_count, active_projects)
+        self.assertEqual(self.category.image_count, category_images)
+
+    def test_image_save_and_delete(self):
+        first = self.add_image(is_primary=True)
+        second = self.add_image()
+        self.assertCounters(2, first, 1, 2)
+
+        second.is_primary = True
+        second.save()
+        self.assertCounters(2, second, 1, 2)
+
+        second.delete()
+        self.assertCounters(1, None, 1, 1)
+
+    def test_image_moved_to_another_project(self):
+        image = self.add_image(is_primary=True)
+        other_category = GalleryCategory.objects.create(name='Wardrobes')
+        other = GalleryProject.objects.create(gallery_category=other_category, title='Walnut wardrobe')
+
+        image.gallery_project = other
+        image.save()
+        self.assertCounters(0, None, 1, 0)
+        other.refresh_from_db()
+        other_category.refresh_from_db()
+        self.assertEqual((other.image_count, other.primary_image), (1, image))
+        self.assertEqual(other_category.image_count, 1)
+
+    def test_stale_project_save_keeps_counters(self):
+        stale = GalleryProject.objects.get(pk=self.project.pk)
+        image = self.add_image(is_primary=True)
+
+        stale.title = 'Walnut kitchen'
+        stale.save()
+        self.assertCounters(1, image, 1, 1)
+
+    def test_project_deactivate_move_and_delete(self):
+        self.add_image()
+        other = GalleryCategory.objects.create(name='Wardrobes')
+
+        self.project.is_active = False
+        self.project.save()
+        self.assertCounters(1, None, 0, 0)
+
+        self.project.is_active = True
+        self.project.gallery_category = other
+        self.project.save()
+        other.refresh_from_db()
+        self.assertCounters(1, None, 0, 0)
+        self.assertEqual((other.active_project_count, other.image_count), (1, 1))
+
+        self.project.delete()
+        other.refresh_from_db()
+        self.assertEqual((other.active_project_count, other.image_count), (0, 0))
+
+    def test_recount_command_repairs_drift(self):
+        image = self.add_image(is_primary=True)
+        GalleryProject.objects.update(image_count=7, primary_image=None)
+        GalleryCategory.objects.update(active_project_count=0, image_count=9)
+
+        received = []
+
+        def receiver(sender, **kwargs):
+            received.append(sender)
+
+        rows_changed.connect(receiver)
+        self.addCleanup(rows_changed.disconnect, receiver)
+        call_command('recount_gallery', stdout=StringIO())
+        self.assertCounters(1, image, 1, 1)
+        self.assertCountEqual(received, [GalleryProject, GalleryCategory])
+
+        # Nothing drifted, nothing to invalidate
+        received.clear()
+        call_command('recount_gallery', stdout=StringIO())
+        self.assertEqual(received, [])
+
+
+@override_settings(
+    MEDIA_ROOT=TEST_MEDIA_ROOT,
+    IMAGE_DERIVATIVE_WIDTHS=[320, 640, 1280],
+    IMAGE_DERIVATIVE_RENDERING='inline',
+)
+class ImageDerivativeTests(TestCase):
+    """Uploads are rendered into the width ladder once the write commits"""
+
+    def test_ladder_stops_at_original_width(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            service = Service.objects.create(
+                title='Kitchens', short_description='Kitchens', description='Kitchens',
+                image=make_jpeg(1000, 500)
+            )
+
+        derivatives = list(service.derivatives.all())
+        self.assertEqual(
+            sorted((d.format, d.width, d.height) for d in derivatives),
+            [('jpeg', 320, 160), ('jpeg', 640, 320), ('jpeg', 1000, 500),
+             ('webp', 320, 160), ('webp', 640, 320), ('webp', 1000, 500)]
+        )
+        for derivative in derivatives:
+            self.assertEqual(os.path.dirname(derivative.file.name), 'services')
+            self.assertTrue(derivative.file.storage.exists(derivative.file.name))
+
+        response = self.client.get(f'/api/services/{service.slug}/')
+        self.assertIn('_640w.webp 640w', response.json()['srcset']['webp'])
+
+    def test_replaced_image_replaces_derivatives(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            service = Service.objects.create(
+                title='Wardrobes', short_description='Wardrobes', description='Wardrobes',
+                image=make_jpeg(400, 400)
+            )
+        old_files = [d.file.name for d in service.derivatives.all()]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            service.image = make_jpeg(800, 400)
+            service.save()
+
+        self.assertEqual(sorted(d.width for d in service.derivatives.filter(format='jpeg')), [320, 640, 800])
+        for name in old_files:
+            self.assertFalse(service.image.storage.exists(name))
+
+    def test_unreadable_image_gets_no_derivatives(self):
+        category = GalleryCategory.objects.create(name='Offices')
+        project = GalleryProject.objects.create(gallery_category=category, title='Desk')
+        with self.captureOnCommitCallbacks(execute=True):
+            image = GalleryImage.objects.create(
+                gallery_project=project, image=SimpleUploadedFile('photo.jpg', b'data')
+            )
+        self.assertFalse(image.derivatives.exists())
+
+    def test_gallery_derivatives_follow_upload_to_not_blob(self):
+        category = GalleryCategory.objects.create(name='Offices')
+        project = GalleryProject.objects.create(gallery_category=category, title='Desk')
+        with self.captureOnCommitCallbacks(execute=True):
+            image = GalleryImage.objects.create(gallery_project=project, image=make_jpeg(400, 300))
+
+        self.assertTrue(image.image.name.startswith('blobs/'))
+        expected = os.path.dirname(GalleryImage._meta.get_field('image').generate_filename(image, 'x.jpg'))
+        for name in image.derivatives.values_list('file', flat=True):
+            self.assertEqual(os.path.dirname(name), expected)
+            self.assertTrue(name.startswith('gallery/'))
+
+    @override_settings(IMAGE_DERIVATIVE_RENDERING='queue')
+    def test_queued_uploads_serve_original_until_drained(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            service = Service.objects.create(
+                title='Doors', short_description='Doors', description='Doors', image=make_jpeg(800, 400)
+            )
+        self.assertFalse(service.derivatives.exists())
+        response = self.client.get(f'/api/services/{service.slug}/').json()
+        self.assertTrue(response['image'].endswith(service.image.name))
+
+        old_name = service.image.name
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('reprocess_media', '--models', 'service', '--pending', '--workers', '0', stdout=StringIO())
+        self.assertEqual(sorted(service.derivatives.filter(format='jpeg').values_list('width', flat=True)), [320, 640, 800])
+
+        # A replacement drops the stale ladder at save time; the drain renders the new one
+        with self.captureOnCommitCallbacks(execute=True):
+            service.image = make_jpeg(400, 200)
+            service.save()
+        self.assertFalse(service.derivatives.exists())
+        self.assertNotEqual(service.image.name, old_name)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('reprocess_media', '--models', 'service', '--pending', '--workers', '0', stdout=StringIO())
+        self.assertEqual(sorted(service.derivatives.filter(format='jpeg').values_list('width', flat=True)), [320, 400])
+
+
+@override_settings(
+    MEDIA_ROOT=TEST_MEDIA_ROOT,
+    IMAGE_RESIZE_CACHE_ROOT=os.path.join(tempfile.mkdtemp(), 'resize'),
+    IMAGE_RESIZE_SIZES=['320x0', '100x100'],
+)
+class ResizeImageViewTests(TestCase):
+    """/media/resize/ renders once, then serves from the LRU disk cache"""
+
+    def setUp(self):
+        self.name = default_storage.save('services/resize-test.jpg', make_jpeg(1000, 500))
+        self.addCleanup(default_storage.delete, self.name)
+
+    def get(self, size, **params):
+        return self.client.get(f'/media/resize/{size}/{self.name}', params)
+
+    def test_resize_and_cache(self):
+        response = self.get('320x0', format='webp')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/webp')
+        self.assertIn('immutable', response['Cache-Control'])
+        image = Image.open(BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(image.size, (320, 160))
+
+        # Served from the cache: nothing is rendered again
+        with mock.patch('furniture.views.render_resized', side_effect=AssertionError):
+            self.assertEqual(self.get('320x0', format='webp').status_code, 200)
+
+        box = Image.open(BytesIO(b''.join(self.get('100x100').streaming_content)))
+        self.assertEqual(box.size, (100, 50))
+
+    def test_rerenders_a_file_evicted_before_it_is_opened(self):
+        from .resize import ResizeCache
+
+        get_or_render, evicted = ResizeCache.get_or_render, []
+
+        def evicted_once(cache, key, render):
+            path = get_or_render(cache, key, render)
+            if not evicted:
+                evicted.append(path)
+                os.remove(path)
+            return path
+
+        with mock.patch.object(ResizeCache, 'get_or_render', autospec=True, side_effect=evicted_once):
+            response = self.get('320x0')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Image.open(BytesIO(b''.join(response.streaming_content))).size, (320, 160))
+
+    def test_rejects_unknown_size_format_and_path(self):
+        self.assertEqual(self.get('321x0').status_code, 404)
+        self.assertEqual(self.get('320x0', format='gif').status_code, 404)
+        self.assertEqual(self.client.get('/media/resize/320x0/../settings.py').status_code, 404)
+        self.assertEqual(self.client.get('/media/resize/320x0/services/missing.jpg').status_code, 404)
+
+    def test_refuses_private_images(self):
+        request = CustomRequest.objects.create(name='Ana', email='ana@example.com', message='Hi')
+        private = ContactImage.objects.create(contact_request=request, image=make_jpeg(600, 400))
+        contact = default_storage.save('contact/2024/1/photo.jpg', make_jpeg(600, 400))
+        self.addCleanup(default_storage.delete, contact)
+
+        for name in (private.image.name, contact, f'services/../{contact}'):
+            self.assertEqual(self.client.get(f'/media/resize/320x0/{name}').status_code, 404)
+
+        # The same kind of blob is served once a gallery image refers to it
+        project = GalleryProject.objects.create(
+            gallery_category=GalleryCategory.objects.create(name='Offices'), title='Desk'
+        )
+        public = GalleryImage.objects.create(gallery_project=project, image=make_jpeg(500, 400, color=(1, 2, 3)))
+        self.assertTrue(public.image.name.startswith('blobs/'))
+        self.assertEqual(self.client.get(f'/media/resize/320x0/{public.image.name}').status_code, 200)
+
+    def test_lru_eviction(self):
+        from .resize import ResizeCache
+
+        cache = ResizeCache(tempfile.mkdtemp(), max_bytes=250)
+        for key in ('aa-first', 'bb-second'):
+            cache.get_or_render(key, lambda: b'x' * 100)
+        # Make the second entry the least recently used
+        with cache.connect() as connection:
+            connection.execute("UPDATE entries SET accessed = 0 WHERE key = 'bb-second'")
+
+        cache.get_or_render('cc-third', lambda: b'x' * 100)
+        self.assertIsNotNone(cache.get('aa-first'))
+        self.assertIsNone(cache.get('bb-second'))
+        self.assertIsNotNone(cache.get('cc-third'))
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT)
+class ImageMetadataTests(TestCase):
+    """Dimensions and placeholders are read once, when the file is uploaded"""
+
+    def setUp(self):
+        category = GalleryCategory.objects.create(name='Kitchens')
+        self.project = GalleryProject.objects.create(gallery_category=category, title='Oak kitchen')
+
+    def test_metadata_on_upload(self):
+        image = GalleryImage.objects.create(
+            gallery_project=self.project, image=make_jpeg(1200, 800, color=(200, 30, 30))
+        )
+        image.refresh_from_db()
+        self.assertEqual((image.width, image.height), (1200, 800))
+        self.assertEqual(image.file_size, image.image.size)
+        self.assertEqual(len(image.dominant_color), 7)
+        self.assertGreater(int(image.dominant_color[1:3], 16), 150)
+        self.assertTrue(image.placeholder.startswith('data:image/webp;base64,'))
+        self.assertLess(len(image.placeholder), 300)
+
+    def test_exif_rotation_swaps_dimensions(self):
+        request = CustomRequest.objects.create(name='Ana', email='ana@example.com', message='Hi')
+        image = ContactImage.objects.create(contact_request=request, image=make_jpeg(600, 400, orientation=6))
+        self.assertEqual((image.width, image.height), (400, 600))
+
+    def test_backfill_command(self):
+        image = GalleryImage.objects.create(gallery_project=self.project, image=make_jpeg(300, 200))
+        GalleryImage.objects.filter(pk=image.pk).update(width=None, height=None, file_size=None, placeholder='')
+
+        out = StringIO()
+        call_command('backfill_image_metadata', stdout=out)
+        image.refresh_from_db()
+        self.assertEqual((image.width, image.height), (300, 200))
+        self.assertTrue(image.placeholder)
+        self.assertIn('1 updated', out.getvalue())
+
+
+@override_settings(
+    MEDIA_ROOT=TEST_MEDIA_ROOT,
+    IMAGE_DERIVATIVE_WIDTHS=[320],
+    IMAGE_DERIVATIVE_RENDERING='inline',
+)
+class ContentAddressedStorageTests(TestCase):
+    """Identical uploads are stored once and reference counted"""
+
+    def setUp(self):
+        category = GalleryCategory.objects.create(name='Kitchens')
+        self.project = GalleryProject.objects.create(gallery_category=category, title='Oak kitchen')
+
+    def upload(self, color=(10, 20, 30)):
+        with self.captureOnCommitCallbacks(execute=True):
+            return GalleryImage.objects.create(
+                gallery_project=self.project, image=make_jpeg(400, 300, color=color)
+            )
+
+    def test_duplicate_upload_shares_blob_and_derivatives(self):
+        first = self.upload()
+        second = self.upload()
+
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertRegex(first.image.name, r'^blobs/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.jpg$')
+        blob = MediaBlob.objects.get()
+        self.assertEqual(blob.ref_count, 2)
+        self.assertEqual(blob.size, first.image.size)
+
+        first_files = sorted(first.derivatives.values_list('file', flat=True))
+        self.assertEqual(first_files, sorted(second.derivatives.values_list('file', flat=True)))
+
+        first.delete()
+        blob.refresh_from_db()
+        self.assertEqual(blob.ref_count, 1)
+        self.assertTrue(second.image.storage.exists(second.image.name))
+
+        second.delete()
+        self.assertEqual(MediaBlob.objects.unreferenced().count(), 1)
+
+    def test_replacing_the_file_moves_the_reference(self):
+        image = self.upload()
+        old_name = image.image.name
+
+        image.image = make_jpeg(400, 300, color=(200, 200, 200))
+        image.save()
+
+        self.assertNotEqual(image.image.name, old_name)
+        self.assertEqual(MediaBlob.objects.get(name=old_name).ref_count, 0)
+        self.assertEqual(MediaBlob.objects.get(name=image.image.name).ref_count, 1)
+
+
+@override_settings(INTAKE_WORKERS=2, INTAKE_TIMEOUT=0.5)
+class IntakePoolTests(TestCase):
+    """Stuck photos cost one deadline per request and spare other requests' work"""
+
+    def test_one_deadline_per_request(self):
+        from concurrent.futures import ThreadPoolExecutor
+        from . import intake
+
+        release = threading.Event()
+
+        def sanitize(source, *options):
+            if source == b'slow':
+                release.wait(10)
+            return b'sanitized ' + source
+
+        executor = ThreadPoolExecutor(max_workers=3)
+        self.addCleanup(executor.shutdown)
+        self.addCleanup(release.set)
+        uploads = [
+            SimpleUploadedFile(f'{i}.jpg', content) for i, content in enumerate([b'slow', b'fast', b'slow'])
+        ]
+        with mock.patch.object(intake, 'sanitize_image', sanitize), \
+                mock.patch.object(intake, 'get_executor', return_value=executor), \
+                mock.patch.object(intake, 'retire_executor') as retire:
+            started = time.monotonic()
+            results = intake.sanitize_uploads(uploads)
+
+        self.assertLess(time.monotonic() - started, 0.9)
+        self.assertEqual(results, [None, b'sanitized fast', None])
+        retire.assert_called_once_with(executor, 0.5)
+
+    def test_retired_pool_finishes_queued_work_first(self):
+        from . import intake
+
+        process = mock.Mock()
+        executor = mock.Mock(_processes={1: process})
+        with mock.patch.object(intake, '_executor', executor):
+            intake.retire_executor(executor, 0.2)
+            self.assertIsNone(intake._executor)
+
+        executor.shutdown.assert_called_once_with(wait=False)
+        process.terminate.assert_not_called()
+        time.sleep(0.4)
+        process.terminate.assert_called_once_with()
+
+    def test_source_limit_leaves_pillow_global_alone(self):
+        from .intake import RejectedImage, sanitize_image
+
+        limit = Image.MAX_IMAGE_PIXELS
+        with self.assertRaises(RejectedImage):
+            sanitize_image(make_jpeg(100, 100).read(), 20_000, 5_000, 85)
+        self.assertTrue(sanitize_image(make_jpeg(100, 100).read(), 20_000, 50_000, 85).startswith(b'\xff\xd8'))
+        self.assertEqual(Image.MAX_IMAGE_PIXELS, limit)
+
+
+class BKTreeTests(TestCase):
+    """The BK-tree finds exactly what a pairwise scan finds"""
+
+    def test_search_matches_brute_force(self):
+        import random
+        from .similarity import BKTree, hamming_distance
+
+        rng = random.Random(7)
+        values = [rng.getrandbits(64) for _ in range(2000)]
+        # Near copies of a few values
+        values += [value ^ (1 << rng.randrange(64)) for value in values[:50]]
+        tree = BKTree()
+        for item, value in enumerate(values):
+            tree.add(value, item)
+
+        for query in values[:20] + [rng.getrandbits(64)]:
+            expected = sorted(
+                (hamming_distance(query, value), item) for item, value in enumerate(values)
+                if hamming_distance(query, value) <= 6
+            )
+            self.assertEqual(sorted(tree.search(query, 6)), expected)
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT, IMAGE_DERIVATIVE_RENDERING='inline')
+class SimilarityIndexTests(TestCase):
+    """The in-memory index follows saves and deletes"""
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        category = GalleryCategory.objects.create(name='Kitchens')
+        self.project = GalleryProject.objects.create(gallery_category=category, title='Oak kitchen')
+        self.other = GalleryProject.objects.create(gallery_category=category, title='Walnut kitchen')
+
+    def add(self, project, image):
+        buffer = BytesIO()
+        image.save(buffer, 'PNG')
+        with self.captureOnCommitCallbacks(execute=True):
+            return GalleryImage.objects.create(
+                gallery_project=project, image=SimpleUploadedFile('photo.png', buffer.getvalue())
+            )
+
+    def gradient(self, flip=False, shade=0):
+        image = Image.linear_gradient('L').resize((128, 128)).convert('RGB')
+        image = image.point(lambda value: min(255, value + shade))
+        return image.transpose(Image.Transpose.FLIP_LEFT_RIGHT) if flip else image
+
+    def test_similar_images_and_projects(self):
+        from .similarity import similar_images, similar_projects
+
+        original = self.add(self.project, self.gradient().rotate(90))
+        lighter = self.add(self.other, self.gradient(shade=10).rotate(90))
+        different = self.add(self.other, self.gradient().rotate(-90))
+
+        self.assertEqual([image_id for _, image_id in similar_images(original, 4)], [lighter.pk])
+        self.assertEqual(similar_projects(self.project, 4), [(0, self.other.pk)])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            lighter.delete()
+        self.assertEqual(similar_images(original, 4), [])
+
+
+@override_settings(IMAGE_DERIVATIVE_RENDERING='inline')
+class MediaGarbageCollectorTests(TestCase):
+    """Only files no row refers to are collected"""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp(prefix='ansa-gc-')
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings_override = self.settings(MEDIA_ROOT=self.media_root, IMAGE_DERIVATIVE_WIDTHS=[320])
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        category = GalleryCategory.objects.create(name='Kitchens')
+        project = GalleryProject.objects.create(gallery_category=category, title='Oak kitchen')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.kept = GalleryImage.objects.create(gallery_project=project, image=make_jpeg(400, 300))
+            self.deleted = GalleryImage.objects.create(
+                gallery_project=project, image=make_jpeg(400, 300, color=(0, 90, 200))
+            )
+        self.service = Service.objects.create(
+            title='Kitchens', description='Fitted kitchens', image=make_jpeg(200, 200, name='service.jpg')
+        )
+        self.deleted_files = [self.deleted.image.name, *self.deleted.derivatives.values_list('file', flat=True)]
+        self.deleted.delete()
+        default_storage.save('gallery/stray.jpg', make_jpeg(10, 10))
+
+    def path(self, name):
+        return os.path.join(self.media_root, name)
+
+    def test_dry_run_reports_without_removing(self):
+        from .media_gc import collect_garbage
+
+        found = []
+        report = collect_garbage(dry_run=True, min_age=0, on_batch=found.extend)
+
+        self.assertCountEqual([name for name, _ in found], self.deleted_files + ['gallery/stray.jpg'])
+        self.assertEqual(report['orphans'], len(found))
+        self.assertEqual(report['removed'], 0)
+        self.assertTrue(os.path.exists(self.path('gallery/stray.jpg')))
+        self.assertEqual(MediaBlob.objects.unreferenced().count(), 1)
+
+    def test_delete_and_quarantine(self):
+        from .media_gc import collect_garbage
+
+        quarantine = os.path.join(self.media_root, 'quarantine')
+        report = collect_garbage(dry_run=False, quarantine=quarantine, min_age=0, batch_size=2)
+
+        self.assertEqual(report['removed'], len(self.deleted_files) + 1)
+        self.assertEqual(report['blobs'], 1)
+        self.assertFalse(os.path.exists(self.path('gallery/stray.jpg')))
+        self.assertTrue(os.path.exists(os.path.join(quarantine, 'gallery/stray.jpg')))
+        for name in (self.kept.image.name, self.service.image.name,
+                     *self.kept.derivatives.values_list('file', flat=True)):
+            self.assertTrue(os.path.exists(self.path(name)), name)
+        self.assertFalse(MediaBlob.objects.unreferenced().exists())
+
+        # The quarantine itself is never collected
+        self.assertEqual(collect_garbage(dry_run=False, quarantine=quarantine, min_age=0)['orphans'], 0)
+
+    def test_files_reused_during_the_walk_are_kept(self):
+        from .media_gc import collect_garbage
+
+        def reuse(orphans):
+            # An upload of the same bytes, and a file rewritten, after the walk saw them
+            MediaBlob.objects.acquire(self.deleted.image.name)
+            future = time.time() + 5
+            os.utime(self.path('gallery/stray.jpg'), (future, future))
+
+        report = collect_garbage(dry_run=False, min_age=0, on_batch=reuse)
+
+        self.assertEqual(report['removed'], len(self.deleted_files) - 1)
+        self.assertTrue(os.path.exists(self.path(self.deleted.image.name)))
+        self.assertTrue(os.path.exists(self.path('gallery/stray.jpg')))
+        self.assertEqual(report['blobs'], 0)
+
+    def test_recent_files_are_kept(self):
+        out = StringIO()
+        call_command('media_gc', '--delete', stdout=out)
+
+        self.assertIn('0 orphaned files', out.getvalue())
+        self.assertTrue(os.path.exists(self.path('gallery/stray.jpg')))
+
+
+@override_settings(
+    MEDIA_ROOT=TEST_MEDIA_ROOT,
+    IMAGE_DERIVATIVE_WIDTHS=[320],
+    IMAGE_DERIVATIVE_RENDERING='inline',
+)
+class ReprocessMediaTests(TestCase):
+    """reprocess_media re-renders derivatives and resumes from its checkpoint"""
+
+    def setUp(self):
+        category = GalleryCategory.objects.create(name='Kitchens')
+        project = GalleryProject.objects.create(gallery_category=category, title='Oak kitchen')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.images = [
+                GalleryImage.objects.create(gallery_project=project, image=make_jpeg(800, 600, color=(i, 0, 0)))
+                for i in range(3)
+            ]
+        directory = tempfile.mkdtemp(prefix='ansa-reprocess-')
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.checkpoint = os.path.join(directory, 'checkpoint.json')
+
+    def widths(self, image):
+        return sorted(set(image.derivatives.values_list('width', flat=True)))
+
+    def reprocess(self, *args):
+        out = StringIO()
+        call_command(
+            'reprocess_media', '--models', 'galleryimage', '--workers', '0', '--shard-size', '1',
+            '--checkpoint', self.checkpoint, *args, stdout=out
+        )
+        return out.getvalue()
+
+    @override_settings(IMAGE_DERIVATIVE_WIDTHS=[320, 640])
+    def test_interrupted_run_resumes(self):
+        from .images import reprocess_derivatives
+
+        calls = []
+
+        def fail_on_second_shard(*args):
+            calls.append(args)
+            if len(calls) == 2:
+                raise RuntimeError('interrupted')
+            return reprocess_derivatives(*args)
+
+        with mock.patch(
+            'furniture.management.commands.reprocess_media.reprocess_derivatives',
+            side_effect=fail_on_second_shard
+        ), self.assertRaises(RuntimeError):
+            self.reprocess()
+
+        self.assertEqual([self.widths(image) for image in self.images], [[320, 640], [320], [320]])
+        self.assertTrue(os.path.exists(self.checkpoint))
+
+        with mock.patch(
+            'furniture.management.commands.reprocess_media.reprocess_derivatives',
+            side_effect=reprocess_derivatives
+        ) as resumed:
+            output = self.reprocess()
+
+        self.assertEqual([call.args[2] for call in resumed.call_args_list], [[self.images[1].pk], [self.images[2].pk]])
+        self.assertEqual([self.widths(image) for image in self.images], [[320, 640]] * 3)
+        self.assertIn('images/s', output)
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+    def test_since_skips_older_rows(self):
+        GalleryImage.objects.filter(pk=self.images[0].pk).update(
+            created_at=timezone.now() - timedelta(days=30)
+        )
+        since = (timezone.now() - timedelta(days=1)).date().isoformat()
+
+        with override_settings(IMAGE_DERIVATIVE_WIDTHS=[320, 640]):
+            self.reprocess('--since', since)
+
+        self.assertEqual([self.widths(image) for image in self.images], [[320], [320, 640], [320, 640]])
+
+    def test_images_updated_once_per_model(self):
+        from .images import images_updated
+
+        received = []
+        images_updated.connect(lambda sender, **kwargs: received.append(sender), weak=False, dispatch_uid='test')
+        self.addCleanup(images_updated.disconnect, dispatch_uid='test')
+        with override_settings(IMAGE_DERIVATIVE_WIDTHS=[320, 640]):
+            self.reprocess()
+        self.assertEqual(received, [GalleryImage])
+
+
+class ManualOrderingTests(TestCase):
+    """Moves write one row while there is room, and renumber when there is not"""
+
+    def services(self, *positions):
+        return [
+            Service.objects.create(title=f'Service {i}', description='-', sort_order=position)
+            for i, position in enumerate(positions)
+        ]
+
+    def displayed(self):
+        return list(Service.objects.values_list('title', flat=True))
+
+    def updates(self, queries):
+        return [q['sql'] for q in queries.captured_queries if q['sql'].startswith('UPDATE')]
+
+    def test_move_writes_one_row(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from .ordering import move_next_to
+
+        first, second, third = self.services(1024, 2048, 3072)
+        with CaptureQueriesContext(connection) as queries:
+            position, rebalanced = move_next_to(third, first)
+        self.assertEqual((position, rebalanced), (512, False))
+        self.assertEqual(len(self.updates(queries)), 1)
+
+        with CaptureQueriesContext(connection) as queries:
+            move_next_to(third, first, after=True)
+        self.assertEqual(len(self.updates(queries)), 1)
+        self.assertEqual(self.displayed(), ['Service 0', 'Service 2', 'Service 1'])
+
+    def test_ties_and_exhausted_gaps_renumber_the_list(self):
+        from .ordering import move_next_to
+
+        first, second, third = self.services(0, 0, 0)
+        _, rebalanced = move_next_to(third, second)
+        self.assertTrue(rebalanced)
+        self.assertEqual(self.displayed(), ['Service 0', 'Service 2', 'Service 1'])
+
+        Service.objects.all().delete()
+        first, second, third = self.services(1024, 1025, 2048)
+        position, rebalanced = move_next_to(third, first, after=True)
+        self.assertEqual((position, rebalanced), (1536, True))
+        self.assertEqual(list(Service.objects.values_list('sort_order', flat=True)), [1024, 1536, 2048])
+
+    def test_moves_stay_within_one_list(self):
+        from .models import FAQ
+        from .ordering import move_next_to
+
+        general = FAQ.objects.create(question='Lead time?', answer='-', category='general')
+        pricing = FAQ.objects.create(question='Deposit?', answer='-', category='pricing')
+        with self.assertRaises(ValueError):
+            move_next_to(general, pricing)
+
+    def test_rebalance_command_keeps_the_order(self):
+        self.services(5, 6, 7, 4096)
+        out = StringIO()
+        call_command('rebalance_ordering', stdout=out)
+
+        self.assertIn('Services: 1 list(s) renumbered', out.getvalue())
+        self.assertEqual(self.displayed(), ['Service 0', 'Service 1', 'Service 2', 'Service 3'])
+        self.assertEqual(list(Service.objects.values_list('sort_order', flat=True)), [1024, 2048, 3072, 4096])
+
+
+@override_settings(DASHBOARD_STATS_MATERIALIZED=True, IMAGE_DERIVATIVE_RENDERING='inline')
+class DashboardStatsTests(TestCase):
+    """The materialized dashboard row follows every kind of write"""
+
+    def setUp(self):
+        self.category = GalleryCategory.objects.create(name='Kitchens')
+        self.project = GalleryProject.objects.create(gallery_category=self.category, title='Oak kitchen')
+        self.requests = [
+            CustomRequest.objects.create(name=f'Client {i}', email='client@example.com', message='Hi')
+            for i in range(3)
+        ]
+        ContactMessage.objects.create(name='Ana', email='ana@example.com', message='Hello')
+        DashboardStats.objects.refresh()
+
+    def assertCurrent(self):
+        from .models import DASHBOARD_COUNTERS, dashboard_counts
+
+        stats = DashboardStats.objects.get()
+        for model in DASHBOARD_COUNTERS:
+            for column, count in dashboard_counts(model.objects.all()).items():
+                self.assertEqual(getattr(stats, column), count, column)
+
+    def test_row_writes_adjust_counters(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        request = self.requests[0]
+        request.status = 'in_progress'
+        with CaptureQueriesContext(connection) as queries:
+            request.save()
+        # The row before and after, the row itself and one counter UPDATE
+        self.assertEqual(len(queries), 4)
+        self.assertCurrent()
+
+        message = ContactMessage.objects.get()
+        message.is_read = True
+        message.save(update_fields=['is_read'])
+        ContactMessage.objects.create(name='Ben', email='ben@example.com', message='Hi')
+        self.requests[1].delete()
+        GalleryProject.objects.create(gallery_category=self.category, title='Walnut', featured=True)
+        self.assertCurrent()
+
+        stats = DashboardStats.objects.get()
+        self.assertEqual(
+            (stats.custom_request_count, stats.new_custom_request_count, stats.unread_message_count), (2, 1, 1)
+        )
+
+    def test_bulk_and_image_writes_recount_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            GalleryImage.objects.create(gallery_project=self.project, image='gallery/a.jpg', is_primary=True)
+            GalleryImage.objects.create(gallery_project=self.project, image='gallery/b.jpg', is_primary=True)
+        self.assertCurrent()
+        self.assertEqual(DashboardStats.objects.get().primary_image_count, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            CustomRequest.objects.filter(pk__in=[r.pk for r in self.requests]).delete()
+            GalleryProject.objects.update(is_active=False)
+            rows_changed.send(sender=GalleryProject)
+        self.assertCurrent()
+
+    def test_cascaded_image_deletes_recount_once(self):
+        from .models import PendingRecount
+
+        GalleryImage.objects.bulk_create(
+            GalleryImage(gallery_project=self.project, image=f'gallery/{i}.jpg', order=i) for i in range(40)
+        )
+        DashboardStats.objects.refresh()
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.project.delete()
+        self.assertEqual(len([c for c in callbacks if isinstance(c, PendingRecount)]), 1)
+        self.assertCurrent()
+        self.assertEqual(DashboardStats.objects.get().image_count, 0)
+
+    def test_refresh_command(self):
+        DashboardStats.objects.update(custom_request_count=42, message_count=-1)
+        out = StringIO()
+        call_command('refresh_dashboard_stats', stdout=out)
+        self.assertCurrent()
+        self.assertIn('Dashboard stats refreshed.', out.getvalue())
@@ -0,0 +1,148 @@
+"""
+Resumable uploads of gallery images, in the style of the tus protocol.
+
+An upload session is created with the final size of the file. Its bytes
+then arrive in any number of PATCH requests, each stating the offset it
+starts at, and are written straight to a part file under UPLOAD_SESSION_ROOT
+as they are read from the request, so worker memory stays flat. A client
+whose request failed asks for the session's offset and resumes from there:
+a failed chunk costs only that chunk.
+
+Once every byte is in, finalizing copies the part file into content-addressed
+storage, then creates the GalleryImage and ends the session in one
+transaction. The part file is only removed once that commits, so a failed
+finalize can simply be retried. Sessions without activity for
+UPLOAD_SESSION_TTL seconds expire.
+"""
+import os
+from contextlib import contextmanager
+
+from django.core.files import File
+from django.db import models, transaction
+from django.utils import timezone
+from PIL import Image
+
+from .models import GalleryImage, MediaBlob, UploadSession
+from .ordering import ORDER_GAP
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+
+CHUNK_SIZE = 64 * 1024
+
+
+class UploadError(Exception):
+    """The request does not fit the state of the upload session"""
+
+
+class OffsetMismatch(UploadError):
+    def __init__(self, offset):
+        super().__init__(f'Upload-Offset does not match the {offset} bytes received')
+        self.offset = offset
+
+
+class UploadTooLarge(UploadError):
+    pass
+
+
+class UploadIncomplete(UploadError):
+    pass
+
+
+class InvalidImage(UploadError):
+    pass
+
+
+@contextmanager
+def locked(session):
+    """Exclusive access to the part file of ``session``, across processes"""
+    os.makedirs(os.path.dirname(session.path), exist_ok=True)
+    fd = os.open(session.path, os.O_RDWR | os.O_CREAT, 0o600)
+    with os.fdopen(fd, 'r+b') as part:
+        if fcntl is not None:
+            fcntl.flock(part, fcntl.LOCK_EX)
+        try:
+            yield part
+        finally:
+            if fcntl is not None:
+                fcntl.flock(part, fcntl.LOCK_UN)
+
+
+def purge_expired():
+    """Delete expired sessions and their part files"""
+    return UploadSession.objects.expired().delete()
+
+
+def append_chunk(session, offset, stream):
+    """
+    Write the bytes read from ``stream`` to the part file of ``session`` at
+    ``offset``, which must be the number of bytes received so far. Returns
+    the new offset; if reading the stream fails, the offset stays put.
+    """
+    with locked(session) as part:
+        # Another request may have moved it since ``session`` was loaded
+        current = UploadSession.objects.filter(pk=session.pk).values_list('offset', flat=True).get()
+        if offset != current:
+            raise OffsetMismatch(current)
+
+        remaining = session.length - offset
+        written = 0
+        part.seek(offset)
+        while True:
+            chunk = stream.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            written += len(chunk)
+            if written > remaining:
+                raise UploadTooLarge(f'More than the {session.length} bytes announced')
+            part.write(chunk)
+        part.flush()
+        os.fsync(part.fileno())
+
+        session.offset, session.updated_at = offset + written, timezone.now()
+        UploadSession.objects.filter(pk=session.pk).update(offset=session.offset, updated_at=session.updated_at)
+    return session.offset
+
+
+def finalize_upload(session):
+    """Turn the complete upload of ``session`` into a GalleryImage and end the session"""
+    with locked(session) as part:
+        session.refresh_from_db()
+        if session.offset != session.length:
+            raise UploadIncomplete(f'{session.offset} of {session.length} bytes received')
+        # Drop the tail of a chunk that failed after the last successful one
+        part.truncate(session.length)
+
+        try:
+            with Image.open(session.path) as image:
+                image.verify()
+        except (OSError, SyntaxError, ValueError, Image.DecompressionBombError) as e:
+            raise InvalidImage(f'Not a valid image: {e}')
+
+        project = session.gallery_project
+        image = GalleryImage(gallery_project=project, description=session.description)
+        # Copied, not moved, into storage and before the transaction: the part
+        # file stays until the session row is gone for good (see models.py)
+        with open(session.path, 'rb') as f:
+            image.image = File(f, name=session.filename)
+            GalleryImage._meta.get_field('image').pre_save(image, add=True)
+
+        with transaction.atomic():
+            summary = GalleryImage.objects.filter(gallery_project=project).aggregate(
+                max_order=models.Max('order'),
+                count=models.Count('pk'),
+                has_primary=models.Count('pk', filter=models.Q(is_primary=True)),
+            )
+            max_order = summary['max_order'] if summary['max_order'] is not None else 0
+            image.title = session.title or f"{project.title} - Image {summary['count'] + 1}"
+            image.alt_text = session.alt_text or f"{project.title} - Image {summary['count'] + 1}"
+            image.is_primary = not summary['has_primary']
+            image.order = max_order + ORDER_GAP
+            image.save()
+            # Stored before the save, so count_blob_references saw no new upload
+            MediaBlob.objects.acquire(image.image.name)
+            session.delete()
+    return image
@@ -1,3 +1,55 @@
-from django.shortcuts import render
+import os
 
-# Create your views here.
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404
+from django.utils._os import safe_join
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import require_safe
+from PIL import Image
+
+from .resize import get_resize_cache, is_public_image, render_resized, resize_cache_key
+
+
+# A rendered size never changes for a given URL (the cache key follows the source file)
+RESIZE_MAX_AGE = 60 * 60 * 24 * 365
+# Lookups of a size whose cached file keeps being evicted before it is opened
+RESIZE_ATTEMPTS = 3
+
+
+@require_safe
+def resize_image(request, width, height, path):
+    """Serve the public image ``path`` from MEDIA_ROOT resized to width x height (see furniture/resize.py)"""
+    if f'{width}x{height}' not in settings.IMAGE_RESIZE_SIZES:
+        raise Http404('Size not allowed')
+
+    image_format = request.GET.get('format', 'jpeg')
+    if image_format not in settings.IMAGE_DERIVATIVE_FORMATS:
+        raise Http404('Format not allowed')
+
+    try:
+        source = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404('Image not found')
+    name = os.path.relpath(source, settings.MEDIA_ROOT).replace(os.sep, '/')
+    if not os.path.isfile(source) or not is_public_image(name):
+        raise Http404('Image not found')
+
+    key = resize_cache_key(source, width, height, image_format)
+    for _ in range(RESIZE_ATTEMPTS):
+        try:
+            cached = get_resize_cache().get_or_render(
+                key, lambda: render_resized(source, width, height, image_format)
+            )
+        except (OSError, ValueError, Image.DecompressionBombError):
+            raise Http404('Image could not be resized')
+        try:
+            resized = open(cached, 'rb')
+        except FileNotFoundError:
+            # Evicted since it was looked up: look it up (or render it) again
+            continue
+
+        response = FileResponse(resized, content_type=f'image/{image_format}')
+        patch_cache_control(response, public=True, max_age=RESIZE_MAX_AGE, immutable=True)
+        return response
+    raise Http404('Image could not be resized')
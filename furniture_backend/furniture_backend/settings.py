@@ -110,6 +110,9 @@ TIME_ZONE = 'UTC'
 USE_I18N = True
 USE_TZ = True
 
+# Languages served by the client (client/src/locales)
+API_LANGUAGES = ['en', 'it', 'al']
+
 # Static files (CSS, JavaScript, Images)
 STATIC_URL = '/static/'
 STATIC_ROOT = BASE_DIR / 'staticfiles'
@@ -121,19 +124,84 @@ STATICFILES_DIRS = [
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Responsive derivatives rendered after upload (furniture/images.py)
+IMAGE_DERIVATIVE_WIDTHS = [320, 640, 960, 1280, 1920]
+IMAGE_DERIVATIVE_FORMATS = ['webp', 'jpeg']
+IMAGE_DERIVATIVE_QUALITY = config('IMAGE_DERIVATIVE_QUALITY', default=80, cast=int)
+# Where they are rendered: 'pool' (a pool of IMAGE_DERIVATIVE_WORKERS
+# processes), 'queue' (left for a cron job running manage.py reprocess_media
+# --pending) or 'inline' (after commit, in the uploading request itself;
+# development and tests only)
+IMAGE_DERIVATIVE_RENDERING = config('IMAGE_DERIVATIVE_RENDERING', default='pool')
+IMAGE_DERIVATIVE_WORKERS = config('IMAGE_DERIVATIVE_WORKERS', default=2, cast=int)
+
+# On-demand resizing, /media/resize/<w>x<h>/<path> (furniture/resize.py)
+IMAGE_RESIZE_SIZES = [
+    '150x150', '300x300', '400x300', '800x600',
+    '320x0', '640x0', '960x0', '1280x0', '1920x0',
+]
+# Served by path; any other file only if a public image field refers to it
+IMAGE_RESIZE_PUBLIC_PREFIXES = ['gallery/', 'services/', 'materials/']
+IMAGE_RESIZE_CACHE_ROOT = config('IMAGE_RESIZE_CACHE_ROOT', default=str(BASE_DIR / 'resize_cache'))
+IMAGE_RESIZE_CACHE_MAX_BYTES = config('IMAGE_RESIZE_CACHE_MAX_BYTES', default=1024 ** 3, cast=int)
+
+# Customer photo intake (furniture/intake.py); 0 workers processes inline
+INTAKE_WORKERS = config('INTAKE_WORKERS', default=2, cast=int)
+INTAKE_TIMEOUT = config('INTAKE_TIMEOUT', default=20, cast=int)
+INTAKE_MAX_PIXELS = 12_000_000
+INTAKE_MAX_SOURCE_PIXELS = 100_000_000
+INTAKE_QUALITY = 85
+
+# Orphaned media collection (manage.py media_gc); files younger than this are kept
+MEDIA_GC_MIN_AGE = config('MEDIA_GC_MIN_AGE', default=24 * 60 * 60, cast=int)
+# Directories under MEDIA_ROOT (relative) holding files without rows by design
+MEDIA_GC_EXCLUDE = []
+MEDIA_GC_QUARANTINE_ROOT = config('MEDIA_GC_QUARANTINE_ROOT', default=str(BASE_DIR / 'media_quarantine'))
+
+# Resumable gallery uploads (furniture/uploads.py); a part file is kept here
+# until its finalized upload commits.
+UPLOAD_SESSION_ROOT = config('UPLOAD_SESSION_ROOT', default=str(BASE_DIR / 'upload_sessions'))
+UPLOAD_SESSION_MAX_BYTES = config('UPLOAD_SESSION_MAX_BYTES', default=100 * 1024 ** 2, cast=int)
+UPLOAD_SESSION_TTL = config('UPLOAD_SESSION_TTL', default=24 * 60 * 60, cast=int)
+
+# Admin dashboard counters kept in one DashboardStats row, adjusted on every
+# write, instead of counted per request (manage.py refresh_dashboard_stats)
+DASHBOARD_STATS_MATERIALIZED = config('DASHBOARD_STATS_MATERIALIZED', default=False, cast=bool)
+
+# Static JSON export of the public API (manage.py publish_snapshot)
+SNAPSHOT_ROOT = config('SNAPSHOT_ROOT', default=str(BASE_DIR / 'snapshot'))
+
+# Cache
+# The public API response cache keeps its generation counters here, so use a
+# shared backend (Redis/Memcached) whenever more than one worker is running.
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='ansa-default'),
+    }
+}
+API_CACHE_TIMEOUT = config('API_CACHE_TIMEOUT', default=60 * 60 * 24, cast=int)
+# Admin lists report the planner's row estimate instead of COUNT(*) for
+# unfiltered tables at least this large (PostgreSQL only; 0 = always exact)
+API_ESTIMATED_COUNT_THRESHOLD = config('API_ESTIMATED_COUNT_THRESHOLD', default=0, cast=int)
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # Django REST Framework settings
+# orjson-backed renderer/parser (api/renderers.py); needs `pip install orjson`
+# to make a difference. Benchmark with: python manage.py benchmark_json
+API_FAST_JSON = config('API_FAST_JSON', default=False, cast=bool)
+
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny',
     ],
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
+        'api.renderers.FastJSONRenderer' if API_FAST_JSON else 'rest_framework.renderers.JSONRenderer',
     ],
     'DEFAULT_PARSER_CLASSES': [
-        'rest_framework.parsers.JSONParser',
+        'api.renderers.FastJSONParser' if API_FAST_JSON else 'rest_framework.parsers.JSONParser',
         'rest_framework.parsers.MultiPartParser',
         'rest_framework.parsers.FormParser',
     ],
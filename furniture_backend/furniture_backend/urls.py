@@ -3,9 +3,16 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 
+from furniture.views import resize_image
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('api.urls')),
+    path(
+        f"{settings.MEDIA_URL.lstrip('/')}resize/<int:width>x<int:height>/<path:path>",
+        resize_image,
+        name='media-resize'
+    ),
 ]
 
 # Serve media files in development